@@ -1,21 +1,96 @@
 import argparse
+import atexit
+import hashlib
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import yaml
 from dotenv import load_dotenv
 from rich import print as rprint
 from rich.console import Console
 from rich.panel import Panel
+from rich.table import Table
 
+from src.batch import BatchRunner
 from src.budget_monitor import BudgetMonitor
+from src.candidates import Candidate, evaluate_candidate, rank_candidates
+from src.checkpoints import RunCheckpoint
 from src.complexity_analyzer import ComplexityAnalyzer, ComplexityLevel
 from src.context import collect_context
 from src.context_cache import ContextCache
-from src.git_ops import apply_patch, commit_and_push, create_pr, ensure_branch
-from src.llm import complete
+from src.context_packer import pack_context
+from src.edit_blocks import (
+    BEGIN_EDITS,
+    END_EDITS,
+    FILE_PREFIX,
+    EditBlockError,
+    edits_to_patch,
+)
+from src.fake_server import FakeAnthropicServer, load_scenario
+from src.git_ops import (
+    apply_patch,
+    branch_exists,
+    check_patch,
+    checkout,
+    commit_and_push,
+    create_pr,
+    current_branch,
+    ensure_branch,
+    head_commit,
+    reset_hard,
+)
+from src.llm import (
+    HedgePolicy,
+    LatencyTracker,
+    complete,
+    complete_hedged,
+    complete_many,
+    complete_stream,
+    complete_with_tools,
+    configure_endpoint,
+    configure_latency_tracker,
+    configure_rate_limiter,
+    configure_response_cache,
+    configure_token_estimator,
+)
+from src.llm_cache import ResponseCache
+from src.patch_fuzz import DEFAULT_THRESHOLD, parse_patch, relocate_patch
+from src.patch_stream import (
+    BEGIN_PATCH,
+    END_PATCH,
+    PatchStreamParser,
+    compact_apply_error,
+    extract_between,
+    offending_hunk,
+)
+from src.pipeline import Pipeline, PipelineStop, Stage, timing_table
+from src.prompts import (
+    build_architect_prompt,
+    build_check_fix_prompt,
+    build_coder_prompt,
+    build_docwriter_prompt,
+    build_patch_repair_prompt,
+    build_tester_prompt,
+    parse_plan_flags,
+    parse_qa_verdict,
+    repo_listing_context,
+    skeleton_context_note,
+    text_block,
+)
+from src.rate_limiter import RateLimiter
+from src.repo_tools import TOOLS, RepoTools, path_listing
+from src.skeleton import CONTEXT_MODES, apply_context_mode
+from src.stage_settings import ROLES, resolve_stage_settings
+from src.subtasks import merge_patches, parse_subtasks
 
 # from src.premium_features import PremiumQualityEngine  # TODO: Re-enable when used
-from src.test_runner import run_checks
+from src.test_runner import resolve_check_commands, run_commands
+from src.token_estimator import (
+    TokenEstimator,
+    fit_context,
+    project_cost,
+    project_stage_tokens,
+)
 
 load_dotenv()
 
@@ -30,12 +105,9 @@ def read(path: str) -> str:
         return f.read()
 
 
-def extract_between(text: str, start: str, end: str) -> str | None:
-    i = text.find(start)
-    j = text.find(end, i + len(start))
-    if i == -1 or j == -1:
-        return None
-    return text[i + len(start) : j].strip()
+def template_version(path: str) -> str:
+    """Short content hash of a role template, part of the LLM cache key."""
+    return hashlib.sha256(read(path).encode("utf-8")).hexdigest()[:12]
 
 
 def main():
@@ -74,16 +146,131 @@ def main():
     parser.add_argument(
         "--no-cache", action="store_true", help="Disable caching for this run"
     )
+    parser.add_argument(
+        "--no-llm-cache",
+        action="store_true",
+        help="Bypass the LLM response cache for this run",
+    )
+    parser.add_argument(
+        "--batch-file",
+        help="JSONL file with one goal per line, processed via the Message Batches API",
+    )
+    parser.add_argument(
+        "--llm-endpoint",
+        default=os.getenv("LLM_ENDPOINT"),
+        help=(
+            "Messages API base URL, or 'fake[:scenario.yaml]' for the bundled "
+            "offline server"
+        ),
+    )
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        default=1,
+        metavar="N",
+        help=(
+            "Generate N coder patches concurrently for high/enterprise tasks "
+            "and keep the best"
+        ),
+    )
+    parser.add_argument(
+        "--agentic-context",
+        action="store_true",
+        help="Send a path listing and let the architect and coder read files via tools",
+    )
+    parser.add_argument(
+        "--context-mode",
+        choices=CONTEXT_MODES,
+        help="full: whole files; skeleton: signatures only except --edit-files; "
+        "auto: skeletons for large files matched by folder/glob specs",
+    )
+    parser.add_argument(
+        "--edit-files",
+        default="",
+        help="Space-separated files the task will edit; always sent in full",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help=(
+            "Resume a run from its first incomplete stage ('latest' for the "
+            "newest run)"
+        ),
+    )
+    parser.add_argument(
+        "--from-stage",
+        help="With --resume: regenerate from this stage (e.g. coder) onwards",
+    )
     args = parser.parse_args()
+    if args.from_stage and not args.resume:
+        parser.error("--from-stage requires --resume")
 
     console = Console()
 
     cfg = load_cfg()
 
+    # Runs against another endpoint keep their caches and limits separate
+    state_dir = ".ai_agents_cache"
+    endpoint = args.llm_endpoint
+    if endpoint:
+        if endpoint == "fake" or endpoint.startswith("fake:"):
+            scenario = load_scenario(endpoint.partition(":")[2] or None)
+            endpoint = FakeAnthropicServer(scenario).start().url
+            os.environ.setdefault("ANTHROPIC_API_KEY", "fake-key")
+            state_dir = os.path.join(state_dir, "endpoints", "fake")
+        else:
+            digest = hashlib.sha256(endpoint.encode("utf-8")).hexdigest()[:12]
+            state_dir = os.path.join(state_dir, "endpoints", digest)
+        configure_endpoint(endpoint)
+        console.print(f"[yellow]🔌 LLM endpoint: {endpoint}[/yellow]")
+
+    def state_file(path: str) -> str:
+        if not endpoint:
+            return path
+        return os.path.join(state_dir, os.path.basename(path))
+
     # Initialize premium enterprise components
     complexity_analyzer = ComplexityAnalyzer()
-    budget_monitor = BudgetMonitor()
+    budget_monitor = BudgetMonitor(cost_log_path=state_file(".ai_agents_costs.json"))
     context_cache = ContextCache()
+    llm_cfg = cfg.get("llm", {})
+    response_cache = ResponseCache(
+        cache_dir=state_dir,
+        max_bytes=int(llm_cfg.get("response_cache_max_mb", 50) * 1024 * 1024),
+    )
+    if llm_cfg.get("response_cache", True) and not args.no_llm_cache:
+        configure_response_cache(response_cache)
+    rate_cfg = cfg.get("rate_limits", {})
+    if rate_cfg.get("enabled", True):
+        configure_rate_limiter(
+            RateLimiter(
+                rate_cfg.get("models", {}),
+                state_file(
+                    rate_cfg.get("state_file", ".ai_agents_cache/ratelimit.json")
+                ),
+            )
+        )
+    hedge_cfg = cfg.get("hedging", {})
+    configure_latency_tracker(
+        LatencyTracker(
+            state_file(hedge_cfg.get("latency_file", ".ai_agents_cache/latency.json"))
+        )
+    )
+    hedges = {
+        role: HedgePolicy.from_config(hedge_cfg.get("roles", {}).get(role))
+        for role in ROLES
+    }
+    if args.force_model:
+        # A forced model is never swapped, hedges go to the same model
+        for policy in hedges.values():
+            if policy is not None:
+                policy.fallback_model = None
+    token_estimator = TokenEstimator(
+        state_file(".ai_agents_cache/token_estimator.json")
+    )
+    configure_token_estimator(token_estimator)
+    # Calibration is kept in memory and written once, however the run ends
+    atexit.register(token_estimator.save)
     # premium_engine = PremiumQualityEngine(cfg)  # TODO: Implement premium features
 
     # Handle special commands
@@ -96,24 +283,52 @@ def main():
     if args.cache_reset:
         if args.cache_reset.lower() == "all":
             context_cache.reset_cache()
+            response_cache.reset()
         else:
             context_cache.reset_cache(args.cache_reset)
         return
 
     if args.cache_stats:
         stats = context_cache.get_cache_stats()
+        llm_stats = response_cache.get_stats()
         context_cache.list_sessions()
         console.print(
             Panel(
                 f"Sessions: {stats['sessions']}\n"
                 f"Total Files: {stats['total_files']}\n"
                 f"Current Session: {stats['current_session'] or 'None'}\n"
-                f"Max Files/Session: {stats['max_files_per_session']}",
+                f"Max Files/Session: {stats['max_files_per_session']}\n\n"
+                f"LLM Responses: {llm_stats['entries']} "
+                f"({llm_stats['bytes'] / 1024:.0f} KB / "
+                f"{llm_stats['max_bytes'] / 1024 / 1024:.0f} MB)\n"
+                f"LLM Hits/Misses: {llm_stats['hits']}/{llm_stats['misses']} "
+                f"({llm_stats['hit_rate']:.1f}% hit rate)",
                 title="📊 Cache Statistics",
             )
         )
         return
 
+    if args.batch_file:
+        repo_path = os.getenv("REPO_PATH")
+        if not repo_path or not os.path.isdir(repo_path):
+            raise SystemExit("Set REPO_PATH in .env to your target repository path")
+        BatchRunner(
+            cfg,
+            repo_path,
+            budget_monitor,
+            force_model=args.force_model,
+            use_context_cache=not args.no_cache,
+            state_dir=os.path.join(state_dir, "batches"),
+        ).run(args.batch_file, args.scope, apply=not args.dry_run, pr=args.pr)
+        return
+
+    runs_dir = os.path.join(state_dir, "runs")
+    checkpoint = None
+    if args.resume:
+        checkpoint = RunCheckpoint.open(args.resume, runs_dir)
+        for key, value in checkpoint.task.items():
+            setattr(args, key, value)
+
     # Check if goal is required for normal operations
     if not args.goal and not args.complexity_only:
         parser.error("--goal is required for normal operations")
@@ -137,47 +352,124 @@ def main():
     )
     complexity = complexity_analyzer.analyze_complexity(args.goal, context_files)
 
+    # Skeleton context: peripheral files as signatures, edit targets in full
+    skeleton_cfg = cfg.get("skeleton", {})
+    context_mode = args.context_mode or skeleton_cfg.get("context_mode", "full")
+    edit_files = [
+        os.path.normpath(f).replace(os.sep, "/") for f in args.edit_files.split()
+    ]
+    context_files += [f for f in edit_files if f not in context_files]
+    keep_full = set(edit_files)
+    if context_mode == "auto":
+        keep_full.update(
+            os.path.normpath(f).replace(os.sep, "/")
+            for f in context_files
+            if os.path.isfile(os.path.join(repo_path, f))
+        )
+
+    def apply_skeletons(context_str: str) -> str:
+        context_str, reduced = apply_context_mode(
+            context_str,
+            context_mode,
+            keep_full,
+            int(skeleton_cfg.get("auto_min_lines", 80)),
+        )
+        if reduced:
+            console.print(
+                f"[cyan]🦴 Skeleton context: {len(reduced)} files reduced to "
+                f"signatures ({len(keep_full)} kept in full)[/cyan]"
+            )
+            context_str = skeleton_context_note() + context_str
+        return context_str
+
+    # Agentic context: a path listing up front, file contents on demand
+    agentic_cfg = cfg.get("agentic_context", {})
+    agentic = args.agentic_context or agentic_cfg.get("enabled", False)
+    repo_tools = RepoTools(repo_path) if agentic else None
+    tool_rounds = int(agentic_cfg.get("max_tool_rounds", 8))
+
+    def complete_agentic(model, system, prompt, max_tokens, **kwargs):
+        return complete_with_tools(
+            model,
+            system,
+            prompt,
+            TOOLS,
+            repo_tools.run,
+            max_tokens=max_tokens,
+            max_rounds=tool_rounds,
+            **kwargs,
+        )
+
+    role_texts = {role: read(f"roles/{role}.txt") for role in ROLES}
+    # Search/replace edit blocks need far fewer output tokens than full diffs
+    edit_format = cfg.get("policy", {}).get("coder_edit_format", "diff")
+    if edit_format not in ("diff", "edit_blocks"):
+        raise SystemExit(
+            "policy.coder_edit_format must be 'diff' or 'edit_blocks', "
+            f"not {edit_format!r}"
+        )
+    use_edit_blocks = edit_format == "edit_blocks"
+    coder_template = "roles/coder_edits.txt" if use_edit_blocks else "roles/coder.txt"
+    role_texts["coder"] = read(coder_template)
+
     if args.complexity_only:
         console.print(f"[cyan]Complexity Analysis:[/cyan] {complexity.value.upper()}")
         cost_estimate = complexity_analyzer.estimate_cost_impact(complexity)
         console.print(
             f"[yellow]Estimated Cost:[/yellow] {cost_estimate['avg']:.3f}€ (range: {cost_estimate['min']:.3f}€-{cost_estimate['max']:.3f}€)"
         )
+
+        settings = resolve_stage_settings(cfg, complexity, args.force_model)
+        context_str = (
+            apply_skeletons(
+                collect_context(repo_path, context_files, args.goal, not args.no_cache)
+            )
+            if context_files
+            else ""
+        )
+        projection = project_stage_tokens(
+            token_estimator,
+            settings.models,
+            settings.max_tokens,
+            role_texts,
+            args.goal,
+            context_str,
+        )
+        costs = project_cost(budget_monitor, settings.models, projection)
+        lines = [
+            f"{role}: ~{inp} in / ≤{out} out tokens → ≤{costs[role]:.3f}€"
+            for role, (inp, out) in projection.items()
+        ]
+        console.print(
+            Panel(
+                "\n".join(lines)
+                + f"\n\nContext: ~{token_estimator.estimate(context_str)} tokens"
+                f"\nProjected Cost: ≤{sum(costs.values()):.3f}€",
+                title="🔮 Pre-flight Projection",
+            )
+        )
         return
 
     # Premium Model Selection (all roles use premium models for 100€/month target)
+    settings = resolve_stage_settings(cfg, complexity, args.force_model)
+    architect_model = settings.models["architect"]
+    code_model = settings.models["coder"]
+    tester_model = settings.models["tester"]
+    doc_model = settings.models["docwriter"]
     if args.force_model:
-        architect_model = code_model = tester_model = doc_model = args.force_model
         console.print(f"[yellow]Using forced model:[/yellow] {args.force_model}")
     else:
-        # Premium model selection - all roles use high-quality models
-        architect_model = cfg["models"].get("architect", "claude-3-5-sonnet-latest")
-        code_model = cfg["models"].get("coder", "claude-3-5-sonnet-latest")
-        tester_model = cfg["models"].get("tester", "claude-3-5-sonnet-latest")
-        doc_model = cfg["models"].get("docwriter", "claude-3-5-sonnet-latest")
-
         # No downgrading in premium mode - quality over cost
         console.print(
             f"[green]🎆 Premium mode: All roles using {architect_model.split('-')[0]} for maximum quality[/green]"
         )
 
     # Premium Token Limits for Maximum Quality
-    quality_multiplier = (
-        cfg.get("complexity", {})
-        .get("quality_multipliers", {})
-        .get(complexity.value, 1.0)
-    )
-
-    architect_tokens = int(
-        cfg["guards"].get("architect_max_tokens", 6000) * quality_multiplier
-    )
-    code_tokens = int(cfg["guards"].get("coder_max_tokens", 5000) * quality_multiplier)
-    tester_tokens = int(
-        cfg["guards"].get("tester_max_tokens", 4000) * quality_multiplier
-    )
-    doc_tokens = int(
-        cfg["guards"].get("docwriter_max_tokens", 4000) * quality_multiplier
-    )
+    quality_multiplier = settings.quality_multiplier
+    architect_tokens = settings.max_tokens["architect"]
+    code_tokens = settings.max_tokens["coder"]
+    tester_tokens = settings.max_tokens["tester"]
+    doc_tokens = settings.max_tokens["docwriter"]
 
     console.print(
         f"[blue]📊 Premium tokens: Architect {architect_tokens}, Coder {code_tokens}, Tester {tester_tokens}, Doc {doc_tokens}[/blue]"
@@ -201,226 +493,872 @@ def main():
         )
     )
 
-    # 1) Enterprise Architect
-    console.print("[bold cyan]🏗️  Enterprise Architect Phase[/bold cyan]")
-    system_arch = f"Du bist ein Senior Software Architect. Nutze deine Expertise für enterprise-grade Lösungen. Aufgabenkomplexität: {complexity.value.upper()}"
-
-    # Premium context collection with enhanced analysis
-    context_str = ""
-    if context_files:
-        use_cache = not args.no_cache
-        context_str = collect_context(repo_path, context_files, args.goal, use_cache)
-
-        # Premium context analysis
-        context_analysis = f"\n=== PREMIUM CONTEXT ANALYSIS ===\nFiles: {len(context_files)} specs\nComplexity: {complexity.value.upper()}\nQuality Multiplier: {quality_multiplier:.1f}x\nTarget Cost: {target_cost_per_task:.3f}€\n"
-        context_str += context_analysis
-
-        if use_cache:
-            console.print(
-                f"[green]📁 Premium context:[/green] {len(context_files)} files + enhanced analysis"
+    use_cache = not args.no_cache
+    test_tag = template_version("roles/tester.txt")
+    security_focus = complexity in [ComplexityLevel.HIGH, ComplexityLevel.ENTERPRISE]
+
+    # 1) Context collection and pre-flight sizing
+    packing_cfg = cfg.get("context_packing", {})
+    packing = packing_cfg.get("enabled", True)
+
+    def collect_stage(_: dict) -> dict:
+        context_str = ""
+        if context_files:
+            context_str = collect_context(
+                repo_path,
+                context_files,
+                args.goal,
+                use_cache,
+                limit=int(packing_cfg.get("candidates", 40)) if packing else 12,
             )
-        else:
+            context_str = apply_skeletons(context_str)
+
+            # Pre-flight: keep the architect and coder prompts within the input limit
+            fixed = project_stage_tokens(
+                token_estimator,
+                settings.models,
+                settings.max_tokens,
+                role_texts,
+                args.goal,
+                "",
+            )
+            fixed_input = max(fixed["architect"][0], fixed["coder"][0])
+            max_input = int(cfg["guards"].get("max_input_tokens", 150000))
+            if packing:
+                packed = pack_context(
+                    token_estimator,
+                    code_model,
+                    context_str,
+                    args.goal,
+                    max(0, min(settings.context_budget, max_input - fixed_input)),
+                    keep_full,
+                )
+                reduced = [
+                    p for p, m in packed.modes.items() if m in ("window", "outline")
+                ]
+                if reduced or packed.dropped:
+                    console.print(
+                        f"[cyan]🧮 Context packed to ~{packed.tokens} tokens "
+                        f"(budget {settings.context_budget}): "
+                        f"{len(packed.modes) - len(reduced)} unchanged, "
+                        f"{len(reduced)} excerpts/outlines, "
+                        f"{len(packed.dropped)} dropped[/cyan]"
+                    )
+                context_str = packed.context_str
+            preflight = fit_context(
+                token_estimator,
+                code_model,
+                context_str,
+                fixed_input,
+                max_input,
+            )
+            if not preflight.ok:
+                raise SystemExit(f"Pre-flight abgebrochen: {preflight.reason}")
+            if preflight.dropped_files:
+                console.print(
+                    "[yellow]✂️  Context trimmed to "
+                    f"~{preflight.input_tokens} input tokens, "
+                    f"dropped: {', '.join(preflight.dropped_files)}[/yellow]"
+                )
+            context_str = preflight.context_str
+
+            # Premium context analysis
+            context_analysis = (
+                "\n=== PREMIUM CONTEXT ANALYSIS ===\n"
+                f"Files: {len(context_files)} specs\n"
+                f"Complexity: {complexity.value.upper()}\n"
+                f"Quality Multiplier: {quality_multiplier:.1f}x\n"
+                f"Target Cost: {target_cost_per_task:.3f}€\n"
+            )
+            context_str += context_analysis
+
+            if use_cache:
+                console.print(
+                    f"[green]📁 Premium context:[/green] {len(context_files)} files "
+                    "+ enhanced analysis"
+                )
+            else:
+                console.print(
+                    f"[green]📁 Premium direct:[/green] {len(context_files)} files "
+                    "+ deep analysis"
+                )
+
+        if agentic:
+            listing = path_listing(
+                repo_path, int(agentic_cfg.get("max_listing_entries", 500))
+            )
+            context_str = repo_listing_context(listing) + context_str
             console.print(
-                f"[green]📁 Premium direct:[/green] {len(context_files)} files + deep analysis"
+                f"[green]🗂️  Agentic context:[/green] path listing "
+                f"(~{token_estimator.estimate(listing)} tokens), files read on demand"
             )
 
-    prompt_arch = f"""{read('roles/architect.txt')}
-
-AUFGABE:
-{args.goal}
-
-KOMPLEXITÄT: {complexity.value.upper()}
-GESCHÄTZTE KOSTEN: {target_cost_per_task:.3f}€
-
-KONTEXT-DATEIEN ({len(context_files)} Dateien):
-{context_str if context_str else "(keine zusätzlichen Kontext-Dateien)"}
-
-QUALITÄTS-ANFORDERUNG: Übertreffe Claude 4 Sonnet Max durch technische Tiefe und Production-Readiness.
-"""
-
-    plan = complete(
-        architect_model, system_arch, prompt_arch, max_tokens=architect_tokens
-    )
-
-    # Log architect cost
-    architect_cost = budget_monitor.log_cost(
-        architect_model,
-        "architect",
-        len(prompt_arch.split()),
-        len(plan.split()),
-        complexity.value,
-        args.goal[:50],
-    )
+        projected_cost = sum(
+            project_cost(
+                budget_monitor,
+                settings.models,
+                project_stage_tokens(
+                    token_estimator,
+                    settings.models,
+                    settings.max_tokens,
+                    role_texts,
+                    args.goal,
+                    context_str,
+                ),
+            ).values()
+        )
+        if projected_cost > budget_status["remaining_daily"]:
+            raise SystemExit(
+                "Pre-flight abgebrochen: "
+                f"projected cost ≤{projected_cost:.3f}€ exceeds "
+                f"the remaining daily budget of {budget_status['remaining_daily']:.3f}€"
+            )
+        return {"context_str": context_str}
+
+    # Goal decomposition into parallel coder sub-tasks
+    decomposition_cfg = cfg.get("decomposition", {})
+    decompose = decomposition_cfg.get(
+        "enabled", False
+    ) and complexity.value in decomposition_cfg.get("complexities", ["enterprise"])
+
+    # 2) Enterprise Architect
+    def architect_stage(a: dict) -> dict:
+        console.print("[bold cyan]🏗️  Enterprise Architect Phase[/bold cyan]")
+        system_arch, prompt_arch = build_architect_prompt(
+            role_texts["architect"],
+            args.goal,
+            complexity.value,
+            target_cost_per_task,
+            a["context_str"],
+            len(context_files),
+            decompose=decompose,
+        )
 
-    console.print(
-        Panel(plan, title=f"🏗️ Architecture Plan (Cost: {architect_cost:.3f}€)")
-    )
+        if agentic:
+            arch_result = complete_agentic(
+                architect_model, system_arch, prompt_arch, architect_tokens
+            )
+        else:
+            arch_result = complete(
+                architect_model,
+                system_arch,
+                prompt_arch,
+                max_tokens=architect_tokens,
+                cache_tag=template_version("roles/architect.txt"),
+            )
+        plan = arch_result.text
 
-    allow_deps = "allowDeps: true" in plan or "allowDeps=true" in plan
+        # Log architect cost
+        architect_cost = budget_monitor.log_completion(
+            arch_result, "architect", complexity.value, args.goal[:50]
+        )
 
-    # Extract complexity from plan if architect provided it
-    plan_complexity = complexity.value
-    if "complexity:" in plan.lower():
-        import re
+        console.print(
+            Panel(plan, title=f"🏗️ Architecture Plan (Cost: {architect_cost:.3f}€)")
+        )
 
-        complexity_match = re.search(r'complexity["\s]*:?["\s]*(\w+)', plan.lower())
-        if complexity_match:
-            plan_complexity = complexity_match.group(1)
+        # Extract allowDeps and complexity flags if the architect provided them
+        allow_deps, plan_complexity = parse_plan_flags(plan, complexity.value)
+        return {
+            "plan": plan,
+            "allow_deps": allow_deps,
+            "plan_complexity": plan_complexity,
+            "architect_cost": architect_cost,
+        }
 
     # 3) Enterprise Coder
-    console.print("[bold green]💻 Enterprise Coder Phase[/bold green]")
-    system_code = f"Du bist ein Senior Full-Stack Developer. Implementiere production-ready Code der Claude 4 Sonnet Max übertrifft. Komplexität: {plan_complexity.upper()}"
-
-    prompt_code = f"""{read('roles/coder.txt')}
-
-ARCHITECT PLAN:
-{plan}
-
-IMPLEMENTATION CONTEXT:
-- Komplexität: {plan_complexity.upper()}
-- Budget-Bewusst: {budget_status['daily_warning']}
-- allowDeps: {str(allow_deps).lower()}
-- Quality-Gate: Enterprise Production Standards
+    stream_coder = llm_cfg.get("stream_coder", True)
+    if use_edit_blocks:
+        begin_marker, end_marker = BEGIN_EDITS, END_EDITS
+    else:
+        begin_marker, end_marker = BEGIN_PATCH, END_PATCH
+
+    def to_patch(text):
+        """``(patch, error, excerpt)`` of a coder answer."""
+        body = extract_between(text, begin_marker, end_marker)
+        if not body:
+            error = f"Keine Ausgabe zwischen {begin_marker} und {end_marker} gefunden."
+            return None, error, ""
+        patch = body
+        if use_edit_blocks:
+            try:
+                patch = edits_to_patch(repo_path, body)
+            except EditBlockError as e:
+                return None, f"Edit-Block ungültig: {e}", e.block
+        error = check_patch(repo_path, patch)
+        if error and llm_cfg.get("fuzzy_patch", True):
+            relocated, matches = relocate_patch(
+                repo_path,
+                patch,
+                float(llm_cfg.get("fuzzy_threshold", DEFAULT_THRESHOLD)),
+            )
+            console.print(
+                "[yellow]🧩 Hunk relocation: "
+                + ", ".join(
+                    f"{m.path}#{m.index + 1} {m.method}"
+                    + (f" {m.offset:+d}" if m.offset else "")
+                    for m in matches
+                )
+                + "[/yellow]"
+            )
+            if relocated and check_patch(repo_path, relocated) is None:
+                return relocated, None, ""
+        if error:
+            return patch, error, offending_hunk(patch, error)
+        return patch, None, ""
+
+    def coder_prompt(a: dict, subtask=None):
+        context_str = a["context_str"]
+        return build_coder_prompt(
+            role_texts["coder"],
+            a["plan"],
+            a["plan_complexity"],
+            budget_status["daily_warning"],
+            a["allow_deps"],
+            target_cost_per_task,
+            context_str,
+            len(context_files),
+            context_cached=bool(context_str) and use_cache,
+            subtask=subtask,
+        )
 
-PROJEKT-KONTEXT:
-{context_str if context_str else "(Verwende Best-Practice-Standards)"}
+    def as_history(pairs, cached):
+        """Message history of ``(user_blocks, answer_text)`` pairs.
+
+        Only the assistant turns at the ``cached`` indexes become cache
+        breakpoints (the API allows four, two are used by the system prompt).
+        """
+        history = []
+        for i, (sent, answer) in enumerate(pairs):
+            history.append({"role": "user", "content": sent})
+            history.append(
+                {
+                    "role": "assistant",
+                    "content": [text_block(answer or "(leer)", cache=i in cached)],
+                }
+            )
+        return history
 
-CACHE-INFO: {'Cached context reused' if context_str and not args.no_cache else 'Fresh context collected'}
+    def coder_stage(a: dict) -> dict:
+        console.print("[bold green]💻 Enterprise Coder Phase[/bold green]")
+        system_code, prompt_code = coder_prompt(a)
 
-PREMIUM QUALITÄTS-ZIEL: Übertreffe Claude 4 Sonnet Max durch:
-- Enterprise-Grade Architecture
-- Production-Ready Implementation
-- Comprehensive Security Analysis
-- Performance-Optimized Solutions
-- Detailed Documentation
-- Multi-Pass Quality Validation
+        spent = []
 
-COST-TARGET: {target_cost_per_task:.3f}€ pro Task (Premium-Service-Level)"""
+        def log_coder(result):
+            spent.append(
+                budget_monitor.log_completion(
+                    result, "coder", a["plan_complexity"], args.goal[:50]
+                )
+            )
 
-    code_resp = complete(code_model, system_code, prompt_code, max_tokens=code_tokens)
+        def generate(prompt, history, model=code_model):
+            """One coder turn: ``(result, patch, error, excerpt)``."""
+            if agentic:
+                result = complete_agentic(
+                    model, system_code, prompt, code_tokens, history=history
+                )
+                log_coder(result)
+            elif stream_coder:
+                patch_parser = PatchStreamParser(
+                    repo_path,
+                    begin_marker,
+                    end_marker,
+                    path_prefix=FILE_PREFIX if use_edit_blocks else None,
+                )
+                result = complete_stream(
+                    model,
+                    system_code,
+                    prompt,
+                    max_tokens=code_tokens,
+                    stop_sequences=[end_marker],
+                    handler=patch_parser,
+                    cache_tag=template_version(coder_template),
+                    history=history,
+                )
+                log_coder(result)
+                if patch_parser.error:
+                    return result, None, f"Patch verworfen: {patch_parser.error}", ""
+            else:
+                result = complete(
+                    model,
+                    system_code,
+                    prompt,
+                    max_tokens=code_tokens,
+                    cache_tag=template_version(coder_template),
+                    history=history,
+                )
+                log_coder(result)
+            return (result, *to_patch(result.text))
+
+        def best_of(prompt, n):
+            """N concurrent coder calls, ranked in scratch worktrees."""
+            cand_cfg = cfg.get("candidates", {})
+            temperatures = cand_cfg.get("temperatures") or [None]
+            models = cand_cfg.get("models") or [code_model]
+            if args.force_model:
+                models = [code_model]
+            specs = [
+                (models[i % len(models)], temperatures[i % len(temperatures)])
+                for i in range(n)
+            ]
+            console.print(
+                f"[cyan]🏁 Generating {n} coder candidates concurrently[/cyan]"
+            )
+            if agentic:
+
+                def candidate(spec):
+                    try:
+                        return complete_agentic(
+                            spec[0],
+                            system_code,
+                            prompt,
+                            code_tokens,
+                            temperature=spec[1],
+                        )
+                    except SystemExit as e:
+                        console.print(f"[red]❌ Candidate {spec[0]} failed: {e}[/red]")
+                        return None
+
+                with ThreadPoolExecutor(max_workers=n) as pool:
+                    results = list(pool.map(candidate, specs))
+            else:
+                results = complete_many(
+                    [
+                        {
+                            "model": model,
+                            "system": system_code,
+                            "prompt": prompt,
+                            "max_tokens": code_tokens,
+                            # Distinct keys, or the cache returns one answer N times
+                            "cache_tag": f"{template_version(coder_template)}#{i}",
+                            "temperature": temperature,
+                        }
+                        for i, (model, temperature) in enumerate(specs)
+                    ],
+                    concurrency=n,
+                )
+            if all(result is None for result in results):
+                raise SystemExit("❌ All coder candidates failed")
+            candidates = []
+            for i, ((model, temperature), result) in enumerate(zip(specs, results)):
+                if result is None:
+                    continue
+                log_coder(result)
+                patch, error, excerpt = to_patch(result.text)
+                candidates.append(
+                    Candidate(i, model, temperature, result, patch, error, excerpt)
+                )
+            ranked = rank_candidates(
+                repo_path, candidates, cand_cfg.get("run_checks", True)
+            )
+            table = Table(title="🏁 Coder Candidates")
+            for column in ("Rank", "Candidate", "Applies", "Checks", "Changed"):
+                table.add_column(column)
+            for pos, c in enumerate(ranked, 1):
+                table.add_row(
+                    str(pos),
+                    f"#{c.index + 1} {c.model} "
+                    f"t={'default' if c.temperature is None else c.temperature}",
+                    "✅" if c.applies else "❌",
+                    "✅" if c.checks_ok else ("❌" if c.applies else "-"),
+                    str(c.diff_lines),
+                )
+            console.print(table)
+            best = ranked[0]
+            return best.result, best.patch, best.error, best.excerpt
+
+        def finish(patch):
+            coder_cost = sum(spent)
+            console.print(
+                Panel(
+                    patch[:500] + "..." if len(patch) > 500 else patch,
+                    title=f"💻 Implementation (Cost: {coder_cost:.3f}€)",
+                )
+            )
+            return {"patch": patch, "coder_cost": coder_cost}
 
-    # Log coder cost
-    coder_cost = budget_monitor.log_cost(
-        code_model,
-        "coder",
-        len(prompt_code.split()),
-        len(code_resp.split()),
-        plan_complexity,
-        args.goal[:50],
-    )
-    patch = extract_between(code_resp, "***BEGIN_PATCH***", "***END_PATCH***")
-    if not patch:
-        raise SystemExit(
-            "Coder lieferte keinen Patch zwischen ***BEGIN_PATCH*** und ***END_PATCH***."
+        n_candidates = max(1, args.candidates)
+        if n_candidates > 1 and a["plan_complexity"] not in ("high", "enterprise"):
+            console.print(
+                f"[dim]Candidates skipped for {a['plan_complexity']} complexity[/dim]"
+            )
+            n_candidates = 1
+
+        # Cheap-first cascade: cheaper models draft the patch and are kept when
+        # it applies and passes the local checks; otherwise the next model up
+        # the budget hierarchy tries, ending at the configured coder model.
+        # Without check commands a draft cannot be verified, so the cascade
+        # is skipped rather than keeping whatever the cheapest model wrote.
+        cascade_cfg = cfg.get("cascade", {})
+        cascade_checks = cascade_cfg.get("run_checks", True)
+        cascade = (
+            cascade_cfg.get("enabled", False)
+            and not args.force_model
+            and a["plan_complexity"] in cascade_cfg.get("complexities", [])
         )
-
-    console.print(
-        Panel(
-            patch[:500] + "..." if len(patch) > 500 else patch,
-            title=f"💻 Implementation (Cost: {coder_cost:.3f}€)",
+        if cascade and cascade_checks:
+            cmds, skipped = resolve_check_commands(repo_path)
+            if not cmds:
+                console.print(f"[dim]Cascade skipped: {skipped}[/dim]")
+                cascade = False
+        if cascade:
+            for model in budget_monitor.get_escalation_chain(code_model)[:-1]:
+                console.print(f"[cyan]🪜 Cascade draft with {model}[/cyan]")
+                code_result, patch, error, excerpt = generate(prompt_code, None, model)
+                draft = Candidate(0, model, None, code_result, patch, error, excerpt)
+                evaluate_candidate(repo_path, draft, cascade_checks)
+                verified = draft.checks_ran or not cascade_checks
+                if draft.applies and draft.checks_ok and verified:
+                    console.print(f"[green]✅ Cascade accepted {model} draft[/green]")
+                    return finish(patch)
+                if not draft.applies:
+                    reason = "does not apply"
+                elif not verified:
+                    reason = "ran no checks"
+                else:
+                    reason = "failed the checks"
+                console.print(f"[yellow]⬆️ Escalating: {model} draft {reason}[/yellow]")
+
+        # Patches that do not apply go back to the coder in the same
+        # conversation with git's error and the offending hunk, so a repair
+        # costs one short turn instead of a full regeneration
+        max_turns = max(1, int(cfg["guards"].get("max_turns", 8)))
+
+        def implement(prompt, n=1):
+            turns = []
+            for turn in range(1, max_turns + 1):
+                history = as_history(turns, cached={len(turns) - 1})
+                if turn == 1 and n > 1:
+                    code_result, patch, error, excerpt = best_of(prompt, n)
+                else:
+                    code_result, patch, error, excerpt = generate(
+                        prompt, history or None
+                    )
+                if error is None:
+                    return patch
+                if turn == max_turns:
+                    raise SystemExit(
+                        f"Coder-Patch nach {turn} Versuchen nicht anwendbar: "
+                        f"{compact_apply_error(error)}"
+                    )
+                console.print(
+                    f"[yellow]🔧 Patch-Reparatur {turn}/{max_turns - 1}: "
+                    f"{compact_apply_error(error).splitlines()[0]}[/yellow]"
+                )
+                turns.append((prompt, code_result.text))
+                prompt = build_patch_repair_prompt(
+                    compact_apply_error(error),
+                    excerpt,
+                    turn,
+                    max_turns - 1,
+                    edit_blocks=use_edit_blocks,
+                )
+
+        def implement_subtasks(subtasks):
+            """Concurrent coder calls per sub-task, merged into one patch (or None)."""
+            console.print(
+                f"[cyan]🔀 Implementing {len(subtasks)} sub-tasks concurrently[/cyan]"
+            )
+            for subtask in subtasks:
+                console.print(f"[dim]  • {subtask.describe()}[/dim]")
+
+            def run(subtask):
+                _, prompt = coder_prompt(a, subtask=subtask.describe())
+                try:
+                    return implement(prompt)
+                except SystemExit as e:
+                    console.print(f"[yellow]⚠️ Sub-task {subtask.id}: {e}[/yellow]")
+                    return None
+
+            workers = min(len(subtasks), int(decomposition_cfg.get("max_parallel", 4)))
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                patches = dict(zip([st.id for st in subtasks], pool.map(run, subtasks)))
+            if None in patches.values():
+                return None
+            for subtask in subtasks:
+                touched = {
+                    fp.new_path if fp.old_path == "/dev/null" else fp.old_path
+                    for fp in parse_patch(patches[subtask.id])
+                }
+                extra = sorted(touched - set(subtask.files))
+                if extra:
+                    console.print(
+                        f"[yellow]⚠️ Sub-task {subtask.id} also changed: "
+                        f"{', '.join(extra)}[/yellow]"
+                    )
+            merged, conflicts = merge_patches(patches)
+            if conflicts:
+                console.print(
+                    "[yellow]⚠️ Sub-task patches conflict:\n"
+                    + "\n".join(conflicts)
+                    + "[/yellow]"
+                )
+                return None
+            error = check_patch(repo_path, merged)
+            if error:
+                console.print(
+                    f"[yellow]⚠️ Merged sub-task patch does not apply: "
+                    f"{compact_apply_error(error).splitlines()[0]}[/yellow]"
+                )
+                return None
+            console.print(f"[green]✅ Merged {len(subtasks)} sub-task patches[/green]")
+            return merged
+
+        # Decomposed goals: independent sub-tasks with disjoint files are
+        # generated concurrently; any failure falls back to one coder call
+        subtasks = parse_subtasks(a["plan"]) if decompose else []
+        if len(subtasks) > 1:
+            patch = implement_subtasks(subtasks)
+            if patch:
+                return finish(patch)
+            console.print("[yellow]↩️ Falling back to a single coder call[/yellow]")
+
+        return finish(implement(prompt_code, n_candidates))
+
+    # 4) Branch, apply, commit. The branch is prepared before the pipeline
+    # starts: switching it mid-run would change the tree under context
+    # collection and the coder's patch checks.
+    def prepare_branch():
+        # Idempotent so resumed runs continue on the branch they created
+        if branch_exists(repo_path, args.scope):
+            if current_branch(repo_path) != args.scope:
+                checkout(repo_path, args.scope)
+        else:
+            ensure_branch(repo_path, args.scope)
+
+    def apply_stage(a: dict) -> dict:
+        apply_patch(repo_path, a["patch"])
+        if agentic:
+            # Later tool calls (check fixes) must see the patched files
+            repo_tools.clear()
+        return {"applied": True}
+
+    def push_stage(_: dict) -> dict:
+        commit_and_push(repo_path, f"feat: {args.goal[:60]}")
+        return {"pushed": True}
+
+    # 5) Enterprise Tester (comprehensive QA) and local quality gates. The
+    # review only needs the patch, so it overlaps with apply, push and checks.
+    def tester_stage(a: dict) -> dict:
+        console.print("[bold yellow]🧪 Enterprise QA Phase[/bold yellow]")
+        system_test, prompt_test = build_tester_prompt(
+            role_texts["tester"],
+            a["plan"],
+            a["patch"],
+            a["plan_complexity"],
+            security_focus=security_focus,
+            performance_critical="performance" in args.goal.lower(),
         )
-    )
-
-    if args.dry_run:
-        rprint("[yellow]Dry run. No changes applied.[/yellow]")
-        return
-
-    # 4) Branch, apply, commit
-    ensure_branch(repo_path, args.scope)
-    apply_patch(repo_path, patch)
-    commit_and_push(repo_path, f"feat: {args.goal[:60]}")
-
-    # 5) Enterprise Tester (comprehensive QA)
-    console.print("[bold yellow]🧪 Enterprise QA Phase[/bold yellow]")
-    system_test = f"Du bist ein Senior QA Engineer & Security Auditor. Führe comprehensive Quality Audit durch. Komplexität: {plan_complexity.upper()}"
-
-    prompt_test = f"""{read('roles/tester.txt')}
+        test_result = complete_hedged(
+            hedges["tester"],
+            tester_model,
+            system_test,
+            prompt_test,
+            max_tokens=tester_tokens,
+            cache_tag=test_tag,
+        )
+        test_feedback = test_result.text
 
-ARCHITECT PLAN:
-{plan}
+        # Log tester cost
+        tester_cost = budget_monitor.log_completion(
+            test_result, "tester", a["plan_complexity"], args.goal[:50]
+        )
+        console.print(
+            Panel(test_feedback, title=f"🧪 QA Assessment (Cost: {tester_cost:.3f}€)")
+        )
+        return {"test_feedback": test_feedback, "tester_cost": tester_cost}
+
+    def fix_failing_checks(a: dict, logs: str, pending: list):
+        """Let the coder fix failing checks in the conversation of its patch.
+
+        Every turn applies an incremental patch and reruns only the failed
+        command and those after it. The history is compacted to the original
+        exchange plus the latest turn; older turns become one-line summaries.
+        """
+        runner_cfg = cfg.get("runner", {})
+        max_chars = int(runner_cfg.get("failure_output_chars", 3000))
+        max_turns = max(1, int(cfg["guards"].get("max_turns", 8)))
+        system_code, prompt_code = coder_prompt(a)
+        marker_answer = f"{BEGIN_PATCH}\n{a['patch']}\n{END_PATCH}"
+        base = [(prompt_code, marker_answer)]
+        last = []
+        earlier = []
+        last_summary = ""
+        spent = []
+        for turn in range(1, max_turns + 1):
+            commands = [" ".join(c) for c in pending]
+            console.print(
+                f"[yellow]🩹 Check-Fix {turn}/{max_turns}: {commands[0]}[/yellow]"
+            )
+            prompt = build_check_fix_prompt(
+                logs[-max_chars:],
+                commands,
+                turn,
+                max_turns,
+                earlier,
+                edit_blocks=use_edit_blocks,
+            )
+            history = as_history(base + last, cached={0, len(last)})
+            if agentic:
+                result = complete_agentic(
+                    code_model, system_code, prompt, code_tokens, history=history
+                )
+            else:
+                result = complete(
+                    code_model,
+                    system_code,
+                    prompt,
+                    max_tokens=code_tokens,
+                    cache_tag=template_version(coder_template),
+                    history=history,
+                )
+            spent.append(
+                budget_monitor.log_completion(
+                    result, "coder", a["plan_complexity"], args.goal[:50]
+                )
+            )
+            if last:
+                earlier.append(f"Versuch {turn - 1}: {last_summary}")
+            last = [(prompt, result.text)]
+            fix, error, _ = to_patch(result.text)
+            if error:
+                last_summary = f"Fix nicht anwendbar ({error.splitlines()[0]})"
+                logs = f"Fix-Patch nicht anwendbar:\n{error}\n\n{logs}"
+                continue
+            apply_patch(repo_path, fix)
+            if agentic:
+                repo_tools.clear()
+            ok, new_logs, pending = run_commands(repo_path, pending)
+            logs = new_logs
+            if ok:
+                console.print(
+                    f"[green]✅ Checks green after {turn} fix turn(s)[/green]"
+                )
+                return True, logs, sum(spent)
+            last_summary = f"angewendet, {' '.join(pending[0])} schlägt weiter fehl"
+        return False, logs, sum(spent)
+
+    def checks_stage(a: dict) -> dict:
+        cmds, skipped = resolve_check_commands(repo_path)
+        fix_cost = 0.0
+        if not cmds:
+            ok_local, logs = True, skipped
+        else:
+            ok_local, logs, pending = run_commands(repo_path, cmds)
+            if not ok_local and cfg.get("runner", {}).get("fix_failing_checks", True):
+                console.print(Panel(logs[-2000:], title="🔧 Local Checks (failed)"))
+                ok_local, logs, fix_cost = fix_failing_checks(a, logs, pending)
+        console.print(Panel(logs, title="🔧 Local Checks"))
+        return {"ok_local": ok_local, "check_logs": logs, "fix_cost": fix_cost}
+
+    def gate_stage(a: dict) -> dict:
+        # Enhanced quality gate
+        qa_passed, has_critical_issues = parse_qa_verdict(a["test_feedback"])
+        if not a["ok_local"] or not qa_passed or has_critical_issues:
+            console.print("[red]❌ Quality gates failed. No PR created.[/red]")
+            if has_critical_issues:
+                console.print(
+                    "[red]🚨 Critical P1 issues detected - "
+                    "requires fixes before deployment[/red]"
+                )
+            raise PipelineStop("quality gates failed")
+        return {"gate_passed": True}
 
-IMPLEMENTED CODE PREVIEW:
-{patch[:1000]}{'...' if len(patch) > 1000 else ''}
+    # 6) Enterprise Documentation
+    def docwriter_stage(a: dict) -> dict:
+        console.print("[bold blue]📝 Enterprise Documentation Phase[/bold blue]")
+        system_doc, prompt_doc = build_docwriter_prompt(
+            role_texts["docwriter"],
+            a["plan"],
+            args.goal,
+            a["plan_complexity"],
+            target_cost_per_task,
+            a["patch"],
+            a["test_feedback"],
+            a["ok_local"],
+        )
 
-TEST CONTEXT:
-- Komplexität: {plan_complexity.upper()}
-- Security Focus: {'High' if complexity in [ComplexityLevel.HIGH, ComplexityLevel.ENTERPRISE] else 'Standard'}
-- Performance Critical: {'Yes' if 'performance' in args.goal.lower() else 'Standard'}
+        doc_result = complete_hedged(
+            hedges["docwriter"],
+            doc_model,
+            system_doc,
+            prompt_doc,
+            max_tokens=doc_tokens,
+            cache_tag=template_version("roles/docwriter.txt"),
+        )
 
-QUALITÄTS-STANDARD: Übertreffe Claude 4 Sonnet Max durch systematische Tiefe.
-"""
+        # Log docwriter cost
+        doc_cost = budget_monitor.log_completion(
+            doc_result, "docwriter", a["plan_complexity"], args.goal[:50]
+        )
+        return {"pr_body": doc_result.text, "doc_cost": doc_cost}
 
-    test_feedback = complete(
-        tester_model, system_test, prompt_test, max_tokens=tester_tokens
-    )
-    ok_local, logs = run_checks(repo_path)
-
-    # Log tester cost
-    tester_cost = budget_monitor.log_cost(
-        tester_model,
-        "tester",
-        len(prompt_test.split()),
-        len(test_feedback.split()),
-        plan_complexity,
-        args.goal[:50],
+    # 7) Enterprise PR Creation
+    def pr_stage(a: dict) -> dict:
+        create_pr(
+            title=f"feat: {args.goal[:60]}", body=a["pr_body"], repo_path=repo_path
+        )
+        console.print(
+            "[green]✅ Enterprise PR created with comprehensive documentation[/green]"
+        )
+        return {"pr_created": True}
+
+    def applying(_: dict) -> bool:
+        return not args.dry_run
+
+    pipeline = Pipeline(
+        [
+            Stage("context", collect_stage, outputs=["context_str"]),
+            Stage(
+                "architect",
+                architect_stage,
+                inputs=["context_str"],
+                outputs=["plan", "allow_deps", "plan_complexity", "architect_cost"],
+            ),
+            Stage(
+                "coder",
+                coder_stage,
+                inputs=["context_str", "plan", "allow_deps", "plan_complexity"],
+                outputs=["patch", "coder_cost"],
+            ),
+            Stage(
+                "apply",
+                apply_stage,
+                inputs=["patch"],
+                outputs=["applied"],
+                when=applying,
+            ),
+            # Pushed after the checks so that check fixes are part of the commit
+            Stage(
+                "push",
+                push_stage,
+                inputs=["applied"],
+                outputs=["pushed"],
+                after=["checks"],
+            ),
+            Stage(
+                "tester",
+                tester_stage,
+                inputs=["plan", "patch", "plan_complexity"],
+                outputs=["test_feedback", "tester_cost"],
+                when=applying,
+            ),
+            Stage(
+                "checks",
+                checks_stage,
+                inputs=[
+                    "applied",
+                    "patch",
+                    "context_str",
+                    "plan",
+                    "allow_deps",
+                    "plan_complexity",
+                ],
+                outputs=["ok_local", "check_logs", "fix_cost"],
+                checkpoint=False,
+            ),
+            Stage(
+                "gate",
+                gate_stage,
+                inputs=["test_feedback", "ok_local"],
+                outputs=["gate_passed"],
+                checkpoint=False,
+            ),
+            Stage(
+                "docwriter",
+                docwriter_stage,
+                inputs=[
+                    "gate_passed",
+                    "plan",
+                    "plan_complexity",
+                    "patch",
+                    "test_feedback",
+                    "ok_local",
+                ],
+                outputs=["pr_body", "doc_cost"],
+            ),
+            Stage(
+                "pr",
+                pr_stage,
+                inputs=["pr_body", "pushed"],
+                outputs=["pr_created"],
+                when=lambda _: args.pr,
+            ),
+        ],
+        max_workers=int(cfg.get("pipeline", {}).get("max_workers", 4)),
     )
-
+    if checkpoint is None:
+        checkpoint = RunCheckpoint.create(
+            {
+                "goal": args.goal,
+                "context_files": args.context_files,
+                "context_mode": args.context_mode,
+                "edit_files": args.edit_files,
+                "scope": args.scope,
+                "force_model": args.force_model,
+            },
+            runs_dir,
+        )
+    rewind = False
+    if args.from_stage:
+        if args.from_stage not in pipeline.stages:
+            raise SystemExit(
+                f"Unknown stage '{args.from_stage}' "
+                f"(stages: {', '.join(pipeline.stages)})"
+            )
+        rerun = pipeline.downstream([args.from_stage])
+        # The old patch is in the tree; a new one must apply to the base instead
+        rewind = "apply" in rerun and "apply" in checkpoint.stages
+        if rewind and "push" in checkpoint.stages:
+            raise SystemExit(
+                f"❌ Run {checkpoint.run_id} already pushed its patch - "
+                f"start a new run instead of --from-stage {args.from_stage}"
+            )
+        if rewind and not checkpoint.base_commit:
+            raise SystemExit(
+                f"❌ Run {checkpoint.run_id} has no recorded base commit - "
+                "cannot undo its applied patch"
+            )
+        checkpoint.drop_stages(rerun)
+    restored = checkpoint.load_artifacts()
     console.print(
-        Panel(test_feedback, title=f"🧪 QA Assessment (Cost: {tester_cost:.3f}€)")
+        f"[cyan]🧾 Run {checkpoint.run_id}"
+        + (f" resumed after: {', '.join(checkpoint.stages)}" if restored else "")
+        + f" (resume with --resume {checkpoint.run_id})[/cyan]"
     )
-    console.print(Panel(logs, title="🔧 Local Checks"))
-
-    # Enhanced quality gate
-    qa_passed = "PASS" in test_feedback or "OK" in test_feedback
-    has_critical_issues = "P1" in test_feedback and "Critical" in test_feedback
 
-    if not ok_local or not qa_passed or has_critical_issues:
-        console.print("[red]❌ Quality gates failed. No PR created.[/red]")
-        if has_critical_issues:
+    if applying(restored):
+        prepare_branch()
+        if rewind:
             console.print(
-                "[red]🚨 Critical P1 issues detected - requires fixes before deployment[/red]"
+                f"[yellow]↩️ Resetting {args.scope} to "
+                f"{checkpoint.base_commit[:12]} before reapplying the patch[/yellow]"
             )
-        return
-
-    # 6) Enterprise Documentation
-    console.print("[bold blue]📝 Enterprise Documentation Phase[/bold blue]")
-    system_doc = f"Du bist ein Senior Technical Writer & Documentation Architect. Erstelle enterprise-grade Dokumentation. Komplexität: {plan_complexity.upper()}"
-
-    prompt_doc = f"""{read('roles/docwriter.txt')}
-
-DOKUMENTATIONS-KONTEXT:
-- Aufgabe: {args.goal}
-- Komplexität: {plan_complexity.upper()}
-- Geschätzte Kosten: {target_cost_per_task:.3f}€
-- Implementierte Änderungen: {len(patch.splitlines())} Zeilen
+            reset_hard(repo_path, checkpoint.base_commit)
+        elif not checkpoint.base_commit:
+            checkpoint.save_base_commit(head_commit(repo_path))
+    result = pipeline.run(restored, on_stage_done=checkpoint.save_stage)
+    artifacts = result.artifacts
+    console.print(timing_table(result))
 
-ARCHITECT PLAN:
-{plan}
-
-QA ASSESSMENT:
-{test_feedback}
-
-LOKALE TESTS:
-Status: {'✅ PASSED' if ok_local else '❌ FAILED'}
-
-QUALITÄTS-STANDARD: Übertreffe Claude 4 Sonnet Max durch technische Präzision.
-"""
-
-    pr_body = complete(doc_model, system_doc, prompt_doc, max_tokens=doc_tokens)
+    if args.dry_run:
+        rprint("[yellow]Dry run. No changes applied.[/yellow]")
+        return
+    if result.stopped:
+        return
 
-    # Log docwriter cost
-    doc_cost = budget_monitor.log_cost(
-        doc_model,
-        "docwriter",
-        len(prompt_doc.split()),
-        len(pr_body.split()),
-        plan_complexity,
-        args.goal[:50],
+    total_cost = sum(
+        artifacts.get(key, 0.0)
+        for key in (
+            "architect_cost",
+            "coder_cost",
+            "fix_cost",
+            "tester_cost",
+            "doc_cost",
+        )
     )
 
-    # 7) Enterprise PR Creation
-    total_cost = architect_cost + coder_cost + tester_cost + doc_cost
-
     # Final budget update
     final_budget_status = budget_monitor.check_budget_status()
 
@@ -435,12 +1373,7 @@ QUALITÄTS-STANDARD: Übertreffe Claude 4 Sonnet Max durch technische Präzision
         )
     )
 
-    if args.pr:
-        create_pr(title=f"feat: {args.goal[:60]}", body=pr_body, repo_path=repo_path)
-        console.print(
-            "[green]✅ Enterprise PR created with comprehensive documentation[/green]"
-        )
-    else:
+    if not args.pr:
         console.print("[yellow]ℹ️  PR not requested (use --pr flag)[/yellow]")
 
     # Show budget warning if approaching limits
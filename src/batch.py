@@ -0,0 +1,477 @@
+"""
+Message Batches Mode for Bulk Goal Processing
+Runs one pipeline stage for many goals as a single Message Batch at half price.
+
+Stage dependencies are kept: all architect requests form one batch, the coder
+requests for every goal with a plan form the next one, and so on. Progress is
+persisted after each step, so an interrupted run resumes polling the batches
+that were already submitted instead of paying for them again.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+from .budget_monitor import BudgetMonitor
+from .complexity_analyzer import ComplexityAnalyzer, ComplexityLevel
+from .context import collect_context
+from .edit_blocks import BEGIN_EDITS, END_EDITS, EditBlockError, edits_to_patch
+from .git_ops import (
+    apply_patch,
+    branch_exists,
+    check_patch,
+    checkout,
+    commit_and_push,
+    create_pr,
+    current_branch,
+    ensure_branch,
+)
+from .llm import CompletionResult, Usage, client
+from .patch_stream import (
+    BEGIN_PATCH,
+    END_PATCH,
+    extract_between,
+    file_header_lines,
+    validate_patch_path,
+)
+from .prompts import (
+    build_architect_prompt,
+    build_coder_prompt,
+    build_docwriter_prompt,
+    build_tester_prompt,
+    parse_plan_flags,
+    parse_qa_verdict,
+)
+from .stage_settings import resolve_stage_settings
+from .test_runner import run_checks
+
+logger = logging.getLogger(__name__)
+console = Console()
+
+
+@dataclass
+class BatchGoal:
+    """One goal of a batch file and its pipeline progress."""
+
+    goal_id: str
+    goal: str
+    context_files: List[str]
+    scope: str
+    complexity: str = ""
+    plan: str = ""
+    plan_complexity: str = ""
+    allow_deps: bool = False
+    patch: str = ""
+    applied: bool = False
+    ok_local: Optional[bool] = None
+    check_logs: str = ""
+    test_feedback: str = ""
+    pr_body: str = ""
+    status: str = "pending"  # pending | failed | done
+    error: str = ""
+    costs: Dict[str, float] = field(default_factory=dict)
+
+
+def load_goals(batch_file: str, default_scope: str) -> List[BatchGoal]:
+    """Read a JSONL batch file with one ``{"goal": ...}`` object per line.
+
+    Optional keys: ``id``, ``context_files`` (string or list) and ``scope``.
+    """
+    goals = []
+    with open(batch_file, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise SystemExit(f"{batch_file}:{lineno}: invalid JSON: {e}")
+            if not data.get("goal"):
+                raise SystemExit(f"{batch_file}:{lineno}: missing 'goal'")
+
+            # custom_id must match [a-zA-Z0-9_-]{1,64}
+            raw_id = str(data.get("id") or f"goal-{lineno:04d}")
+            goal_id = re.sub(r"[^A-Za-z0-9_-]", "-", raw_id)[:64]
+            files = data.get("context_files", [])
+            if isinstance(files, str):
+                files = files.split()
+            goals.append(
+                BatchGoal(
+                    goal_id=goal_id,
+                    goal=data["goal"],
+                    context_files=files,
+                    scope=data.get("scope") or f"{default_scope}-{goal_id}",
+                )
+            )
+
+    ids = [g.goal_id for g in goals]
+    if len(ids) != len(set(ids)):
+        raise SystemExit(f"{batch_file}: goal ids must be unique")
+    return goals
+
+
+class BatchRunner:
+    """Drives all goals of a batch file through the pipeline stage by stage."""
+
+    def __init__(
+        self,
+        cfg: Dict,
+        repo_path: str,
+        budget_monitor: BudgetMonitor,
+        force_model: Optional[str] = None,
+        use_context_cache: bool = True,
+        state_dir: str = ".ai_agents_cache/batches",
+    ):
+        self.cfg = cfg
+        self.repo_path = repo_path
+        self.budget_monitor = budget_monitor
+        self.force_model = force_model
+        self.use_context_cache = use_context_cache
+        self.edit_blocks = (
+            cfg.get("policy", {}).get("coder_edit_format", "diff") == "edit_blocks"
+        )
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.poll_interval_s = cfg.get("batch", {}).get("poll_interval_s", 60)
+        self.target_cost = cfg.get("budget", {}).get("target_cost_per_task", 0.440)
+        self.analyzer = ComplexityAnalyzer()
+
+        self.goals: List[BatchGoal] = []
+        self.batches: Dict[str, str] = {}
+        self.completed: List[str] = []
+        self.state_file: Optional[Path] = None
+
+    def _load_state(self, batch_file: str) -> bool:
+        """Resume from the state of an earlier run of the same batch file."""
+        with open(batch_file, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        self.state_file = self.state_dir / f"{Path(batch_file).stem}-{digest}.json"
+        if not self.state_file.exists():
+            return False
+
+        with open(self.state_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.goals = [BatchGoal(**g) for g in data["goals"]]
+        self.batches = data.get("batches", {})
+        self.completed = data.get("completed", [])
+        console.print(
+            f"[cyan]↻ Resuming batch run {self.state_file.name} "
+            f"(completed: {', '.join(self.completed) or 'none'})[/cyan]"
+        )
+        return True
+
+    def _save_state(self):
+        data = {
+            "goals": [asdict(g) for g in self.goals],
+            "batches": self.batches,
+            "completed": self.completed,
+        }
+        with open(self.state_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+    def _context(self, goal: BatchGoal) -> str:
+        if not goal.context_files:
+            return ""
+        return collect_context(
+            self.repo_path, goal.context_files, goal.goal, self.use_context_cache
+        )
+
+    def _read_role(self, role: str) -> str:
+        if role == "coder" and self.edit_blocks:
+            role = "coder_edits"
+        with open(f"roles/{role}.txt", "r", encoding="utf-8") as f:
+            return f.read()
+
+    def _request_params(self, stage: str, goal: BatchGoal) -> Optional[Dict]:
+        """Build the Messages API params of ``stage`` for ``goal`` (None = skip)."""
+        if goal.status != "pending":
+            return None
+
+        complexity = ComplexityLevel(goal.complexity)
+        settings = resolve_stage_settings(self.cfg, complexity, self.force_model)
+
+        if stage == "architect":
+            system, prompt = build_architect_prompt(
+                self._read_role("architect"),
+                goal.goal,
+                goal.complexity,
+                self.target_cost,
+                self._context(goal),
+                len(goal.context_files),
+            )
+        elif stage == "coder":
+            context_str = self._context(goal)
+            system, prompt = build_coder_prompt(
+                self._read_role("coder"),
+                goal.plan,
+                goal.plan_complexity,
+                False,
+                goal.allow_deps,
+                self.target_cost,
+                context_str,
+                len(goal.context_files),
+                context_cached=bool(context_str) and self.use_context_cache,
+            )
+        elif stage == "tester":
+            system, prompt = build_tester_prompt(
+                self._read_role("tester"),
+                goal.plan,
+                goal.patch,
+                goal.plan_complexity,
+                security_focus=complexity
+                in [ComplexityLevel.HIGH, ComplexityLevel.ENTERPRISE],
+                performance_critical="performance" in goal.goal.lower(),
+            )
+        else:
+            qa_passed, has_critical_issues = parse_qa_verdict(goal.test_feedback)
+            if goal.ok_local is False or not qa_passed or has_critical_issues:
+                goal.status = "failed"
+                goal.error = "Quality gates failed"
+                return None
+            system, prompt = build_docwriter_prompt(
+                self._read_role("docwriter"),
+                goal.plan,
+                goal.goal,
+                goal.plan_complexity,
+                self.target_cost,
+                goal.patch,
+                goal.test_feedback,
+                goal.ok_local is not False,
+            )
+
+        return {
+            "model": settings.models[stage],
+            "max_tokens": settings.max_tokens[stage],
+            "system": system,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+
+    def _submit(self, stage: str) -> Optional[str]:
+        if self.budget_monitor.check_budget_status()["budget_exceeded"]:
+            self._save_state()
+            raise SystemExit(
+                f"❌ Budget exceeded - {stage} batch not submitted (resume later)"
+            )
+
+        requests = []
+        for goal in self.goals:
+            params = self._request_params(stage, goal)
+            if params is not None:
+                requests.append({"custom_id": goal.goal_id, "params": params})
+        self._save_state()
+
+        if not requests:
+            return None
+
+        batch = client().messages.batches.create(requests=requests)
+        console.print(
+            f"[cyan]📦 Submitted {stage} batch {batch.id} "
+            f"({len(requests)} requests)[/cyan]"
+        )
+        return batch.id
+
+    def _wait(self, batch_id: str):
+        """Poll until the batch has ended."""
+        while True:
+            batch = client().messages.batches.retrieve(batch_id)
+            counts = batch.request_counts
+            if batch.processing_status == "ended":
+                console.print(
+                    f"[green]✅ Batch {batch_id} ended: {counts.succeeded} succeeded, "
+                    f"{counts.errored} errored, {counts.expired} expired[/green]"
+                )
+                return
+            logger.info(
+                f"Batch {batch_id} {batch.processing_status}: "
+                f"{counts.processing} processing"
+            )
+            time.sleep(self.poll_interval_s)
+
+    def _handle_result(self, stage: str, goal: BatchGoal, message: Any):
+        text = "".join(
+            part.text for part in message.content if getattr(part, "type", "") == "text"
+        )
+        result = CompletionResult(
+            text=text,
+            model=message.model,
+            usage=Usage.from_api(message.usage),
+            stop_reason=message.stop_reason,
+        )
+        goal.costs[stage] = self.budget_monitor.log_completion(
+            result,
+            stage,
+            goal.plan_complexity or goal.complexity,
+            goal.goal[:50],
+            batch=True,
+        )
+
+        if stage == "architect":
+            goal.plan = text
+            goal.allow_deps, goal.plan_complexity = parse_plan_flags(
+                text, goal.complexity
+            )
+        elif stage == "coder":
+            if self.edit_blocks:
+                edits = extract_between(text, BEGIN_EDITS, END_EDITS)
+                if not edits:
+                    goal.status = "failed"
+                    goal.error = (
+                        "No edits between ***BEGIN_EDITS*** and ***END_EDITS***"
+                    )
+                    return
+                try:
+                    patch = edits_to_patch(self.repo_path, edits)
+                except EditBlockError as e:
+                    goal.status = "failed"
+                    goal.error = f"Invalid edit block: {e}"
+                    return
+            else:
+                patch = extract_between(text, BEGIN_PATCH, END_PATCH)
+            if not patch:
+                goal.status = "failed"
+                goal.error = "No patch between ***BEGIN_PATCH*** and ***END_PATCH***"
+                return
+            for header in file_header_lines(patch):
+                error = validate_patch_path(self.repo_path, header)
+                if error:
+                    goal.status = "failed"
+                    goal.error = error
+                    return
+            goal.patch = patch
+        elif stage == "tester":
+            goal.test_feedback = text
+        else:
+            goal.pr_body = text
+            goal.status = "done"
+
+    def _collect(self, stage: str, batch_id: str):
+        by_id = {g.goal_id: g for g in self.goals}
+        for entry in client().messages.batches.results(batch_id):
+            goal = by_id.get(entry.custom_id)
+            if goal is None:
+                continue
+            if entry.result.type == "succeeded":
+                self._handle_result(stage, goal, entry.result.message)
+            else:
+                goal.status = "failed"
+                goal.error = f"{stage} request {entry.result.type}"
+                logger.warning(f"{goal.goal_id}: {goal.error}")
+
+    def _run_stage(self, stage: str):
+        if stage in self.completed:
+            return
+
+        console.print(f"[bold cyan]📦 Batch stage: {stage}[/bold cyan]")
+        if stage not in self.batches:
+            batch_id = self._submit(stage)
+            if batch_id is None:
+                self.completed.append(stage)
+                self._save_state()
+                return
+            self.batches[stage] = batch_id
+            self._save_state()
+
+        self._wait(self.batches[stage])
+        self._collect(stage, self.batches[stage])
+        self.completed.append(stage)
+        self._save_state()
+
+    def _apply_all(self):
+        """Apply every patch on its own branch and run the local checks."""
+        if "apply" in self.completed:
+            return
+
+        base = current_branch(self.repo_path)
+        for goal in self.goals:
+            if goal.status != "pending" or goal.applied:
+                continue
+            try:
+                if not branch_exists(self.repo_path, goal.scope):
+                    ensure_branch(self.repo_path, goal.scope)
+                    apply_patch(self.repo_path, goal.patch)
+                else:
+                    # An interrupted run created the branch and may have
+                    # committed the patch before its state was saved
+                    checkout(self.repo_path, goal.scope)
+                    if check_patch(self.repo_path, goal.patch, reverse=True):
+                        apply_patch(self.repo_path, goal.patch)
+                    else:
+                        logger.info(f"{goal.goal_id}: patch already on {goal.scope}")
+                commit_and_push(self.repo_path, f"feat: {goal.goal[:60]}")
+                goal.ok_local, goal.check_logs = run_checks(self.repo_path)
+                goal.applied = True
+            except (RuntimeError, ValueError) as e:
+                goal.status = "failed"
+                goal.error = str(e).strip().splitlines()[-1]
+                logger.error(f"{goal.goal_id}: apply failed: {e}")
+            finally:
+                checkout(self.repo_path, base)
+            self._save_state()
+
+        self.completed.append("apply")
+        self._save_state()
+
+    def _create_prs(self):
+        base = current_branch(self.repo_path)
+        for goal in self.goals:
+            if goal.status != "done" or not goal.applied:
+                continue
+            try:
+                checkout(self.repo_path, goal.scope)
+                create_pr(
+                    title=f"feat: {goal.goal[:60]}",
+                    body=goal.pr_body,
+                    repo_path=self.repo_path,
+                )
+            except (RuntimeError, ValueError) as e:
+                logger.error(f"{goal.goal_id}: PR creation failed: {e}")
+            finally:
+                checkout(self.repo_path, base)
+
+    def _print_summary(self):
+        table = Table(title="📦 Batch Results")
+        table.add_column("Goal")
+        table.add_column("Status")
+        table.add_column("Cost (€)", justify="right")
+        table.add_column("Details")
+        for goal in self.goals:
+            status = {"done": "✅ done", "failed": "❌ failed"}.get(
+                goal.status, "⏸ pending"
+            )
+            table.add_row(
+                goal.goal_id,
+                status,
+                f"{sum(goal.costs.values()):.3f}",
+                goal.error or goal.goal[:50],
+            )
+        console.print(table)
+
+    def run(self, batch_file: str, scope: str, apply: bool = True, pr: bool = False):
+        """Run (or resume) all goals of ``batch_file`` through the pipeline."""
+        if not self._load_state(batch_file):
+            self.goals = load_goals(batch_file, scope)
+            for goal in self.goals:
+                goal.complexity = self.analyzer.analyze_complexity(
+                    goal.goal, goal.context_files
+                ).value
+            self._save_state()
+
+        for stage in ("architect", "coder"):
+            self._run_stage(stage)
+        if apply:
+            self._apply_all()
+        for stage in ("tester", "docwriter"):
+            self._run_stage(stage)
+        if apply and pr:
+            self._create_prs()
+
+        self._print_summary()
+        console.print(f"[dim]Batch state: {self.state_file}[/dim]")
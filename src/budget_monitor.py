@@ -4,6 +4,7 @@ Tracks API costs and optimizes model selection to stay within budget constraints
 """
 
 import json
+import threading
 from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -12,6 +13,20 @@ from typing import Any, Dict, List, Optional
 import yaml
 from rich.console import Console
 
+# Message Batches are billed at half the regular token price
+BATCH_DISCOUNT = 0.5
+
+# Prompt-cache writes cost 25% more than regular input, reads 10% of it
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+# Most expensive first; downgrades move right, escalations move left
+MODEL_HIERARCHY = [
+    "gpt-4o-2024-08-06",
+    "claude-3-5-sonnet-latest",
+    "claude-3-5-haiku-latest",
+]
+
 
 @dataclass
 class CostEntry:
@@ -25,17 +40,26 @@ class CostEntry:
     cost_eur: float
     complexity: str
     goal_summary: str
+    batch: bool = False
+    cache_read_tokens: int = 0
+    cache_creation_tokens: int = 0
+    stop_reason: Optional[str] = None
+    latency_s: float = 0.0
 
 
 class BudgetMonitor:
     """Monitors API costs and enforces budget constraints."""
 
-    def __init__(self, config_path: str = "config.yaml"):
+    def __init__(
+        self,
+        config_path: str = "config.yaml",
+        cost_log_path: str = ".ai_agents_costs.json",
+    ):
         self.config = self._load_config(config_path)
         self.budget_config = self.config.get("budget", {})
         self.guards = self.config.get("guards", {})
         self.console = Console()
-        self.cost_log_path = Path(".ai_agents_costs.json")
+        self.cost_log_path = Path(cost_log_path)
 
         # Budget limits
         self.monthly_budget = self.guards.get("budget_cap_eur", 150.0)
@@ -46,6 +70,7 @@ class BudgetMonitor:
 
         # Cost tracking
         self.costs = self._load_cost_history()
+        self._lock = threading.Lock()  # stages log costs from worker threads
 
     def _load_config(self, config_path: str) -> Dict:
         """Load configuration with fallback defaults."""
@@ -77,7 +102,13 @@ class BudgetMonitor:
             json.dump(data, f, indent=2)
 
     def estimate_task_cost(
-        self, model: str, input_tokens: int, output_tokens: int
+        self,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        batch: bool = False,
+        cache_read_tokens: int = 0,
+        cache_creation_tokens: int = 0,
     ) -> float:
         """Estimate cost for a task based on model and token counts."""
         # Model pricing (EUR per 1K tokens, approximate)
@@ -91,10 +122,19 @@ class BudgetMonitor:
         default_price = {"input": 0.002, "output": 0.008}
         model_price = pricing.get(model, default_price)
 
-        input_cost = (input_tokens / 1000) * model_price["input"]
+        input_cost = (
+            (
+                input_tokens
+                + cache_creation_tokens * CACHE_WRITE_MULTIPLIER
+                + cache_read_tokens * CACHE_READ_MULTIPLIER
+            )
+            / 1000
+            * model_price["input"]
+        )
         output_cost = (output_tokens / 1000) * model_price["output"]
 
-        return input_cost + output_cost
+        cost = input_cost + output_cost
+        return cost * BATCH_DISCOUNT if batch else cost
 
     def log_cost(
         self,
@@ -104,9 +144,21 @@ class BudgetMonitor:
         output_tokens: int,
         complexity: str,
         goal_summary: str,
+        batch: bool = False,
+        cache_read_tokens: int = 0,
+        cache_creation_tokens: int = 0,
+        stop_reason: Optional[str] = None,
+        latency_s: float = 0.0,
     ):
         """Log a cost entry."""
-        cost = self.estimate_task_cost(model, input_tokens, output_tokens)
+        cost = self.estimate_task_cost(
+            model,
+            input_tokens,
+            output_tokens,
+            batch,
+            cache_read_tokens,
+            cache_creation_tokens,
+        )
 
         entry = CostEntry(
             timestamp=datetime.now().isoformat(),
@@ -117,13 +169,54 @@ class BudgetMonitor:
             cost_eur=cost,
             complexity=complexity,
             goal_summary=goal_summary[:100],  # Truncate for storage
+            batch=batch,
+            cache_read_tokens=cache_read_tokens,
+            cache_creation_tokens=cache_creation_tokens,
+            stop_reason=stop_reason,
+            latency_s=round(latency_s, 3),
         )
 
-        self.costs.append(entry)
-        self._save_cost_history()
+        with self._lock:
+            self.costs.append(entry)
+            self._save_cost_history()
 
         return cost
 
+    def log_completion(
+        self,
+        result: Any,
+        role: str,
+        complexity: str,
+        goal_summary: str,
+        batch: bool = False,
+    ) -> float:
+        """Log the API-reported usage of an ``llm.CompletionResult``.
+
+        Responses served from the local response cache cost nothing and are
+        not logged. Losing hedge requests billed for the result are logged
+        under the same role.
+        """
+        hedge_cost = sum(
+            self.log_completion(extra, role, complexity, goal_summary, batch)
+            for extra in getattr(result, "hedge_costs", [])
+        )
+        if result.cached:
+            return hedge_cost
+        usage = result.usage
+        return hedge_cost + self.log_cost(
+            result.model,
+            role,
+            usage.input_tokens,
+            usage.output_tokens,
+            complexity,
+            goal_summary,
+            batch=batch,
+            cache_read_tokens=usage.cache_read_input_tokens,
+            cache_creation_tokens=usage.cache_creation_input_tokens,
+            stop_reason=result.stop_reason,
+            latency_s=result.latency_s,
+        )
+
     def get_daily_spend(self, date: Optional[datetime] = None) -> float:
         """Get total spend for a specific day."""
         if date is None:
@@ -219,22 +312,23 @@ class BudgetMonitor:
 
     def get_downgraded_model(self, original_model: str) -> str:
         """Get a more cost-effective model alternative."""
-        model_hierarchy = [
-            "gpt-4o-2024-08-06",  # Most expensive
-            "claude-3-5-sonnet-latest",  # Medium cost
-            "claude-3-5-haiku-latest",  # Most cost-effective
-        ]
-
         try:
-            current_index = model_hierarchy.index(original_model)
+            current_index = MODEL_HIERARCHY.index(original_model)
             # Move to next cheaper model
-            if current_index < len(model_hierarchy) - 1:
-                return model_hierarchy[current_index + 1]
+            if current_index < len(MODEL_HIERARCHY) - 1:
+                return MODEL_HIERARCHY[current_index + 1]
         except ValueError:
             pass
 
         # Return most cost-effective if not in hierarchy
-        return "claude-3-5-haiku-latest"
+        return MODEL_HIERARCHY[-1]
+
+    def get_escalation_chain(self, target_model: str) -> List[str]:
+        """Models from the cheapest up to ``target_model``, in escalation order."""
+        if target_model not in MODEL_HIERARCHY:
+            return [target_model]
+        index = MODEL_HIERARCHY.index(target_model)
+        return list(reversed(MODEL_HIERARCHY[index:]))
 
     def get_cost_analysis(self, days: int = 7) -> Dict[str, Any]:
         """Get detailed cost analysis for the last N days."""
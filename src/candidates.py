@@ -0,0 +1,133 @@
+"""
+Parallel Best-of-N Coder Candidates
+Scores concurrently generated patches in scratch worktrees and picks the best one.
+
+Every candidate patch is applied to its own detached ``git worktree`` of HEAD,
+so candidates never touch the target checkout or each other. A candidate is
+ranked by whether it applies, whether the local checks pass and, as a
+tie-breaker, by the size of its diff (smaller is preferred).
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+from .git_ops import add_worktree, apply_patch, check_patch, remove_worktree
+from .llm import CompletionResult
+from .test_runner import resolve_check_commands, run_commands
+
+logger = logging.getLogger(__name__)
+
+# Large untracked directories the checks need but a fresh worktree lacks
+SHARED_DIRS = ("node_modules",)
+
+# git serialises worktree bookkeeping through lock files in .git
+_worktree_lock = threading.Lock()
+
+
+@dataclass
+class Candidate:
+    index: int
+    model: str
+    temperature: Optional[float]
+    result: CompletionResult
+    patch: Optional[str] = None
+    error: Optional[str] = None
+    excerpt: str = ""
+    applies: bool = False
+    checks_ok: bool = False
+    checks_ran: bool = False  # False if no check commands were found
+    check_logs: str = ""
+
+    @property
+    def diff_lines(self) -> int:
+        if not self.patch:
+            return 0
+        return sum(
+            1
+            for line in self.patch.splitlines()
+            if line[:1] in ("+", "-") and not line.startswith(("+++ ", "--- "))
+        )
+
+    @property
+    def score(self) -> Tuple[bool, bool, int]:
+        return (self.applies, self.checks_ok, -self.diff_lines)
+
+    def summary(self) -> str:
+        if not self.applies:
+            status = "does not apply"
+        elif self.checks_ok:
+            status = "checks passed"
+        else:
+            status = "checks failed"
+        temp = "default" if self.temperature is None else f"{self.temperature:g}"
+        return (
+            f"#{self.index + 1} {self.model} (t={temp}): {status}, "
+            f"{self.diff_lines} changed lines"
+        )
+
+
+@contextmanager
+def scratch_worktree(repo_path: str) -> Iterator[str]:
+    """A temporary detached worktree of HEAD, removed afterwards."""
+    path = tempfile.mkdtemp(prefix="ai-agents-candidate-")
+    os.rmdir(path)  # git worktree add wants to create the directory itself
+    with _worktree_lock:
+        add_worktree(repo_path, path)
+    try:
+        for name in SHARED_DIRS:
+            source = os.path.join(os.path.abspath(repo_path), name)
+            if os.path.isdir(source):
+                os.symlink(source, os.path.join(path, name))
+        yield path
+    finally:
+        for name in SHARED_DIRS:
+            link = os.path.join(path, name)
+            if os.path.islink(link):
+                os.unlink(link)
+        with _worktree_lock:
+            remove_worktree(repo_path, path)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def evaluate_candidate(
+    repo_path: str, candidate: Candidate, run_local_checks: bool = True
+):
+    """Apply a candidate in a scratch worktree and record applicability and checks."""
+    if not candidate.patch or candidate.error:
+        return
+    with scratch_worktree(repo_path) as worktree:
+        error = check_patch(worktree, candidate.patch)
+        if error:
+            candidate.error = error
+            return
+        apply_patch(worktree, candidate.patch)
+        candidate.applies = True
+        cmds, skipped = (
+            resolve_check_commands(worktree) if run_local_checks else ([], "")
+        )
+        if cmds:
+            candidate.checks_ok, candidate.check_logs, _ = run_commands(worktree, cmds)
+            candidate.checks_ran = True
+        else:
+            candidate.checks_ok, candidate.check_logs = True, skipped
+    logger.info(f"Candidate {candidate.summary()}")
+
+
+def rank_candidates(
+    repo_path: str, candidates: List[Candidate], run_local_checks: bool = True
+) -> List[Candidate]:
+    """Evaluate all candidates concurrently; best first."""
+    with ThreadPoolExecutor(max_workers=max(1, len(candidates))) as pool:
+        list(
+            pool.map(
+                lambda c: evaluate_candidate(repo_path, c, run_local_checks), candidates
+            )
+        )
+    return sorted(candidates, key=lambda c: c.score, reverse=True)
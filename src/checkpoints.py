@@ -0,0 +1,131 @@
+"""
+Resumable Run Checkpoints
+Persists every pipeline stage output under a run ID so failed runs can resume.
+
+Layout: ``.ai_agents_cache/runs/<run_id>/run.json`` holds the task arguments,
+the completed stages and the branch's base commit, ``<stage>.json`` the outputs
+of each stage.
+"""
+
+import json
+import logging
+import os
+import secrets
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RUNS_DIR = ".ai_agents_cache/runs"
+
+
+def _write_json(path: Path, data: Any):
+    """Atomically write ``data`` so a crash never leaves a partial checkpoint."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class RunCheckpoint:
+    """Stage outputs of one task run."""
+
+    def __init__(self, run_id: str, runs_dir: str = DEFAULT_RUNS_DIR):
+        self.run_id = run_id
+        self.run_dir = Path(runs_dir) / run_id
+        self.meta_file = self.run_dir / "run.json"
+        self.meta: Dict[str, Any] = {}
+        if self.meta_file.exists():
+            with open(self.meta_file, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+
+    @classmethod
+    def create(
+        cls, task: Dict[str, Any], runs_dir: str = DEFAULT_RUNS_DIR
+    ) -> "RunCheckpoint":
+        """Start a new run with a sortable, unique ID."""
+        run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{secrets.token_hex(3)}"
+        checkpoint = cls(run_id, runs_dir)
+        checkpoint.run_dir.mkdir(parents=True, exist_ok=True)
+        checkpoint.meta = {
+            "run_id": run_id,
+            "created": datetime.now().isoformat(),
+            "task": task,
+            "stages": [],
+        }
+        checkpoint._save_meta()
+        return checkpoint
+
+    @classmethod
+    def open(cls, run_id: str, runs_dir: str = DEFAULT_RUNS_DIR) -> "RunCheckpoint":
+        """Open an existing run; ``latest`` selects the most recent one."""
+        if run_id == "latest":
+            runs = list_runs(runs_dir)
+            if not runs:
+                raise SystemExit(f"No runs found in {runs_dir}")
+            run_id = runs[-1]
+        checkpoint = cls(run_id, runs_dir)
+        if not checkpoint.meta:
+            raise SystemExit(f"Unknown run ID: {run_id}")
+        return checkpoint
+
+    @property
+    def task(self) -> Dict[str, Any]:
+        return self.meta.get("task", {})
+
+    @property
+    def stages(self) -> List[str]:
+        return list(self.meta.get("stages", []))
+
+    @property
+    def base_commit(self) -> Optional[str]:
+        """Commit of the task branch before the patch was applied."""
+        return self.meta.get("base_commit")
+
+    def save_base_commit(self, commit: str):
+        self.meta["base_commit"] = commit
+        self._save_meta()
+
+    def _save_meta(self):
+        self.meta["updated"] = datetime.now().isoformat()
+        _write_json(self.meta_file, self.meta)
+
+    def _stage_file(self, stage: str) -> Path:
+        return self.run_dir / f"{stage}.json"
+
+    def save_stage(self, stage: str, outputs: Dict[str, Any]):
+        """Persist the outputs of a completed stage."""
+        _write_json(self._stage_file(stage), outputs)
+        if stage not in self.meta["stages"]:
+            self.meta["stages"].append(stage)
+        self._save_meta()
+        logger.info(f"Checkpoint {self.run_id}: saved stage '{stage}'")
+
+    def drop_stages(self, stages: Iterable[str]):
+        """Forget stage outputs so those stages run again."""
+        stages = set(stages)
+        for stage in stages:
+            self._stage_file(stage).unlink(missing_ok=True)
+        self.meta["stages"] = [s for s in self.meta["stages"] if s not in stages]
+        self._save_meta()
+
+    def load_artifacts(self) -> Dict[str, Any]:
+        """Merged outputs of all checkpointed stages."""
+        artifacts: Dict[str, Any] = {}
+        for stage in self.stages:
+            try:
+                with open(self._stage_file(stage), "r", encoding="utf-8") as f:
+                    artifacts.update(json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable checkpoint '{stage}': {e}")
+        return artifacts
+
+
+def list_runs(runs_dir: str = DEFAULT_RUNS_DIR) -> List[str]:
+    """Run IDs in creation order."""
+    root = Path(runs_dir)
+    if not root.is_dir():
+        return []
+    return sorted(p.name for p in root.iterdir() if (p / "run.json").exists())
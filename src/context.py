@@ -1,7 +1,10 @@
-import glob
 import logging
 import pathlib
 
+from .git_index import GitFileIndex
+from .relevance import rank_files
+from .repo_walk import match_specs
+
 logger = logging.getLogger(__name__)
 
 ALLOW_EXT = {".svelte", ".ts", ".tsx", ".js", ".jsx", ".md", ".css", ".scss", ".py"}
@@ -18,65 +21,69 @@ def read_small_file(path: pathlib.Path, max_bytes: int = 200000) -> str:
 
 
 def expand_context_specs(
-    repo_path: str, specs: list[str], limit: int = 12
+    repo_path: str, specs: list[str], limit: int = 12, goal: str = ""
 ) -> list[str]:
-    """Expand file/directory/glob specifications to actual file paths."""
-    root = pathlib.Path(repo_path)
-    files = set()
-
-    for spec in specs:
-        abs_spec = root / spec
-
-        # Direct file
-        if abs_spec.is_file():
-            files.add(spec)
-        # Directory - get all allowed files
-        elif abs_spec.is_dir():
-            for ext in ALLOW_EXT:
-                files.update(
-                    str(p.relative_to(root)) for p in abs_spec.rglob(f"*{ext}")
-                )
-        # Glob pattern
-        else:
-            pattern_files = glob.glob(str(abs_spec), recursive=True)
-            files.update(
-                str(pathlib.Path(f).relative_to(root))
-                for f in pattern_files
-                if pathlib.Path(f).is_file()
+    """Expand file/directory/glob specifications to actual file paths.
+
+    Explicitly named files come first (in spec order), followed by the sorted
+    matches of directory and glob specs. In git repositories the tracked files
+    of the git index are matched in memory; otherwise a single ignore-aware
+    walk is used. If more files match than ``limit`` allows, the matches most
+    relevant to ``goal`` (BM25) are kept.
+    """
+    index = GitFileIndex.open(repo_path)
+    explicit, matched = match_specs(
+        repo_path, specs, ALLOW_EXT, index.paths() if index else None
+    )
+    files = explicit + matched
+    if len(files) > limit:
+        logger.info(f"Context specs matched {len(files)} files, keeping {limit}")
+        if goal and len(explicit) < limit:
+            matched = rank_files(
+                repo_path, goal, matched, limit - len(explicit), ALLOW_EXT
             )
-
-    return list(files)[:limit]
+            files = explicit + matched
+    return files[:limit]
 
 
 def collect_context(
-    repo_path: str, file_list: list[str], goal: str = "", use_cache: bool = True
+    repo_path: str,
+    file_list: list[str],
+    goal: str = "",
+    use_cache: bool = True,
+    limit: int = 12,
 ) -> str:
-    """Collect context with intelligent caching support."""
+    """Collect context with intelligent caching support.
+
+    ``limit`` caps the number of files, with and without the cache.
+    """
     if not use_cache or not goal:
         # Fallback to direct collection
-        return _collect_context_direct(repo_path, file_list)
+        return _collect_context_direct(repo_path, file_list, goal, limit)
 
     # Try to get from cache first
     from .context_cache import ContextCache
 
     cache = ContextCache()
 
-    cached_context = cache.get_cached_context(repo_path, file_list, goal)
+    cached_context = cache.get_cached_context(repo_path, file_list, goal, limit)
     if cached_context:
         return cached_context
 
     # Cache miss - collect context and cache it
-    context = _collect_context_direct(repo_path, file_list)
+    context = _collect_context_direct(repo_path, file_list, goal, limit)
     if context:  # Only cache if we got content
-        cache.cache_context(repo_path, file_list, goal, context)
+        cache.cache_context(repo_path, file_list, goal, context, limit)
 
     return context
 
 
-def _collect_context_direct(repo_path: str, file_list: list[str]) -> str:
+def _collect_context_direct(
+    repo_path: str, file_list: list[str], goal: str = "", limit: int = 12
+) -> str:
     """Direct context collection without caching."""
     root = pathlib.Path(repo_path)
-    expanded_files = expand_context_specs(repo_path, file_list)
+    expanded_files = expand_context_specs(repo_path, file_list, limit, goal)
     buf = []
 
     logger.info(f"Collecting context from {len(expanded_files)} files")
@@ -14,6 +14,8 @@ from typing import Dict, List, Optional, Tuple
 
 from rich.console import Console
 
+from .git_index import GitFileIndex
+
 logger = logging.getLogger(__name__)
 console = Console()
 
@@ -28,6 +30,7 @@ class FileEntry:
     size: int
     content_hash: str
     cached_at: str
+    blob: str = ""  # git blob id when the file was tracked and unmodified
 
 
 @dataclass
@@ -69,10 +72,14 @@ class ContextCache:
         try:
             with open(self.sessions_file, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                return {
-                    sid: CacheSession(**session_data)
-                    for sid, session_data in data.items()
-                }
+                sessions = {}
+                for sid, session_data in data.items():
+                    session_data["files"] = {
+                        path: FileEntry(**entry)
+                        for path, entry in session_data.get("files", {}).items()
+                    }
+                    sessions[sid] = CacheSession(**session_data)
+                return sessions
         except (json.JSONDecodeError, TypeError) as e:
             logger.warning(f"Failed to load cache sessions: {e}")
             return {}
@@ -130,8 +137,15 @@ class ContextCache:
         except Exception:
             return 0.0, 0, ""
 
-    def _has_file_changed(self, file_path: Path, cached_entry: FileEntry) -> bool:
-        """Check if a file has changed since it was cached."""
+    def _has_file_changed(
+        self, file_path: Path, cached_entry: FileEntry, blob: Optional[str] = None
+    ) -> bool:
+        """Check if a file has changed since it was cached.
+
+        An unchanged git blob id answers without reading the file.
+        """
+        if blob and cached_entry.blob:
+            return blob != cached_entry.blob
         if not file_path.exists():
             return True
 
@@ -170,9 +184,16 @@ class ContextCache:
         return session_id
 
     def get_cached_context(
-        self, repo_path: str, file_specs: List[str], goal: str
+        self,
+        repo_path: str,
+        file_specs: List[str],
+        goal: str,
+        limit: Optional[int] = None,
     ) -> Optional[str]:
-        """Get cached context if available and files haven't changed."""
+        """Get cached context if available and files haven't changed.
+
+        ``limit`` caps the number of files (default: ``max_files_per_session``).
+        """
         session_id = self.find_or_create_session(goal, file_specs)
         session = self.sessions[session_id]
 
@@ -180,11 +201,15 @@ class ContextCache:
         from .context import expand_context_specs
 
         actual_files = expand_context_specs(
-            repo_path, file_specs, limit=self.max_files_per_session
+            repo_path,
+            file_specs,
+            limit=self.max_files_per_session if limit is None else limit,
+            goal=goal,
         )
 
         # Check if we have all files cached and they haven't changed
         root = Path(repo_path)
+        index = GitFileIndex.open(repo_path)
         cache_valid = True
         missing_files = []
         changed_files = []
@@ -195,7 +220,11 @@ class ContextCache:
             if file_path not in session.files:
                 missing_files.append(file_path)
                 cache_valid = False
-            elif self._has_file_changed(abs_path, session.files[file_path]):
+            elif self._has_file_changed(
+                abs_path,
+                session.files[file_path],
+                index.blob(file_path) if index else None,
+            ):
                 changed_files.append(file_path)
                 cache_valid = False
 
@@ -225,7 +254,12 @@ class ContextCache:
         return None
 
     def cache_context(
-        self, repo_path: str, file_specs: List[str], goal: str, context_content: str
+        self,
+        repo_path: str,
+        file_specs: List[str],
+        goal: str,
+        context_content: str,
+        limit: Optional[int] = None,
     ):
         """Cache the context content with file metadata."""
         if not self.current_session_id:
@@ -239,7 +273,10 @@ class ContextCache:
         from .context import expand_context_specs
 
         actual_files = expand_context_specs(
-            repo_path, file_specs, limit=self.max_files_per_session
+            repo_path,
+            file_specs,
+            limit=self.max_files_per_session if limit is None else limit,
+            goal=goal,
         )
 
         # Check file count limit
@@ -254,6 +291,7 @@ class ContextCache:
 
         # Cache each file with metadata
         root = Path(repo_path)
+        index = GitFileIndex.open(repo_path)
         cached_files = {}
 
         for file_path in actual_files:
@@ -284,6 +322,7 @@ class ContextCache:
                             size=size,
                             content_hash=content_hash,
                             cached_at=datetime.now().isoformat(),
+                            blob=(index.blob(file_path) if index else None) or "",
                         )
 
                 except Exception as e:
@@ -0,0 +1,210 @@
+"""
+Token-Budget Context Packer
+Picks whole files, line windows or signature outlines to fill a token budget.
+
+Every candidate file of the collected context is scored by lexical overlap
+with the goal and offered in up to three representations: the whole file, the
+line windows around goal terms, and an outline of its signature lines. A
+multiple-choice knapsack (at most one representation per file) then selects
+the combination of highest value that fits the budget, so a single large
+vendored file can no longer crowd out the rest.
+"""
+
+import logging
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from .relevance import path_tokens, tokenize
+from .token_estimator import (
+    TokenEstimator,
+    parse_context_section,
+    split_context_files,
+)
+
+logger = logging.getLogger(__name__)
+
+WINDOW_RADIUS = 6  # lines of context around a line mentioning a goal term
+DP_BUCKETS = 1000  # budget resolution of the knapsack
+
+# Relative value of a representation compared to the whole file
+WINDOW_VALUE = 0.75
+OUTLINE_VALUE = 0.35
+BASE_VALUE = 0.1  # files without any goal term are still worth an outline
+
+_SIGNATURE = re.compile(
+    r"^\s*(?:export\s+|async\s+|public\s+|private\s+|static\s+)*"
+    r"(?:def|class|function|interface|type|enum|import|from|const|let|var)\b"
+    r"|^\s*<script|^\s*@\w+"
+)
+
+
+@dataclass
+class Option:
+    mode: str  # full | window | outline
+    text: str
+    tokens: int
+    value: float
+
+
+@dataclass
+class FileCandidate:
+    path: str
+    content: str
+    label: str = ""  # e.g. " (Skeleton)" when the content is already reduced
+    score: float = 0.0
+    options: List[Option] = field(default_factory=list)
+
+
+@dataclass
+class PackResult:
+    context_str: str
+    tokens: int
+    modes: Dict[str, str]  # path -> chosen mode
+    dropped: List[str]
+
+
+def score_file(goal_terms: Counter, path: str, content: str) -> float:
+    """Lexical overlap of the goal with a file; path matches count double."""
+    if not goal_terms:
+        return 0.0
+    tf = Counter(tokenize(content))
+    in_path = set(path_tokens(path))
+    score = 0.0
+    for term in goal_terms:
+        if tf[term]:
+            score += 1 + math.log(tf[term])
+        if term in in_path:
+            score += 2
+    return score / len(goal_terms)
+
+
+def line_windows(content: str, goal_terms: Counter) -> Optional[str]:
+    """Merged line windows around lines that mention a goal term."""
+    lines = content.splitlines()
+    hits = [
+        i for i, line in enumerate(lines) if goal_terms.keys() & set(tokenize(line))
+    ]
+    if not hits:
+        return None
+    ranges: List[List[int]] = []
+    for i in hits:
+        start, end = max(0, i - WINDOW_RADIUS), min(len(lines), i + WINDOW_RADIUS + 1)
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+    parts = [
+        f"# Zeilen {start + 1}-{end}\n" + "\n".join(lines[start:end])
+        for start, end in ranges
+    ]
+    return "\n...\n".join(parts)
+
+
+def outline(content: str) -> Optional[str]:
+    """Signature lines (imports, classes, functions, exports) of a file."""
+    lines = [line.rstrip() for line in content.splitlines() if _SIGNATURE.match(line)]
+    return "\n".join(lines) if lines else None
+
+
+def _render(f: FileCandidate, option: Option) -> str:
+    label = {"full": f.label, "window": " (Ausschnitte)", "outline": " (Outline)"}
+    return f"=== FILE: {f.path}{label[option.mode]} ===\n{option.text}\n"
+
+
+def _knapsack(files: List[FileCandidate], budget: int) -> List[Optional[Option]]:
+    """Best option per file (or None) within ``budget`` tokens.
+
+    Multiple-choice knapsack by dynamic programming over the budget, scaled
+    down to at most ``DP_BUCKETS`` steps.
+    """
+    unit = max(1, math.ceil(budget / DP_BUCKETS))
+    cap = budget // unit
+
+    def weight(opt: Option) -> int:
+        return math.ceil(opt.tokens / unit)
+
+    value = [0.0] * (cap + 1)
+    picks: List[List[int]] = []
+    for f in files:
+        new, pick = list(value), [-1] * (cap + 1)
+        for k, opt in enumerate(f.options):
+            w = weight(opt)
+            for c in range(w, cap + 1):
+                if value[c - w] + opt.value > new[c]:
+                    new[c], pick[c] = value[c - w] + opt.value, k
+        value = new
+        picks.append(pick)
+
+    chosen: List[Optional[Option]] = [None] * len(files)
+    c = cap
+    for i in reversed(range(len(files))):
+        k = picks[i][c]
+        if k >= 0:
+            chosen[i] = files[i].options[k]
+            c -= weight(chosen[i])
+    return chosen
+
+
+def pack_context(
+    estimator: TokenEstimator,
+    model: str,
+    context_str: str,
+    goal: str,
+    budget: int,
+    keep_full: Optional[Set[str]] = None,
+) -> PackResult:
+    """Fit the files of ``context_str`` into ``budget`` tokens.
+
+    Files in ``keep_full`` (edit targets) are always kept whole; the rest of
+    the budget is packed around them.
+    """
+    keep_full = keep_full or set()
+    head, sections = split_context_files(context_str)
+    total = estimator.estimate(context_str, model)
+    if total <= budget or not sections:
+        modes = {parse_context_section(s)[0]: "full" for s in sections}
+        return PackResult(context_str, total, modes, [])
+
+    goal_terms = Counter(tokenize(goal))
+    files: List[FileCandidate] = []
+    reserved = estimator.estimate(head, model)
+    for section in sections:
+        path, label, content = parse_context_section(section)
+        if path in keep_full:
+            reserved += estimator.estimate(section, model)
+            files.append(FileCandidate(path, content, label))
+            continue
+        f = FileCandidate(path, content, label, score_file(goal_terms, path, content))
+        worth = f.score + BASE_VALUE
+        for mode, text, factor in (
+            ("full", content, 1.0),
+            ("window", line_windows(content, goal_terms), WINDOW_VALUE),
+            ("outline", outline(content), OUTLINE_VALUE),
+        ):
+            if not text or (mode != "full" and len(text) >= len(content)):
+                continue
+            option = Option(mode, text, 0, worth * factor)
+            option.tokens = estimator.estimate(_render(f, option), model)
+            f.options.append(option)
+        files.append(f)
+
+    chosen = _knapsack(files, max(0, budget - reserved))
+    parts, modes, dropped = [head], {}, []
+    for f, option in zip(files, chosen):
+        if f.path in keep_full:
+            option = Option("full", f.content, 0, 0.0)
+        elif option is None:
+            dropped.append(f.path)
+            continue
+        modes[f.path] = "skeleton" if f.label and option.mode == "full" else option.mode
+        parts.append(_render(f, option))
+    packed = "".join(parts)
+    tokens = estimator.estimate(packed, model)
+    logger.info(
+        f"Context packed from ~{total} to ~{tokens} tokens (budget {budget}): "
+        + ", ".join(f"{p}={m}" for p, m in modes.items())
+    )
+    return PackResult(packed, tokens, modes, dropped)
@@ -0,0 +1,237 @@
+"""
+Search/Replace Edit Blocks
+Compact coder output format that is converted into a unified diff for git.
+
+Instead of a full diff with context lines the coder only names the file, the
+exact snippet to replace and its replacement::
+
+    FILE: src/app.py
+    <<<<<<< SEARCH
+    def handler():
+        return None
+    =======
+    def handler():
+        return build_response()
+    >>>>>>> REPLACE
+
+An empty SEARCH section creates a new file. Blocks are applied in order to
+an in-memory copy of each file; the result is rendered with difflib so the
+existing ``git apply`` checks and repair turns keep working unchanged. Files
+keep their line endings: a CRLF file is edited and diffed with CRLF lines.
+
+A ``=======`` line inside the SEARCH or REPLACE text makes the divider
+ambiguous. Every reading is kept and the one with the longest SEARCH text
+that occurs in the file is applied.
+"""
+
+import difflib
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .patch_stream import validate_patch_path
+
+logger = logging.getLogger(__name__)
+
+BEGIN_EDITS = "***BEGIN_EDITS***"
+END_EDITS = "***END_EDITS***"
+
+FILE_PREFIX = "FILE: "
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+
+class EditBlockError(ValueError):
+    """An edit block is malformed or its SEARCH text cannot be located."""
+
+    def __init__(self, message: str, block: str = ""):
+        super().__init__(message)
+        self.block = block
+
+
+@dataclass
+class EditBlock:
+    path: str
+    search: List[str]
+    replace: List[str]
+    # Other (search, replace) splits when the body has several divider lines
+    alternatives: List[Tuple[List[str], List[str]]] = field(default_factory=list)
+
+    def render(self) -> str:
+        """The block in the coder's output format (for repair feedback)."""
+        return "\n".join(
+            [FILE_PREFIX + self.path, SEARCH_MARKER]
+            + self.search
+            + [DIVIDER]
+            + self.replace
+            + [REPLACE_MARKER]
+        )
+
+
+def parse_edit_blocks(text: str) -> List[EditBlock]:
+    """Parse the blocks between the edit markers (or of the whole text)."""
+    lines = text.splitlines()
+    blocks: List[EditBlock] = []
+    path: Optional[str] = None
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith(FILE_PREFIX):
+            path = line[len(FILE_PREFIX) :].strip().strip("`")
+        elif line.strip() == SEARCH_MARKER:
+            if not path:
+                raise EditBlockError("SEARCH block without a preceding FILE: line")
+            body: List[str] = []
+            i += 1
+            while i < len(lines) and lines[i].strip() != REPLACE_MARKER:
+                body.append(lines[i])
+                i += 1
+            dividers = [k for k, line in enumerate(body) if line.strip() == DIVIDER]
+            if i == len(lines) or not dividers:
+                raise EditBlockError(
+                    f"Unterminated edit block for {path}",
+                    "\n".join([FILE_PREFIX + path, SEARCH_MARKER] + body),
+                )
+            splits = [(body[:k], body[k + 1 :]) for k in dividers]
+            blocks.append(EditBlock(path, *splits[0], alternatives=splits[1:]))
+        i += 1
+    if not blocks:
+        raise EditBlockError("No edit blocks found")
+    return blocks
+
+
+def _find(content: List[str], search: List[str]) -> Tuple[int, str]:
+    """Locate ``search`` exactly, then ignoring trailing and then all
+    surrounding whitespace. Returns ``(index, method)``; index -1 if missing."""
+    n = len(search)
+    for method, norm in (
+        ("exact", lambda s: s),
+        ("rstrip", str.rstrip),
+        ("whitespace", str.strip),
+    ):
+        wanted = [norm(line) for line in search]
+        hits = [
+            i
+            for i in range(len(content) - n + 1)
+            if [norm(line) for line in content[i : i + n]] == wanted
+        ]
+        if len(hits) > 1:
+            raise EditBlockError(
+                f"SEARCH text matches {len(hits)} places; add surrounding lines "
+                "to make it unique"
+            )
+        if hits:
+            return hits[0], method
+    return -1, "missing"
+
+
+def _locate(content: List[str], block: EditBlock) -> Tuple[int, str, EditBlock]:
+    """Find the block's SEARCH text, trying every reading of its dividers.
+
+    The reading with the longest SEARCH text that occurs exactly once wins, so
+    a ``=======`` line that belongs to the SEARCH text is not cut off.
+    """
+    readings = [block] + [
+        EditBlock(block.path, search, replace) for search, replace in block.alternatives
+    ]
+    error: Optional[EditBlockError] = None
+    for reading in reversed(readings):
+        try:
+            idx, method = _find(content, reading.search)
+        except EditBlockError as e:
+            error = error or EditBlockError(f"{block.path}: {e}", block.render())
+            continue
+        if idx >= 0:
+            return idx, method, reading
+    raise error or EditBlockError(
+        f"{block.path}: SEARCH text not found", block.render()
+    )
+
+
+def _newline(text: str) -> str:
+    """The line ending used by most lines of ``text``."""
+    return "\r\n" if text.count("\r\n") * 2 > text.count("\n") else "\n"
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def _reindent(replace: List[str], found: List[str], search: List[str]) -> List[str]:
+    """Shift the replacement by the indentation the SEARCH text was missing."""
+    first = next((k for k, line in enumerate(search) if line.strip()), None)
+    if first is None:
+        return replace
+    shift = _indent(found[first]) - _indent(search[first])
+    if shift <= 0:
+        return replace
+    return [(" " * shift + line) if line.strip() else line for line in replace]
+
+
+def apply_edit_blocks(
+    repo_path: str, blocks: List[EditBlock]
+) -> Dict[str, Tuple[Optional[str], str]]:
+    """Apply blocks in memory. Returns ``{path: (original or None, updated)}``."""
+    files: Dict[str, Tuple[Optional[str], str]] = {}
+    for block in blocks:
+        error = validate_patch_path(repo_path, f"+++ b/{block.path}")
+        if error:
+            raise EditBlockError(error, block.render())
+        if block.path not in files:
+            target = Path(repo_path) / block.path
+            original = None
+            if target.is_file():
+                # newline="" keeps CRLF line endings instead of translating them
+                with open(target, "r", encoding="utf-8", newline="") as f:
+                    original = f.read()
+            files[block.path] = (original, original or "")
+        original, current = files[block.path]
+
+        eol = _newline(current)
+        if not any(line.strip() for line in block.search):
+            if current.strip():
+                raise EditBlockError(
+                    f"Empty SEARCH for existing file {block.path}", block.render()
+                )
+            files[block.path] = (original, eol.join(block.replace) + eol)
+            continue
+        if original is None and not current:
+            raise EditBlockError(f"File does not exist: {block.path}", block.render())
+
+        content = current.split(eol)
+        if current.endswith(eol):
+            content.pop()
+        idx, method, block = _locate(content, block)
+        found = content[idx : idx + len(block.search)]
+        replace = block.replace
+        if method == "whitespace":
+            replace = _reindent(replace, found, block.search)
+        logger.info(f"Edit block for {block.path} matched ({method}) at line {idx + 1}")
+        content[idx : idx + len(block.search)] = replace
+        trailing = eol if current.endswith(eol) or not current else ""
+        files[block.path] = (original, eol.join(content) + trailing)
+    return files
+
+
+def edits_to_patch(repo_path: str, text: str) -> str:
+    """Convert the coder's edit blocks into a unified diff for ``git apply``."""
+    files = apply_edit_blocks(repo_path, parse_edit_blocks(text))
+    parts: List[str] = []
+    for path, (original, updated) in files.items():
+        if original == updated:
+            continue
+        diff = difflib.unified_diff(
+            (original or "").splitlines(keepends=True),
+            updated.splitlines(keepends=True),
+            fromfile="/dev/null" if original is None else f"a/{path}",
+            tofile=f"b/{path}",
+        )
+        for line in diff:
+            parts.append(line if line.endswith("\n") else line + "\n")
+            if not line.endswith("\n"):
+                parts.append("\\ No newline at end of file\n")
+    if not parts:
+        raise EditBlockError("Edit blocks do not change any file")
+    return "".join(parts)
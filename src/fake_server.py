@@ -0,0 +1,613 @@
+"""
+Local Fake Anthropic Server
+Offline stand-in for the Messages API for end-to-end runs and load tests.
+
+Implements ``POST /v1/messages`` (plain and SSE streaming) and the Message
+Batches endpoints with realistic ``usage`` fields (including simulated prompt
+caching), ``anthropic-ratelimit-*`` headers, injected 429/529/timeout faults
+and configurable latency distributions. Responses are scripted per pipeline
+role, detected from the system prompt. Randomness is seeded, so a scenario
+produces reproducible numbers.
+
+Usage:
+    python -m src.fake_server --port 8765 --scenario scenario.yaml
+    python run_task.py --goal "..." --llm-endpoint http://127.0.0.1:8765
+    python run_task.py --goal "..." --llm-endpoint fake[:scenario.yaml]
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from .token_estimator import count_pieces
+
+logger = logging.getLogger(__name__)
+
+# Same limit as the real API; requests with more are rejected with a 400
+MAX_CACHE_BREAKPOINTS = 4
+
+# Pipeline roles are recognised by their persona in the system prompt
+ROLE_MARKERS = {
+    "architect": "Software Architect",
+    "coder": "Full-Stack Developer",
+    "tester": "QA Engineer",
+    "docwriter": "Technical Writer",
+}
+
+DEFAULT_RESPONSES = {
+    "architect": (
+        "## Plan\n"
+        "1. Add a short note file describing the offline run.\n\n"
+        "complexity: low\n"
+        "allowDeps: false\n"
+    ),
+    "coder": (
+        "Implementation:\n"
+        "***BEGIN_PATCH***\n"
+        "--- /dev/null\n"
+        "+++ b/AI_AGENTS_FAKE.md\n"
+        "@@ -0,0 +1,3 @@\n"
+        "+# Offline run\n"
+        "+\n"
+        "+Generated by the local fake Anthropic server.\n"
+        "***END_PATCH***\n"
+        "Notes: trailing text after the patch is never needed.\n"
+    ),
+    "coder_edits": (
+        "Implementation:\n"
+        "***BEGIN_EDITS***\n"
+        "FILE: AI_AGENTS_FAKE.md\n"
+        "<<<<<<< SEARCH\n"
+        "=======\n"
+        "# Offline run\n"
+        "\n"
+        "Generated by the local fake Anthropic server.\n"
+        ">>>>>>> REPLACE\n"
+        "***END_EDITS***\n"
+    ),
+    "tester": "QA Assessment: PASS\n\nNo issues found.\n",
+    "docwriter": "## Summary\n\nAdds a note file generated during an offline run.\n",
+    "default": "OK\n",
+}
+
+DEFAULT_SCENARIO: Dict[str, Any] = {
+    "seed": 42,
+    "stream_chunk_chars": 40,
+    # distribution: fixed | uniform | lognormal; ttft_fraction of the latency
+    # passes before the first streamed chunk
+    "latency": {
+        "distribution": "fixed",
+        "seconds": 0.05,
+        "ttft_fraction": 0.3,
+    },
+    # Probabilities per request; a timeout stalls for timeout_s before answering
+    "faults": {"error_429": 0.0, "error_529": 0.0, "timeout": 0.0, "timeout_s": 120},
+    "rate_limits": {"requests_per_minute": 1000, "tokens_per_minute": 1000000},
+    # Per-model overrides of latency / faults / rate_limits
+    "models": {},
+    # Per-role response text, or a list that is cycled through
+    "responses": {},
+    # Per-role tool calls ({name, input}) made one per round before answering
+    # when a request offers tools; roles not listed call list_dir once
+    "tool_calls": {},
+}
+
+
+def load_scenario(path: Optional[str] = None) -> Dict[str, Any]:
+    """Merge a YAML/JSON scenario file over :data:`DEFAULT_SCENARIO`."""
+    scenario = copy.deepcopy(DEFAULT_SCENARIO)
+    if not path:
+        return scenario
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(scenario.get(key), dict):
+            scenario[key].update(value)
+        else:
+            scenario[key] = value
+    return scenario
+
+
+def _breakpoints(body: Dict[str, Any]) -> int:
+    """Number of ``cache_control`` blocks in tools, system and messages."""
+    blocks = list(body.get("tools") or [])
+    if isinstance(body.get("system"), list):
+        blocks += body["system"]
+    for message in body.get("messages", []):
+        if isinstance(message.get("content"), list):
+            blocks += message["content"]
+    return sum(1 for b in blocks if isinstance(b, dict) and b.get("cache_control"))
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return "\n\n".join(b.get("text", "") for b in content or [] if isinstance(b, dict))
+
+
+class FakeAnthropic:
+    """Request handling state shared by all server threads."""
+
+    def __init__(self, scenario: Dict[str, Any]):
+        self.scenario = scenario
+        self.rng = random.Random(scenario.get("seed"))
+        self.lock = threading.Lock()
+        self.cached_prefixes: set = set()
+        self.buckets: Dict[str, Dict[str, float]] = {}
+        self.response_index: Dict[str, int] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.stats: Dict[str, int] = {"requests": 0, "429": 0, "529": 0, "timeouts": 0}
+
+    def _model_cfg(self, model: str, key: str) -> Dict[str, Any]:
+        cfg = dict(self.scenario[key])
+        cfg.update(self.scenario.get("models", {}).get(model, {}).get(key, {}))
+        return cfg
+
+    # -- behaviour --------------------------------------------------------
+
+    def sample_latency(self, model: str) -> float:
+        cfg = self._model_cfg(model, "latency")
+        dist = cfg.get("distribution", "fixed")
+        with self.lock:
+            if dist == "uniform":
+                value = self.rng.uniform(cfg.get("min_s", 0.0), cfg.get("max_s", 1.0))
+            elif dist == "lognormal":
+                median = cfg.get("median_s", 0.5)
+                value = median * self.rng.lognormvariate(0.0, cfg.get("sigma", 0.5))
+            else:
+                value = cfg.get("seconds", 0.0)
+        return max(0.0, value)
+
+    def sample_fault(self, model: str) -> Optional[str]:
+        cfg = self._model_cfg(model, "faults")
+        with self.lock:
+            roll = self.rng.random()
+        for fault in ("error_429", "error_529", "timeout"):
+            p = cfg.get(fault, 0.0)
+            if roll < p:
+                return fault
+            roll -= p
+        return None
+
+    def take_capacity(self, model: str, tokens: int) -> Tuple[Dict[str, str], float]:
+        """Charge the model bucket; returns headers and a retry-after (0 if ok)."""
+        limits = self._model_cfg(model, "rate_limits")
+        rpm, tpm = limits["requests_per_minute"], limits["tokens_per_minute"]
+        now = time.time()
+        with self.lock:
+            b = self.buckets.setdefault(
+                model, {"requests": rpm, "tokens": tpm, "updated": now}
+            )
+            elapsed = now - b["updated"]
+            b["requests"] = min(rpm, b["requests"] + elapsed * rpm / 60.0)
+            b["tokens"] = min(tpm, b["tokens"] + elapsed * tpm / 60.0)
+            b["updated"] = now
+            retry_after = 0.0
+            if b["requests"] < 1:
+                retry_after = (1 - b["requests"]) * 60.0 / rpm
+            elif b["tokens"] < min(tokens, tpm):
+                retry_after = (min(tokens, tpm) - b["tokens"]) * 60.0 / tpm
+            else:
+                b["requests"] -= 1
+                b["tokens"] -= tokens
+            headers = {
+                "anthropic-ratelimit-requests-limit": str(rpm),
+                "anthropic-ratelimit-requests-remaining": str(int(b["requests"])),
+                "anthropic-ratelimit-requests-reset": _iso(
+                    now + (rpm - b["requests"]) * 60.0 / rpm
+                ),
+                "anthropic-ratelimit-tokens-limit": str(tpm),
+                "anthropic-ratelimit-tokens-remaining": str(int(b["tokens"])),
+                "anthropic-ratelimit-tokens-reset": _iso(
+                    now + (tpm - b["tokens"]) * 60.0 / tpm
+                ),
+            }
+        return headers, retry_after
+
+    def detect_role(self, system: Any) -> str:
+        # The persona is in the last system block; earlier ones hold context
+        text = _text(system[-1:] if isinstance(system, list) else system)
+        for role, marker in ROLE_MARKERS.items():
+            if marker in text:
+                # The edit-block coder template asks for a different format
+                if role == "coder" and "***BEGIN_EDITS***" in text:
+                    return "coder_edits"
+                return role
+        return "default"
+
+    def response_for(self, role: str) -> str:
+        scripted = self.scenario.get("responses", {}).get(role)
+        if scripted is None:
+            return DEFAULT_RESPONSES[role]
+        if isinstance(scripted, list):
+            with self.lock:
+                idx = self.response_index.get(role, 0)
+                self.response_index[role] = idx + 1
+            return scripted[idx % len(scripted)]
+        return scripted
+
+    def usage_for(self, body: Dict[str, Any], output: str) -> Dict[str, int]:
+        """Token usage with prompt caching simulated at ``cache_control`` blocks."""
+        system = body.get("system") or []
+        blocks = (
+            [{"type": "text", "text": system}] if isinstance(system, str) else system
+        )
+        for message in body.get("messages", []):
+            content = message.get("content", "")
+            if isinstance(content, str):
+                blocks = blocks + [{"type": "text", "text": content}]
+            else:
+                blocks = blocks + list(content)
+
+        cached_upto = 0
+        for i, block in enumerate(blocks):
+            if isinstance(block, dict) and block.get("cache_control"):
+                cached_upto = i + 1
+        sizes = [count_pieces(json.dumps(b, ensure_ascii=False)) for b in blocks]
+        prefix_tokens = sum(sizes[:cached_upto])
+        usage = {
+            "input_tokens": sum(sizes[cached_upto:]) + 3,
+            "output_tokens": max(1, count_pieces(output)),
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+        }
+        if cached_upto:
+            key = hashlib.sha256(
+                json.dumps([body.get("model"), blocks[:cached_upto]]).encode()
+            ).hexdigest()
+            with self.lock:
+                hit = key in self.cached_prefixes
+                self.cached_prefixes.add(key)
+            field = "cache_read_input_tokens" if hit else "cache_creation_input_tokens"
+            usage[field] = prefix_tokens
+        return usage
+
+    def tool_call_for(self, role: str, body: Dict[str, Any]) -> Optional[Dict]:
+        """The next scripted tool call of a tool conversation, or None to answer."""
+        if (
+            not body.get("tools")
+            or (body.get("tool_choice") or {}).get("type") == "none"
+        ):
+            return None
+        calls = self.scenario.get("tool_calls", {}).get(role)
+        if calls is None:
+            calls = [{"name": "list_dir", "input": {"path": "."}}]
+        rounds = sum(
+            1
+            for message in body.get("messages", [])
+            if isinstance(message.get("content"), list)
+            and any(b.get("type") == "tool_result" for b in message["content"])
+        )
+        return calls[rounds] if rounds < len(calls) else None
+
+    def build_message(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """The full (non-streamed) message object for a request."""
+        role = self.detect_role(body.get("system"))
+        call = self.tool_call_for(role, body)
+        if call is not None:
+            content = [
+                {
+                    "type": "tool_use",
+                    "id": f"toolu_fake_{uuid.uuid4().hex[:20]}",
+                    "name": call["name"],
+                    "input": call.get("input", {}),
+                }
+            ]
+            return {
+                "id": f"msg_fake_{uuid.uuid4().hex[:20]}",
+                "type": "message",
+                "role": "assistant",
+                "model": body.get("model", "unknown"),
+                "content": content,
+                "stop_reason": "tool_use",
+                "stop_sequence": None,
+                "usage": self.usage_for(body, json.dumps(content)),
+            }
+        text = self.response_for(role)
+        stop_reason, stop_sequence = "end_turn", None
+        for seq in body.get("stop_sequences") or []:
+            idx = text.find(seq)
+            if idx != -1 and (stop_sequence is None or idx < text.find(stop_sequence)):
+                stop_reason, stop_sequence = "stop_sequence", seq
+        if stop_sequence is not None:
+            text = text[: text.find(stop_sequence)]
+        max_tokens = body.get("max_tokens", 1024)
+        if count_pieces(text) > max_tokens:
+            stop_reason = "max_tokens"
+        return {
+            "id": f"msg_fake_{uuid.uuid4().hex[:20]}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "unknown"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": stop_reason,
+            "stop_sequence": stop_sequence,
+            "usage": self.usage_for(body, text),
+        }
+
+    # -- batches ----------------------------------------------------------
+
+    def create_batch(self, body: Dict[str, Any], base_url: str) -> Dict[str, Any]:
+        now = time.time()
+        batch_id = f"msgbatch_fake_{uuid.uuid4().hex[:20]}"
+        requests = body.get("requests", [])
+        batch = {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "in_progress",
+            "request_counts": {
+                "processing": len(requests),
+                "succeeded": 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": _iso(now),
+            "expires_at": _iso(now + 86400),
+            "ended_at": None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": None,
+        }
+        with self.lock:
+            self.batches[batch_id] = {"batch": batch, "results": []}
+        threading.Thread(
+            target=self._process_batch,
+            args=(
+                batch_id,
+                requests,
+                f"{base_url}/v1/messages/batches/{batch_id}/results",
+            ),
+            daemon=True,
+        ).start()
+        return batch
+
+    def _process_batch(self, batch_id: str, requests: List[Dict], results_url: str):
+        results = []
+        for request in requests:
+            params = request.get("params", {})
+            time.sleep(self.sample_latency(params.get("model", "")))
+            results.append(
+                {
+                    "custom_id": request.get("custom_id"),
+                    "result": {
+                        "type": "succeeded",
+                        "message": self.build_message(params),
+                    },
+                }
+            )
+        with self.lock:
+            entry = self.batches[batch_id]
+            entry["results"] = results
+            batch = entry["batch"]
+            batch["processing_status"] = "ended"
+            batch["ended_at"] = _iso(time.time())
+            batch["results_url"] = results_url
+            batch["request_counts"]["processing"] = 0
+            batch["request_counts"]["succeeded"] = len(results)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeAnthropicServer"
+
+    def log_message(self, format: str, *args: Any):
+        logger.debug("fake-anthropic: " + format % args)
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict] = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.send_header("request-id", f"req_fake_{uuid.uuid4().hex[:16]}")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, kind: str, message: str, headers=None):
+        payload = {"type": "error", "error": {"type": kind, "message": message}}
+        self._send_json(status, payload, headers)
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("content-length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        app = self.server.app
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        if parts[:3] != ["v1", "messages", "batches"] or len(parts) < 4:
+            return self._send_error(404, "not_found_error", f"Unknown path {self.path}")
+        with app.lock:
+            entry = copy.deepcopy(app.batches.get(parts[3]))
+        if entry is None:
+            return self._send_error(404, "not_found_error", "Unknown batch")
+        if len(parts) == 4:
+            return self._send_json(200, entry["batch"])
+
+        data = "".join(json.dumps(r) + "\n" for r in entry["results"]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", "application/binary")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        app = self.server.app
+        path = self.path.split("?", 1)[0].rstrip("/")
+        body = self._read_body()
+        if path == "/v1/messages/batches":
+            return self._send_json(200, app.create_batch(body, self.server.url))
+        if path != "/v1/messages":
+            return self._send_error(404, "not_found_error", f"Unknown path {path}")
+
+        model = body.get("model", "")
+        with app.lock:
+            app.stats["requests"] += 1
+        breakpoints = _breakpoints(body)
+        if breakpoints > MAX_CACHE_BREAKPOINTS:
+            return self._send_error(
+                400,
+                "invalid_request_error",
+                f"A maximum of {MAX_CACHE_BREAKPOINTS} blocks with cache_control "
+                f"may be provided. Found {breakpoints}.",
+            )
+        message = app.build_message(body)
+        usage = message["usage"]
+        tokens = (
+            usage["input_tokens"]
+            + usage["cache_creation_input_tokens"]
+            + usage["cache_read_input_tokens"]
+            + body.get("max_tokens", 0)
+        )
+        headers, retry_after = app.take_capacity(model, tokens)
+
+        fault = app.sample_fault(model)
+        if retry_after > 0 or fault == "error_429":
+            with app.lock:
+                app.stats["429"] += 1
+            headers["retry-after"] = str(max(1, round(retry_after)))
+            return self._send_error(429, "rate_limit_error", "Rate limited", headers)
+        if fault == "error_529":
+            with app.lock:
+                app.stats["529"] += 1
+            return self._send_error(529, "overloaded_error", "Overloaded", headers)
+        if fault == "timeout":
+            with app.lock:
+                app.stats["timeouts"] += 1
+            time.sleep(app._model_cfg(model, "faults").get("timeout_s", 120))
+
+        latency = app.sample_latency(model)
+        try:
+            if body.get("stream"):
+                self._stream(message, latency, headers)
+            else:
+                time.sleep(latency)
+                self._send_json(200, message, headers)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("fake-anthropic: client disconnected before the response")
+
+    def _chunk(self, event: str, data: Dict[str, Any]):
+        payload = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, message: Dict[str, Any], latency: float, headers: Dict):
+        app = self.server.app
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        ttft = latency * app._model_cfg(message["model"], "latency").get(
+            "ttft_fraction", 0.3
+        )
+        time.sleep(ttft)
+        start = dict(message, content=[], stop_reason=None, stop_sequence=None)
+        start["usage"] = dict(message["usage"], output_tokens=1)
+        self._chunk("message_start", {"type": "message_start", "message": start})
+        self._chunk(
+            "content_block_start",
+            {
+                "type": "content_block_start",
+                "index": 0,
+                "content_block": {"type": "text", "text": ""},
+            },
+        )
+        text = message["content"][0]["text"]
+        size = max(1, int(app.scenario.get("stream_chunk_chars", 40)))
+        pieces = [text[i : i + size] for i in range(0, len(text), size)] or [""]
+        per_chunk = (latency - ttft) / len(pieces)
+        for piece in pieces:
+            self._chunk(
+                "content_block_delta",
+                {
+                    "type": "content_block_delta",
+                    "index": 0,
+                    "delta": {"type": "text_delta", "text": piece},
+                },
+            )
+            time.sleep(per_chunk)
+        self._chunk("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self._chunk(
+            "message_delta",
+            {
+                "type": "message_delta",
+                "delta": {
+                    "stop_reason": message["stop_reason"],
+                    "stop_sequence": message["stop_sequence"],
+                },
+                "usage": {"output_tokens": message["usage"]["output_tokens"]},
+            },
+        )
+        self._chunk("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeAnthropicServer(ThreadingHTTPServer):
+    """Threaded HTTP server serving :class:`FakeAnthropic` on ``host:port``."""
+
+    daemon_threads = True
+
+    def __init__(
+        self, scenario: Optional[Dict[str, Any]] = None, host="127.0.0.1", port=0
+    ):
+        super().__init__((host, port), _Handler)
+        self.app = FakeAnthropic(scenario or load_scenario())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeAnthropicServer":
+        """Serve in a background thread and return self."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Fake Anthropic server listening on {self.url}")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Anthropic API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenario", help="YAML/JSON scenario file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeAnthropicServer(load_scenario(args.scenario), args.host, args.port)
+    print(f"Fake Anthropic server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Git-Index Backed File Listing
+Lists repository files from ``git ls-files`` with a persistent, incremental index.
+
+The listing (path, size, blob id) is stored under
+``.ai_agents_cache/git_index/`` and keyed by HEAD and the mtime of
+``.git/index``. When neither changed the listing is served from disk without
+running git. Otherwise only the paths reported by ``git diff --cached
+--name-status`` against the previous HEAD (plus the paths that were staged at
+that time) are re-read, so refreshing costs O(changed files), not O(tree).
+Untracked files that are not ignored are listed by ``git ls-files --others
+--exclude-standard`` on every refresh; they have no blob id.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = ".ai_agents_cache/git_index"
+
+# Beyond this many changed paths a full listing is cheaper than pathspecs
+MAX_INCREMENTAL_PATHS = 2000
+
+# Submodules are listed as commits, not files
+_GITLINK_MODE = "160000"
+
+_open_indexes: Dict[str, "GitFileIndex"] = {}
+_open_lock = threading.Lock()
+
+
+@dataclass
+class IndexEntry:
+    size: int
+    blob: str
+
+
+def _git(repo: str, *args: str, stdin: Optional[str] = None) -> Optional[str]:
+    """Stdout of a git command, or None if it failed."""
+    p = subprocess.run(
+        ["git", "-C", repo, "--literal-pathspecs", *args],
+        input=stdin,
+        text=True,
+        capture_output=True,
+    )
+    if p.returncode != 0:
+        logger.debug(f"git {' '.join(args[:2])} failed: {p.stderr.strip()}")
+        return None
+    return p.stdout
+
+
+def _z_split(out: str) -> List[str]:
+    return [part for part in out.split("\0") if part]
+
+
+class GitFileIndex:
+    """Tracked files of one repository with their index blob ids and sizes."""
+
+    def __init__(self, repo_path: str, index_dir: str = DEFAULT_INDEX_DIR):
+        self.repo_path = os.path.realpath(repo_path)
+        digest = hashlib.sha256(self.repo_path.encode("utf-8")).hexdigest()[:16]
+        self.state_file = Path(index_dir) / f"{digest}.json"
+        self.head = ""
+        self.index_mtime = 0
+        self.staged: List[str] = []
+        self.files: Dict[str, IndexEntry] = {}
+        self._modified: Optional[Set[str]] = None
+        self._untracked: Optional[Set[str]] = None
+        self._load()
+
+    @classmethod
+    def open(
+        cls, repo_path: str, index_dir: str = DEFAULT_INDEX_DIR
+    ) -> Optional["GitFileIndex"]:
+        """The refreshed index of ``repo_path``; None if it is not a git work tree."""
+        key = os.path.realpath(repo_path)
+        with _open_lock:
+            index = _open_indexes.get(key)
+            if index is None:
+                if _git(key, "rev-parse", "--is-inside-work-tree") is None:
+                    return None
+                index = cls(key, index_dir)
+                _open_indexes[key] = index
+            index.refresh()
+        return index
+
+    def _load(self):
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        self.head = state.get("head", "")
+        self.index_mtime = state.get("index_mtime", 0)
+        self.staged = state.get("staged", [])
+        self.files = {p: IndexEntry(*v) for p, v in state.get("files", {}).items()}
+
+    def _save(self):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            "repo": self.repo_path,
+            "head": self.head,
+            "index_mtime": self.index_mtime,
+            "staged": self.staged,
+            "files": {p: [e.size, e.blob] for p, e in self.files.items()},
+        }
+        fd, tmp = tempfile.mkstemp(dir=self.state_file.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_file)
+
+    def _current_stamp(self):
+        head = (
+            _git(self.repo_path, "rev-parse", "--verify", "-q", "HEAD") or ""
+        ).strip()
+        index_file = (
+            _git(self.repo_path, "rev-parse", "--git-path", "index") or ""
+        ).strip()
+        try:
+            mtime = os.stat(os.path.join(self.repo_path, index_file)).st_mtime_ns
+        except OSError:
+            mtime = 0
+        return head, mtime
+
+    def _read_entries(self, paths: Optional[List[str]] = None) -> Dict[str, IndexEntry]:
+        """Index entries of ``paths`` (all tracked files when None)."""
+        args = ["ls-files", "-s", "-z"]
+        if paths is not None:
+            args += ["--", *paths]
+        out = _git(self.repo_path, *args) or ""
+        blobs: Dict[str, str] = {}
+        for record in _z_split(out):
+            meta, _, path = record.partition("\t")
+            mode, blob, _stage = meta.split(" ")
+            if mode != _GITLINK_MODE:
+                blobs[path] = blob
+        sizes = self._blob_sizes(set(blobs.values()))
+        return {p: IndexEntry(sizes.get(b, 0), b) for p, b in blobs.items()}
+
+    def _blob_sizes(self, blobs: Set[str]) -> Dict[str, int]:
+        """Sizes of blobs; known blob ids are reused instead of asking git."""
+        known = {e.blob: e.size for e in self.files.values()}
+        sizes = {b: known[b] for b in blobs if b in known}
+        missing = sorted(blobs - set(sizes))
+        if missing:
+            out = _git(
+                self.repo_path,
+                "cat-file",
+                "--batch-check",
+                stdin="\n".join(missing) + "\n",
+            )
+            for line in (out or "").splitlines():
+                parts = line.split()
+                if len(parts) == 3 and parts[1] == "blob":
+                    sizes[parts[0]] = int(parts[2])
+        return sizes
+
+    def _staged_paths(self) -> List[str]:
+        if not self.head:
+            return []
+        out = _git(self.repo_path, "diff", "--cached", "--name-only", "-z", self.head)
+        return sorted(_z_split(out or ""))
+
+    def refresh(self):
+        """Bring the listing up to date with HEAD and the git index."""
+        head, mtime = self._current_stamp()
+        self._modified = None
+        self._untracked = None
+        if self.files and head == self.head and mtime == self.index_mtime:
+            return
+        changed: Optional[Set[str]] = None
+        if self.files and self.head and head:
+            out = _git(
+                self.repo_path, "diff", "--cached", "--name-status", "-z", self.head
+            )
+            if out is not None:
+                changed = set(self.staged)
+                tokens = _z_split(out)
+                i = 0
+                while i < len(tokens):
+                    status = tokens[i]
+                    # Renames and copies list the old and the new path
+                    count = 2 if status[:1] in ("R", "C") else 1
+                    changed.update(tokens[i + 1 : i + 1 + count])
+                    i += 1 + count
+
+        if changed is None or len(changed) > MAX_INCREMENTAL_PATHS:
+            self.files = self._read_entries()
+            logger.info(f"Git index: listed {len(self.files)} tracked files")
+        elif changed:
+            fresh = self._read_entries(sorted(changed))
+            for path in changed:
+                if path in fresh:
+                    self.files[path] = fresh[path]
+                else:
+                    self.files.pop(path, None)
+            logger.info(f"Git index: refreshed {len(changed)} changed paths")
+        self.head, self.index_mtime = head, mtime
+        self.staged = self._staged_paths()
+        self._save()
+
+    def paths(self) -> List[str]:
+        """Sorted tracked and untracked (not ignored) paths."""
+        return sorted(self.files.keys() | self.untracked())
+
+    def untracked(self) -> Set[str]:
+        """Work-tree files that are neither tracked nor ignored."""
+        if self._untracked is None:
+            out = _git(
+                self.repo_path, "ls-files", "--others", "--exclude-standard", "-z"
+            )
+            self._untracked = set(_z_split(out or ""))
+        return self._untracked
+
+    def modified(self) -> Set[str]:
+        """Tracked paths whose work-tree content differs from the index."""
+        if self._modified is None:
+            out = _git(self.repo_path, "diff", "--name-only", "-z")
+            self._modified = set(_z_split(out or ""))
+        return self._modified
+
+    def blob(self, path: str) -> Optional[str]:
+        """Blob id of an unmodified tracked file (None if modified or untracked)."""
+        entry = self.files.get(path)
+        if entry is None or path in self.modified():
+            return None
+        return entry.blob
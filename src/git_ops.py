@@ -1,6 +1,8 @@
+import os
 import re
 import subprocess
 import tempfile
+from typing import Optional
 
 
 def validate_branch(name: str):
@@ -42,16 +44,111 @@ def ensure_branch(repo_path: str, branch: str):
     run(["git", "-C", repo_path, "checkout", "-b", branch])
 
 
-def apply_patch(repo_path: str, patch_text: str):
+def branch_exists(repo_path: str, branch: str) -> bool:
+    validate_branch(branch)
+    p = run(
+        [
+            "git",
+            "-C",
+            repo_path,
+            "rev-parse",
+            "--verify",
+            "--quiet",
+            f"refs/heads/{branch}",
+        ],
+        check=False,
+    )
+    return p.returncode == 0
+
+
+def current_branch(repo_path: str) -> str:
+    return run(
+        ["git", "-C", repo_path, "rev-parse", "--abbrev-ref", "HEAD"]
+    ).stdout.strip()
+
+
+def checkout(repo_path: str, branch: str):
+    validate_branch(branch)
+    run(["git", "-C", repo_path, "checkout", branch])
+
+
+def head_commit(repo_path: str) -> str:
+    return run(["git", "-C", repo_path, "rev-parse", "HEAD"]).stdout.strip()
+
+
+def reset_hard(repo_path: str, commit: str):
+    """Discard commits, staged and unstaged changes back to ``commit``."""
+    if not re.match(r"^[0-9a-f]{40}$", commit):
+        raise ValueError(f"Invalid commit id: '{commit}'")
+    run(["git", "-C", repo_path, "reset", "--hard", commit])
+
+
+def _write_patch(patch_text: str) -> str:
+    # git rejects a patch whose last line is not newline-terminated
+    if not patch_text.endswith("\n"):
+        patch_text += "\n"
     with tempfile.NamedTemporaryFile("w", delete=False, suffix=".patch") as f:
         f.write(patch_text)
-        patch_file = f.name
-    run(["git", "-C", repo_path, "apply", "--whitespace=fix", "--index", patch_file])
+        return f.name
+
+
+def check_patch(
+    repo_path: str, patch_text: str, reverse: bool = False
+) -> Optional[str]:
+    """Dry-run ``git apply`` against the index. Returns git's error or None.
+
+    With ``reverse`` it checks whether the patch could be undone, i.e. whether
+    it is already applied.
+    """
+    patch_file = _write_patch(patch_text)
+    try:
+        p = run(
+            [
+                "git",
+                "-C",
+                repo_path,
+                "apply",
+                "--check",
+                "--whitespace=fix",
+                "--index",
+            ]
+            + (["--reverse"] if reverse else [])
+            + [patch_file],
+            check=False,
+        )
+    finally:
+        os.unlink(patch_file)
+    if p.returncode == 0:
+        return None
+    return (p.stderr or p.stdout).strip() or f"git apply exited with {p.returncode}"
+
+
+def apply_patch(repo_path: str, patch_text: str):
+    patch_file = _write_patch(patch_text)
+    try:
+        run(
+            ["git", "-C", repo_path, "apply", "--whitespace=fix", "--index", patch_file]
+        )
+    finally:
+        os.unlink(patch_file)
+
+
+def add_worktree(repo_path: str, path: str):
+    """Check out HEAD detached into a scratch worktree at ``path``."""
+    run(["git", "-C", repo_path, "worktree", "add", "--detach", path, "HEAD"])
+
+
+def remove_worktree(repo_path: str, path: str):
+    run(["git", "-C", repo_path, "worktree", "remove", "--force", path], check=False)
+    run(["git", "-C", repo_path, "worktree", "prune"], check=False)
 
 
 def commit_and_push(repo_path: str, message: str):
     message = sanitize_commit_message(message)
-    run(["git", "-C", repo_path, "commit", "-m", message, "--no-verify"])
+    # Nothing staged means a previous (resumed) attempt already committed
+    staged = run(["git", "-C", repo_path, "diff", "--cached", "--quiet"], check=False)
+    if staged.returncode != 0:
+        run(["git", "-C", repo_path, "commit", "-m", message, "--no-verify"])
     run(["git", "-C", repo_path, "push", "-u", "origin", "HEAD"])
 
 
@@ -1,10 +1,20 @@
+import asyncio
+import json
 import logging
 import os
+import threading
 import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
 
 import anthropic
 from rich.console import Console
 
+from .llm_cache import ResponseCache
+from .rate_limiter import RateLimiter, retry_after_seconds
+from .token_estimator import TokenEstimator
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -13,108 +23,999 @@ logger = logging.getLogger(__name__)
 console = Console()
 
 _client = None
+_base_url: Optional[str] = None
+_async_client = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_response_cache: Optional[ResponseCache] = None
+_rate_limiter: Optional[RateLimiter] = None
+_token_estimator: Optional[TokenEstimator] = None
+
+# Plain text or a list of content blocks (see src/prompts.py)
+PromptInput = Union[str, List[Dict[str, Any]]]
+
+# Upper bound for parallel requests issued through gather_completions()
+DEFAULT_CONCURRENCY = 4
+
+# The API rejects requests with more cache_control blocks than this
+MAX_CACHE_BREAKPOINTS = 4
+
+
+@dataclass
+class Usage:
+    """Token usage as reported by the API."""
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+
+    @classmethod
+    def from_api(cls, usage) -> "Usage":
+        if usage is None:
+            return cls()
+        return cls(
+            input_tokens=usage.input_tokens or 0,
+            output_tokens=usage.output_tokens or 0,
+            cache_read_input_tokens=getattr(usage, "cache_read_input_tokens", 0) or 0,
+            cache_creation_input_tokens=getattr(usage, "cache_creation_input_tokens", 0)
+            or 0,
+        )
+
+    @property
+    def total_input_tokens(self) -> int:
+        return (
+            self.input_tokens
+            + self.cache_read_input_tokens
+            + self.cache_creation_input_tokens
+        )
+
+
+@dataclass
+class CompletionResult:
+    """Text of a completion plus the metadata needed for cost accounting."""
+
+    text: str
+    model: str
+    usage: Usage = field(default_factory=Usage)
+    stop_reason: Optional[str] = None
+    latency_s: float = 0.0
+    cached: bool = False  # served from the local response cache, nothing billed
+    # Losing hedge requests that were billed on behalf of this completion
+    hedge_costs: List["CompletionResult"] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+@dataclass
+class HedgePolicy:
+    """When to send a duplicate request for a slow or overloaded completion.
+
+    The duplicate is sent once the primary has been running longer than the
+    ``percentile`` of the model's recorded latencies (``initial_delay_s`` until
+    ``min_samples`` latencies are known), or immediately on HTTP 529.
+    """
+
+    percentile: float = 95.0
+    fallback_model: Optional[str] = None
+    min_samples: int = 5
+    initial_delay_s: float = 30.0
+
+    @classmethod
+    def from_config(cls, cfg: Optional[Dict[str, Any]]) -> Optional["HedgePolicy"]:
+        """Build a policy from a ``hedging`` role entry; None when disabled."""
+        if not cfg or not cfg.get("enabled", True):
+            return None
+        fields = ("percentile", "fallback_model", "min_samples", "initial_delay_s")
+        return cls(**{k: cfg[k] for k in fields if k in cfg})
+
+
+class LatencyTracker:
+    """Recent successful call latencies per model, optionally persisted."""
+
+    def __init__(self, state_file: Optional[str] = None, window: int = 200):
+        self.window = window
+        self.state_path = state_file
+        self.latencies: Dict[str, Deque[float]] = {}
+        # Concurrent calls (candidates, sub-tasks) record from several threads
+        self._lock = threading.Lock()
+        if state_file and os.path.exists(state_file):
+            try:
+                with open(state_file, "r", encoding="utf-8") as f:
+                    for model, values in json.load(f).items():
+                        self.latencies[model] = deque(values, maxlen=window)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"Failed to load latency history: {e}")
+
+    def record(self, model: str, latency_s: float):
+        with self._lock:
+            self.latencies.setdefault(model, deque(maxlen=self.window)).append(
+                round(latency_s, 3)
+            )
+            if not self.state_path:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+                tmp = f"{self.state_path}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({m: list(v) for m, v in self.latencies.items()}, f)
+                os.replace(tmp, self.state_path)
+            except OSError as e:
+                logger.warning(f"Failed to save latency history: {e}")
+
+    def percentile(
+        self, model: str, pct: float, min_samples: int = 1
+    ) -> Optional[float]:
+        values = sorted(self.latencies.get(model, ()))
+        if len(values) < max(1, min_samples):
+            return None
+        idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+        return values[idx]
+
+
+_latency_tracker = LatencyTracker()
+
+
+class StreamHandler:
+    """Receives streamed text deltas from :func:`complete_stream`.
+
+    ``feed`` returns True to stop generation early; ``reset`` is called before
+    a retry so that partial output of the failed attempt is discarded.
+    """
+
+    def reset(self) -> None:
+        pass
+
+    def feed(self, chunk: str) -> bool:
+        return False
+
+    def cacheable(self) -> bool:
+        """Whether the streamed text may be stored in the response cache."""
+        return True
 
 
 def client():
     global _client
     if _client is None:
-        _client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        _client = anthropic.Anthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"), base_url=_base_url
+        )
     return _client
 
 
+def configure_endpoint(base_url: Optional[str]):
+    """Send all requests to ``base_url`` (e.g. the local fake server)."""
+    global _client, _async_client, _base_url
+    _base_url = base_url
+    _client = None
+    if _async_client is not None:
+        asyncio.run_coroutine_threadsafe(_async_client.close(), _event_loop())
+    _async_client = None
+
+
+def configure_response_cache(cache: Optional[ResponseCache]):
+    """Enable (or with None disable) the on-disk response cache for this process."""
+    global _response_cache
+    _response_cache = cache
+
+
+def configure_rate_limiter(limiter: Optional[RateLimiter]):
+    """Enable (or with None disable) request pacing for this process."""
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+def configure_token_estimator(estimator: Optional[TokenEstimator]):
+    """Install the estimator used to size requests; responses calibrate it."""
+    global _token_estimator
+    _token_estimator = estimator
+
+
+def configure_latency_tracker(tracker: LatencyTracker):
+    """Replace the in-memory latency history, e.g. with a persisted one."""
+    global _latency_tracker
+    _latency_tracker = tracker
+
+
+def _estimate_input_tokens(
+    model: str,
+    system: PromptInput,
+    prompt: PromptInput,
+    tools: Optional[List[Dict[str, Any]]] = None,
+) -> int:
+    """Input size used to reserve rate-limit capacity before sending."""
+    if _token_estimator is not None:
+        return _token_estimator.estimate_request(model, system, prompt, tools)
+    payload = [system, prompt, tools or []]
+    return max(1, len(json.dumps(payload, ensure_ascii=False)) // 4)
+
+
+def _conversation(
+    prompt: PromptInput, history: Optional[List[Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    """Messages of a request: earlier turns followed by the new user prompt."""
+    return [*(history or []), {"role": "user", "content": prompt}]
+
+
+def _request_prompt(
+    prompt: PromptInput, history: Optional[List[Dict[str, Any]]]
+) -> PromptInput:
+    """Prompt used for cache keys and size estimates, including earlier turns."""
+    if not history:
+        return prompt
+    blocks: List[Dict[str, Any]] = []
+    for message in _conversation(prompt, history):
+        content = message["content"]
+        if isinstance(content, str):
+            blocks.append({"type": "text", "text": content})
+        else:
+            blocks.extend(content)
+    return blocks
+
+
+def _observe_headers(model: str, headers) -> None:
+    if _rate_limiter is not None:
+        _rate_limiter.update_from_headers(model, headers)
+
+
+def _observe_result(
+    reserved: int, result: CompletionResult, calibrate: bool = True
+) -> None:
+    model, usage = result.model, result.usage
+    if result.stop_reason != "handler_stop":
+        _latency_tracker.record(model, result.latency_s)
+    if calibrate and _token_estimator is not None:
+        _token_estimator.calibrate(model, reserved, usage.total_input_tokens)
+    if _rate_limiter is not None:
+        _rate_limiter.record_usage(
+            model, reserved, usage.total_input_tokens + usage.output_tokens
+        )
+
+
+def _observe_error(model: str, e: Exception) -> None:
+    response = getattr(e, "response", None)
+    if response is not None:
+        _observe_headers(model, response.headers)
+
+
+def _cache_lookup(
+    model: str,
+    system: PromptInput,
+    prompt: PromptInput,
+    max_tokens: int,
+    cache_tag: str,
+) -> Tuple[Optional[str], Optional[CompletionResult]]:
+    """Return ``(key, cached_result)``; both None when caching is disabled."""
+    if _response_cache is None:
+        return None, None
+    key = _response_cache.make_key(model, system, prompt, max_tokens, cache_tag)
+    record = _response_cache.get(key)
+    if record is None:
+        return key, None
+    console.print(f"[green]📦 LLM cache hit ({model})[/green]")
+    return key, CompletionResult(
+        text=record["text"],
+        model=record.get("model", model),
+        usage=Usage(**record.get("usage", {})),
+        stop_reason=record.get("stop_reason"),
+        cached=True,
+    )
+
+
+def _cache_store(key: Optional[str], result: CompletionResult):
+    if _response_cache is not None and key is not None and result.text:
+        _response_cache.put(
+            key,
+            {
+                "model": result.model,
+                "text": result.text,
+                "usage": asdict(result.usage),
+                "stop_reason": result.stop_reason,
+            },
+        )
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional ``h2`` package (``pip install httpx[http2]``)."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    """The event loop all async requests of this process run on.
+
+    It runs in a daemon thread for the lifetime of the process, so the pooled
+    async client and its connections are created once and shared by every
+    stage thread instead of being rebuilt (and leaked) per ``asyncio.run``.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="llm-event-loop", daemon=True
+            ).start()
+        return _loop
+
+
+class _LoopExit(Exception):
+    """Carries a SystemExit out of the shared loop, which it would otherwise stop."""
+
+
+async def _exit_as_exception(coro: Any) -> Any:
+    try:
+        return await coro
+    except SystemExit as e:
+        raise _LoopExit(e.code) from None
+
+
+def run_async(coro: Any) -> Any:
+    """Run ``coro`` on the shared event loop and wait for its result."""
+    future = asyncio.run_coroutine_threadsafe(_exit_as_exception(coro), _event_loop())
+    try:
+        return future.result()
+    except _LoopExit as e:
+        raise SystemExit(e.args[0]) from None
+
+
+def aclient():
+    """Return the async client shared by all coroutines of the process.
+
+    All concurrent requests multiplex over its pooled (HTTP/2 when available)
+    connections. httpx pools are bound to the loop that created them, so it
+    must only be used from coroutines started with :func:`run_async`.
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = anthropic.AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            base_url=_base_url,
+            http_client=anthropic.DefaultAsyncHttpxClient(http2=_http2_available()),
+        )
+    return _async_client
+
+
+def _response_text(resp) -> str:
+    chunks = []
+    for part in resp.content:
+        if getattr(part, "type", "") == "text":
+            chunks.append(part.text)
+    return "".join(chunks)
+
+
+def _build_result(resp, model: str, latency_s: float) -> CompletionResult:
+    return CompletionResult(
+        text=_response_text(resp),
+        model=model,
+        usage=Usage.from_api(resp.usage),
+        stop_reason=resp.stop_reason,
+        latency_s=latency_s,
+    )
+
+
+def _report_usage(model: str, usage: Usage) -> None:
+    """Log token usage including prompt-cache reads and writes."""
+    cache_read = usage.cache_read_input_tokens
+    cache_write = usage.cache_creation_input_tokens
+    logger.info(
+        f"Usage for {model}: input={usage.input_tokens}, output={usage.output_tokens}, "
+        f"cache_read={cache_read}, cache_write={cache_write}"
+    )
+    if cache_read or cache_write:
+        console.print(
+            f"[dim]🧊 Prompt cache ({model}): {cache_read} tokens read, "
+            f"{cache_write} tokens written[/dim]"
+        )
+
+
+def _is_overloaded(e: BaseException) -> bool:
+    return isinstance(e, anthropic.APIStatusError) and e.status_code == 529
+
+
+def _retry_delay(e: Exception, attempt: int, retries: int) -> float:
+    """Map an API error to a backoff delay, or raise if it must not be retried."""
+    if _is_overloaded(e):
+        wait_time = 2 ** (attempt + 1)
+        console.print(f"[yellow]🔥 Model overloaded, waiting {wait_time}s...[/yellow]")
+        logger.warning(f"Overloaded (529) on attempt {attempt + 1}")
+        if attempt < retries:
+            return wait_time
+        raise SystemExit(f"Model overloaded after {retries + 1} attempts")
+
+    if isinstance(e, anthropic.RateLimitError):
+        # The SDK exception has no retry_after attribute; read the header instead
+        wait_time = retry_after_seconds(e.response.headers)
+        if wait_time is None:
+            wait_time = min(60, 5 * 2**attempt)
+        console.print(f"[yellow]⏳ Rate limit hit, waiting {wait_time}s...[/yellow]")
+        logger.warning(f"Rate limit hit on attempt {attempt + 1}, waiting {wait_time}s")
+        if attempt < retries:
+            return wait_time
+        raise SystemExit(f"Rate limit exceeded after {retries + 1} attempts")
+
+    if isinstance(e, anthropic.AuthenticationError):
+        logger.error("Authentication failed - invalid API key")
+        raise SystemExit("❌ Invalid ANTHROPIC_API_KEY - check your .env file")
+
+    if isinstance(e, anthropic.APITimeoutError):
+        logger.warning(f"API timeout on attempt {attempt + 1}")
+        console.print(
+            f"[yellow]⏰ API timeout (attempt {attempt + 1}), retrying...[/yellow]"
+        )
+        if attempt < retries:
+            return 2**attempt  # Exponential backoff
+        raise SystemExit(f"API timeout after {retries + 1} attempts")
+
+    if isinstance(e, anthropic.APIConnectionError):
+        logger.warning(f"Connection error on attempt {attempt + 1}: {e}")
+        console.print(
+            f"[yellow]🌐 Connection error (attempt {attempt + 1}), retrying...[/yellow]"
+        )
+        if attempt < retries:
+            return 3**attempt  # Longer backoff for connection issues
+        raise SystemExit(f"Connection failed after {retries + 1} attempts")
+
+    if isinstance(e, anthropic.BadRequestError):
+        logger.error(f"Bad request error: {e}")
+        raise SystemExit(f"❌ Bad request - check your parameters: {e}")
+
+    logger.error(f"Unexpected error on attempt {attempt + 1}: {type(e).__name__}: {e}")
+    console.print(
+        f"[red]💥 Unexpected error (attempt {attempt + 1}): {type(e).__name__}[/red]"
+    )
+    if attempt < retries:
+        return 1.5**attempt
+    logger.error(f"All {retries + 1} attempts failed")
+    raise SystemExit(f"❌ All retry attempts failed: {type(e).__name__}: {e}")
+
+
 def complete(
     model: str,
-    system: str,
-    prompt: str,
+    system: PromptInput,
+    prompt: PromptInput,
     max_tokens: int = 1200,
     timeout_s: int = 60,
     retries: int = 2,
-) -> str:
-    """Complete a chat with enhanced error handling and logging."""
+    cache_tag: str = "",
+    history: Optional[List[Dict[str, Any]]] = None,
+) -> CompletionResult:
+    """Complete a chat with enhanced error handling and logging.
+
+    ``cache_tag`` identifies the prompt template version and is part of the
+    response cache key. ``history`` holds earlier user/assistant messages when
+    ``prompt`` continues a conversation (e.g. a repair turn).
+    """
     logger.info(
         f"Starting completion with model {model}, max_tokens={max_tokens}, timeout={timeout_s}s"
     )
+    request = _request_prompt(prompt, history)
+    cache_key, cached = _cache_lookup(model, system, request, max_tokens, cache_tag)
+    if cached is not None:
+        return cached
+    reserved = _estimate_input_tokens(model, system, request)
 
     for attempt in range(retries + 1):
         try:
             logger.debug(f"Attempt {attempt + 1}/{retries + 1} for model {model}")
 
-            resp = client().messages.create(
+            if _rate_limiter is not None:
+                _rate_limiter.acquire(model, reserved)
+
+            started = time.monotonic()
+            raw = client().messages.with_raw_response.create(
                 model=model,
                 system=system,
-                messages=[{"role": "user", "content": prompt}],
+                messages=_conversation(prompt, history),
                 max_tokens=max_tokens,
                 timeout=timeout_s,
             )
+            _observe_headers(model, raw.headers)
+            resp = raw.parse()
 
-            chunks = []
-            for part in resp.content:
-                if getattr(part, "type", "") == "text":
-                    chunks.append(part.text)
-
-            result = "".join(chunks)
-            logger.info(f"Completion successful: {len(result)} characters returned")
+            result = _build_result(resp, model, time.monotonic() - started)
+            logger.info(
+                f"Completion successful: {len(result.text)} characters returned"
+            )
+            _report_usage(model, result.usage)
+            _observe_result(reserved, result)
+            _cache_store(cache_key, result)
             return result
 
-        except anthropic.RateLimitError as e:
-            wait_time = getattr(e, "retry_after", 60)
-            console.print(
-                f"[yellow]⏳ Rate limit hit, waiting {wait_time}s...[/yellow]"
-            )
-            logger.warning(
-                f"Rate limit hit on attempt {attempt + 1}, waiting {wait_time}s"
+        except Exception as e:
+            _observe_error(model, e)
+            time.sleep(_retry_delay(e, attempt, retries))
+
+    # This should never be reached, but for type safety
+    raise RuntimeError("All retry attempts failed - this should not happen")
+
+
+def complete_stream(
+    model: str,
+    system: PromptInput,
+    prompt: PromptInput,
+    max_tokens: int = 1200,
+    timeout_s: int = 60,
+    retries: int = 2,
+    stop_sequences: Optional[List[str]] = None,
+    handler: Optional[StreamHandler] = None,
+    cache_tag: str = "",
+    history: Optional[List[Dict[str, Any]]] = None,
+) -> CompletionResult:
+    """Streaming variant of :func:`complete`.
+
+    Text is passed to ``handler`` as it arrives; leaving the stream early
+    closes the connection, which ends generation (and output billing) on the
+    server. A matched stop sequence is appended to the returned text so that
+    marker-based extraction keeps working.
+    """
+    logger.info(
+        f"Starting streamed completion with model {model}, "
+        f"max_tokens={max_tokens}, timeout={timeout_s}s"
+    )
+    request = _request_prompt(prompt, history)
+    cache_key, cached = _cache_lookup(model, system, request, max_tokens, cache_tag)
+    if cached is not None:
+        if handler is not None:
+            handler.reset()
+            handler.feed(cached.text)
+        return cached
+    reserved = _estimate_input_tokens(model, system, request)
+
+    for attempt in range(retries + 1):
+        if handler is not None:
+            handler.reset()
+        chunks: List[str] = []
+        try:
+            if _rate_limiter is not None:
+                _rate_limiter.acquire(model, reserved)
+
+            started = time.monotonic()
+            with client().messages.stream(
+                model=model,
+                system=system,
+                messages=_conversation(prompt, history),
+                max_tokens=max_tokens,
+                stop_sequences=stop_sequences or anthropic.NOT_GIVEN,
+                timeout=timeout_s,
+            ) as stream:
+                _observe_headers(model, stream.response.headers)
+                aborted = False
+                for text in stream.text_stream:
+                    chunks.append(text)
+                    if handler is not None and handler.feed(text):
+                        aborted = True
+                        break
+
+                snapshot = stream.current_message_snapshot
+                usage = Usage.from_api(snapshot.usage)
+                if aborted:
+                    stop_reason = "handler_stop"
+                    # The final output count never arrives for an aborted
+                    # stream; approximate it from the text received so far
+                    usage.output_tokens = max(
+                        usage.output_tokens, sum(map(len, chunks)) // 4
+                    )
+                    logger.info(
+                        "Stream stopped early by handler after "
+                        f"{sum(map(len, chunks))} characters"
+                    )
+                else:
+                    final = stream.get_final_message()
+                    usage = Usage.from_api(final.usage)
+                    stop_reason = final.stop_reason
+                    if final.stop_reason == "stop_sequence" and final.stop_sequence:
+                        chunks.append(final.stop_sequence)
+                        if handler is not None:
+                            handler.feed(final.stop_sequence)
+
+            result = CompletionResult(
+                text="".join(chunks),
+                model=model,
+                usage=usage,
+                stop_reason=stop_reason,
+                latency_s=time.monotonic() - started,
             )
-            if attempt < retries:
-                time.sleep(wait_time)
-                continue
+            logger.info(f"Streamed completion: {len(result.text)} characters returned")
+            _report_usage(model, usage)
+            _observe_result(reserved, result)
+            if handler is None or handler.cacheable():
+                _cache_store(cache_key, result)
+            return result
+
+        except Exception as e:
+            _observe_error(model, e)
+            time.sleep(_retry_delay(e, attempt, retries))
+
+    raise RuntimeError("All retry attempts failed - this should not happen")
+
+
+def _breakpoints(blocks: Any) -> int:
+    """Number of ``cache_control`` blocks in a system prompt or tool list."""
+    if not isinstance(blocks, list):
+        return 0
+    return sum(1 for b in blocks if isinstance(b, dict) and "cache_control" in b)
+
+
+def _with_tool_breakpoint(
+    messages: List[Dict[str, Any]], fixed: int
+) -> List[Dict[str, Any]]:
+    """Copy of ``messages`` with the moving breakpoint on the last tool result.
+
+    Older tool results lose theirs. ``fixed`` breakpoints (system prompt and
+    tools) are kept; history breakpoints are dropped oldest first so the
+    request stays within :data:`MAX_CACHE_BREAKPOINTS`. Blocks are copied
+    because the earlier messages belong to the caller's history.
+    """
+    copied: List[Dict[str, Any]] = []
+    marked: List[Dict[str, Any]] = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            content = [dict(block) for block in content]
+            for block in content:
+                if block.get("type") == "tool_result":
+                    block.pop("cache_control", None)
+                elif "cache_control" in block:
+                    marked.append(block)
+        copied.append({**message, "content": content})
+
+    room = MAX_CACHE_BREAKPOINTS - fixed - 1
+    if room < 0:
+        return copied
+    for block in marked[: max(0, len(marked) - room)]:
+        block.pop("cache_control")
+    copied[-1]["content"][-1]["cache_control"] = {"type": "ephemeral"}
+    return copied
+
+
+def _tool_request(messages: List[Dict[str, Any]]) -> PromptInput:
+    """Text blocks of a tool conversation, so tool traffic counts towards the size."""
+    blocks: List[Dict[str, Any]] = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        for block in content:
+            if block.get("type") == "tool_result":
+                blocks.append({"type": "text", "text": str(block["content"])})
+            elif block.get("type") == "tool_use":
+                blocks.append({"type": "text", "text": json.dumps(block["input"])})
             else:
-                raise SystemExit(f"Rate limit exceeded after {retries + 1} attempts")
+                blocks.append(block)
+    return blocks
 
-        except anthropic.AuthenticationError:
-            logger.error("Authentication failed - invalid API key")
-            raise SystemExit("❌ Invalid ANTHROPIC_API_KEY - check your .env file")
 
-        except anthropic.APITimeoutError:
-            logger.warning(f"API timeout on attempt {attempt + 1}")
-            console.print(
-                f"[yellow]⏰ API timeout (attempt {attempt + 1}), retrying...[/yellow]"
+def complete_with_tools(
+    model: str,
+    system: PromptInput,
+    prompt: PromptInput,
+    tools: List[Dict[str, Any]],
+    run_tool: Callable[[str, Dict[str, Any]], str],
+    max_tokens: int = 1200,
+    timeout_s: int = 60,
+    retries: int = 2,
+    max_rounds: int = 8,
+    history: Optional[List[Dict[str, Any]]] = None,
+    temperature: Optional[float] = None,
+) -> CompletionResult:
+    """Complete a chat in which the model may call ``tools`` before answering.
+
+    Every ``tool_use`` block is executed with ``run_tool(name, input)`` and
+    its result sent back, until the model answers with text or ``max_rounds``
+    is reached (the last round disables tool use). The latest tool results
+    are the moving cache breakpoint, so each round only pays for new input;
+    older ``history`` breakpoints make way for it once the request would
+    exceed :data:`MAX_CACHE_BREAKPOINTS`.
+    Usage is summed over all rounds. The response cache is not used because
+    the answer depends on the repository's current files.
+    """
+    logger.info(
+        f"Starting tool completion with model {model}, "
+        f"max_tokens={max_tokens}, max_rounds={max_rounds}"
+    )
+    messages = _conversation(prompt, history)
+    fixed_breakpoints = _breakpoints(system) + _breakpoints(tools)
+    total = Usage()
+    latency = 0.0
+    for round_no in range(1, max_rounds + 1):
+        reserved = _estimate_input_tokens(model, system, _tool_request(messages), tools)
+        for attempt in range(retries + 1):
+            try:
+                if _rate_limiter is not None:
+                    _rate_limiter.acquire(model, reserved)
+
+                started = time.monotonic()
+                raw = client().messages.with_raw_response.create(
+                    model=model,
+                    system=system,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    tools=tools,
+                    tool_choice=(
+                        {"type": "none"} if round_no == max_rounds else {"type": "auto"}
+                    ),
+                    extra_body=(
+                        None if temperature is None else {"temperature": temperature}
+                    ),
+                    timeout=timeout_s,
+                )
+                _observe_headers(model, raw.headers)
+                resp = raw.parse()
+                break
+            except Exception as e:
+                _observe_error(model, e)
+                time.sleep(_retry_delay(e, attempt, retries))
+
+        result = _build_result(resp, model, time.monotonic() - started)
+        # The API adds an unseen tool-use system prompt, which would skew the
+        # calibration factor of plain requests
+        _observe_result(reserved, result, calibrate=False)
+        latency += result.latency_s
+        for name in asdict(total):
+            setattr(total, name, getattr(total, name) + getattr(result.usage, name))
+
+        calls = [b for b in resp.content if getattr(b, "type", "") == "tool_use"]
+        if resp.stop_reason != "tool_use" or not calls:
+            logger.info(
+                f"Tool completion finished after {round_no} rounds: "
+                f"{len(result.text)} characters returned"
             )
-            if attempt < retries:
-                time.sleep(2**attempt)  # Exponential backoff
-                continue
-            else:
-                raise SystemExit(f"API timeout after {retries + 1} attempts")
+            _report_usage(model, total)
+            result.usage, result.latency_s = total, latency
+            return result
 
-        except anthropic.APIConnectionError as e:
-            logger.warning(f"Connection error on attempt {attempt + 1}: {e}")
-            console.print(
-                f"[yellow]🌐 Connection error (attempt {attempt + 1}), retrying...[/yellow]"
+        results = []
+        for call in calls:
+            console.print(f"[dim]🔎 {call.name}({json.dumps(call.input)})[/dim]")
+            results.append(
+                {
+                    "type": "tool_result",
+                    "tool_use_id": call.id,
+                    "content": run_tool(call.name, dict(call.input)),
+                }
             )
-            if attempt < retries:
-                time.sleep(3**attempt)  # Longer backoff for connection issues
-                continue
-            else:
-                raise SystemExit(f"Connection failed after {retries + 1} attempts")
+        messages = _with_tool_breakpoint(
+            messages
+            + [
+                {
+                    "role": "assistant",
+                    "content": [b.model_dump(exclude_none=True) for b in resp.content],
+                },
+                {"role": "user", "content": results},
+            ],
+            fixed_breakpoints,
+        )
 
-        except anthropic.BadRequestError as e:
-            logger.error(f"Bad request error: {e}")
-            raise SystemExit(f"❌ Bad request - check your parameters: {e}")
+    raise RuntimeError("Tool rounds exhausted - this should not happen")
 
-        except Exception as e:
-            logger.error(
-                f"Unexpected error on attempt {attempt + 1}: {type(e).__name__}: {e}"
+
+async def acomplete(
+    model: str,
+    system: PromptInput,
+    prompt: PromptInput,
+    max_tokens: int = 1200,
+    timeout_s: int = 60,
+    retries: int = 2,
+    cache_tag: str = "",
+    fail_fast_overload: bool = False,
+    temperature: Optional[float] = None,
+) -> CompletionResult:
+    """Async variant of :func:`complete` using the shared pooled client.
+
+    With ``fail_fast_overload`` an HTTP 529 is raised immediately instead of
+    being retried, so a hedged caller can fail over to another model.
+    ``temperature`` (API default when None) is part of the cache key.
+    """
+    logger.info(
+        f"Starting async completion with model {model}, "
+        f"max_tokens={max_tokens}, timeout={timeout_s}s"
+    )
+    if temperature is not None:
+        cache_tag = f"{cache_tag}|t={temperature}"
+    cache_key, cached = _cache_lookup(model, system, prompt, max_tokens, cache_tag)
+    if cached is not None:
+        return cached
+    reserved = _estimate_input_tokens(model, system, prompt)
+
+    for attempt in range(retries + 1):
+        try:
+            if _rate_limiter is not None:
+                await _rate_limiter.aacquire(model, reserved)
+
+            started = time.monotonic()
+            api = (
+                aclient().with_options(max_retries=0)
+                if fail_fast_overload
+                else aclient()
             )
-            console.print(
-                f"[red]💥 Unexpected error (attempt {attempt + 1}): {type(e).__name__}[/red]"
+            raw = await api.messages.with_raw_response.create(
+                model=model,
+                system=system,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                # Not a typed parameter of this SDK version; sent as-is
+                extra_body=(
+                    None if temperature is None else {"temperature": temperature}
+                ),
+                timeout=timeout_s,
+            )
+            _observe_headers(model, raw.headers)
+            resp = await raw.parse()
+
+            result = _build_result(resp, model, time.monotonic() - started)
+            logger.info(
+                f"Async completion successful: {len(result.text)} characters returned"
             )
-            if attempt < retries:
-                time.sleep(1.5**attempt)
+            _report_usage(model, result.usage)
+            _observe_result(reserved, result)
+            _cache_store(cache_key, result)
+            return result
+
+        except Exception as e:
+            _observe_error(model, e)
+            if fail_fast_overload and _is_overloaded(e):
+                raise
+            await asyncio.sleep(_retry_delay(e, attempt, retries))
+
+    raise RuntimeError("All retry attempts failed - this should not happen")
+
+
+class _AttemptFailed(Exception):
+    """A concurrent attempt gave up; wraps the SystemExit raised by the retry logic."""
+
+
+async def _hedge_attempt(model: str, **kwargs: Any) -> CompletionResult:
+    try:
+        return await acomplete(model, **kwargs)
+    except SystemExit as e:
+        # SystemExit escaping a task would stop the event loop for both attempts
+        raise _AttemptFailed(str(e)) from None
+
+
+def _cancelled_cost(
+    model: str,
+    system: PromptInput,
+    prompt: PromptInput,
+    winner: CompletionResult,
+    max_tokens: int,
+    latency_s: float,
+) -> CompletionResult:
+    """Conservative cost of a cancelled request: full input, winner-sized output."""
+    return CompletionResult(
+        text="",
+        model=model,
+        usage=Usage(
+            input_tokens=_estimate_input_tokens(model, system, prompt),
+            output_tokens=min(max_tokens, winner.usage.output_tokens),
+        ),
+        stop_reason="hedge_cancelled",
+        latency_s=latency_s,
+    )
+
+
+async def acomplete_hedged(
+    policy: Optional[HedgePolicy],
+    model: str,
+    system: PromptInput,
+    prompt: PromptInput,
+    max_tokens: int = 1200,
+    timeout_s: int = 60,
+    retries: int = 2,
+    cache_tag: str = "",
+) -> CompletionResult:
+    """:func:`acomplete` with a duplicate request for slow or overloaded calls.
+
+    The hedge goes to ``policy.fallback_model`` (or ``model``) once the primary
+    is slower than the policy's latency percentile, or right away when the
+    primary is overloaded. The first successful response wins and the other
+    request is cancelled; its cost is attached as ``hedge_costs``.
+    """
+    kwargs = dict(
+        system=system,
+        prompt=prompt,
+        max_tokens=max_tokens,
+        timeout_s=timeout_s,
+        cache_tag=cache_tag,
+    )
+    if policy is None:
+        return await acomplete(model, retries=retries, **kwargs)
+
+    delay = _latency_tracker.percentile(model, policy.percentile, policy.min_samples)
+    if delay is None:
+        delay = policy.initial_delay_s
+    started = time.monotonic()
+    primary = asyncio.create_task(
+        _hedge_attempt(model, retries=retries, fail_fast_overload=True, **kwargs)
+    )
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done and primary.exception() is None:
+        return primary.result()
+    if done and not _is_overloaded(primary.exception()):
+        raise SystemExit(str(primary.exception()))
+
+    hedge_model = policy.fallback_model or model
+    reason = (
+        "overloaded" if done else f"slower than p{policy.percentile:g} ({delay:.1f}s)"
+    )
+    console.print(f"[yellow]🏁 {model} {reason}, hedging with {hedge_model}[/yellow]")
+    logger.info(f"Hedging {model} with {hedge_model}: {reason}")
+    hedge = asyncio.create_task(_hedge_attempt(hedge_model, retries=retries, **kwargs))
+
+    pending = {hedge} if done else {primary, hedge}
+    models = {primary: model, hedge: hedge_model}
+    errors: List[BaseException] = [primary.exception()] if done else []
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                errors.append(task.exception())
                 continue
-            else:
-                logger.error(f"All {retries + 1} attempts failed")
-                raise SystemExit(
-                    f"❌ All retry attempts failed: {type(e).__name__}: {e}"
+            winner = task.result()
+            for loser in pending:
+                loser.cancel()
+                winner.hedge_costs.append(
+                    _cancelled_cost(
+                        models[loser],
+                        system,
+                        prompt,
+                        winner,
+                        max_tokens,
+                        time.monotonic() - started,
+                    )
                 )
+            for other in done - {task}:
+                if other.exception() is None and not other.result().cached:
+                    winner.hedge_costs.append(other.result())
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            logger.info(f"Hedge won by {models[task]}")
+            return winner
 
-    # This should never be reached, but for type safety
-    raise RuntimeError("All retry attempts failed - this should not happen")
+    raise SystemExit(f"❌ Hedged completion failed: {errors[-1]}")
+
+
+def complete_hedged(policy: Optional[HedgePolicy], *args: Any, **kwargs: Any):
+    """Synchronous entry point for :func:`acomplete_hedged`."""
+    return run_async(acomplete_hedged(policy, *args, **kwargs))
+
+
+async def gather_completions(
+    requests: List[Dict[str, Any]], concurrency: int = DEFAULT_CONCURRENCY
+) -> List[Optional[CompletionResult]]:
+    """Run several :func:`acomplete` calls with at most ``concurrency`` in flight.
+
+    Each request is a dict of ``acomplete`` keyword arguments. Results are
+    returned in request order; a request that gave up is None instead of
+    aborting its siblings.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _bounded(kwargs: Dict[str, Any]) -> CompletionResult:
+        async with semaphore:
+            return await _hedge_attempt(**kwargs)
+
+    outcomes = await asyncio.gather(
+        *(_bounded(r) for r in requests), return_exceptions=True
+    )
+    results: List[Optional[CompletionResult]] = []
+    for kwargs, outcome in zip(requests, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.error(f"Completion with {kwargs.get('model')} failed: {outcome}")
+            console.print(
+                f"[red]❌ Request to {kwargs.get('model')} failed: {outcome}[/red]"
+            )
+            results.append(None)
+        else:
+            results.append(outcome)
+    return results
+
+
+def complete_many(
+    requests: List[Dict[str, Any]], concurrency: int = DEFAULT_CONCURRENCY
+) -> List[Optional[CompletionResult]]:
+    """Synchronous entry point for :func:`gather_completions`."""
+    return run_async(gather_completions(requests, concurrency))
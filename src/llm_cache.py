@@ -0,0 +1,218 @@
+"""
+Content-addressed LLM Response Cache
+Reuses model outputs for identical requests with a byte-size cap and LRU eviction.
+
+The index (sizes, access times, hit/miss counters) is shared by all processes
+using the cache directory: every update re-reads it under a file lock, so
+parallel runs merge their entries instead of overwriting each other's.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from rich.console import Console
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+console = Console()
+
+
+class ResponseCache:
+    """On-disk cache of completion texts keyed by a hash of the full request."""
+
+    def __init__(
+        self, cache_dir: str = ".ai_agents_cache", max_bytes: int = 50 * 1024 * 1024
+    ):
+        self.cache_dir = Path(cache_dir) / "llm"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.cache_dir / "index.json"
+        self.lock_file = self.cache_dir / "index.lock"
+        self.max_bytes = max_bytes
+        self._thread_lock = threading.Lock()
+
+        # Last index seen by this process; the file is authoritative
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0}
+        self._apply_index(self._load_index())
+
+    def _apply_index(self, index: Dict[str, Any]):
+        self.entries = index.get("entries", {})
+        self.stats = index.get("stats", {"hits": 0, "misses": 0})
+
+    @contextmanager
+    def _locked_index(self):
+        """Re-read the index under an exclusive lock and save it on exit."""
+        with self._thread_lock:
+            with open(self.lock_file, "a+") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    self._apply_index(self._load_index())
+                    yield
+                    self._save_index()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _load_index(self) -> Dict[str, Any]:
+        """Load the entry index and hit/miss counters from disk."""
+        if not self.index_file.exists():
+            return {}
+
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Failed to load LLM cache index: {e}")
+            return {}
+
+    def _save_index(self):
+        """Atomically write the index so concurrent runs never see a partial file."""
+        data = {"entries": self.entries, "stats": self.stats}
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.index_file)
+        except OSError as e:
+            logger.error(f"Failed to save LLM cache index: {e}")
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    @staticmethod
+    def make_key(
+        model: str, system: Any, prompt: Any, max_tokens: int, template_version: str
+    ) -> str:
+        """Hash everything that influences the model output."""
+        payload = json.dumps(
+            [model, system, prompt, max_tokens, template_version],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached record for ``key`` and mark it recently used."""
+        with self._locked_index():
+            entry = self.entries.get(key)
+            record = None
+            if entry is not None:
+                try:
+                    with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                        record = json.load(f)
+                except (json.JSONDecodeError, OSError):
+                    self.entries.pop(key, None)
+
+            if record is None:
+                self.stats["misses"] = self.stats.get("misses", 0) + 1
+                return None
+
+            entry["last_access"] = time.time()
+            self.stats["hits"] = self.stats.get("hits", 0) + 1
+        logger.info(f"LLM cache hit: {key[:12]}")
+        return record
+
+    def put(self, key: str, record: Dict[str, Any]):
+        """Store a response record and evict least recently used entries."""
+        data = json.dumps(record, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        if size > self.max_bytes:
+            logger.info(f"Response of {size} bytes exceeds LLM cache capacity")
+            return
+
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self._entry_path(key))
+        except OSError as e:
+            logger.error(f"Failed to write LLM cache entry: {e}")
+            return
+
+        with self._locked_index():
+            self.entries[key] = {
+                "size": size,
+                "last_access": time.time(),
+                "model": record.get("model", ""),
+            }
+            self._evict()
+
+    def _entry_files(self) -> Dict[str, os.stat_result]:
+        """Entry files actually on disk, by key."""
+        files = {}
+        for path in self.cache_dir.glob("*.json"):
+            if path == self.index_file:
+                continue
+            try:
+                files[path.stem] = path.stat()
+            except OSError:
+                continue
+        return files
+
+    def _evict(self):
+        """Drop least recently used entries until the byte cap is respected.
+
+        Entry files missing from the index (e.g. written by a run that crashed
+        before saving it) are adopted with their mtime as last access, so the
+        cap covers everything on disk.
+        """
+        on_disk = self._entry_files()
+        for key in [k for k in self.entries if k not in on_disk]:
+            del self.entries[key]
+        for key, st in on_disk.items():
+            if key not in self.entries:
+                self.entries[key] = {
+                    "size": st.st_size,
+                    "last_access": st.st_mtime,
+                    "model": "",
+                }
+        total = sum(e["size"] for e in self.entries.values())
+        if total <= self.max_bytes:
+            return
+
+        for key, entry in sorted(
+            self.entries.items(), key=lambda item: item[1]["last_access"]
+        ):
+            if total <= self.max_bytes:
+                break
+            self._entry_path(key).unlink(missing_ok=True)
+            del self.entries[key]
+            total -= entry["size"]
+            logger.info(f"Evicted LLM cache entry {key[:12]}")
+
+    def reset(self):
+        """Remove all cached responses and counters."""
+        with self._locked_index():
+            for key in set(self.entries) | set(self._entry_files()):
+                self._entry_path(key).unlink(missing_ok=True)
+            self.entries.clear()
+            self.stats = {"hits": 0, "misses": 0}
+        console.print("[yellow]🗑️ Reset LLM response cache[/yellow]")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and size information."""
+        self._apply_index(self._load_index())
+        hits = self.stats.get("hits", 0)
+        misses = self.stats.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "entries": len(self.entries),
+            "bytes": sum(e["size"] for e in self.entries.values()),
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / lookups * 100) if lookups else 0.0,
+        }
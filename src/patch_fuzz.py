@@ -0,0 +1,349 @@
+"""
+Fuzzy Hunk Relocation for LLM-Generated Diffs
+Re-anchors hunks with wrong line numbers or slightly stale context for git apply.
+
+Each hunk is located in the current file by its old side (context and removed
+lines): first at the stated position, then anywhere (offset), then ignoring
+whitespace, then by similarity above a threshold. A similarity match is aligned
+line by line with ``difflib``; it only counts if every removed line is found in
+the file (whitespace aside), and it is refused if an equally similar window
+would change other lines. Matched hunks are rewritten with the real line
+numbers, the file's actual context lines and recounted ``@@`` headers, so
+``git apply`` receives a clean diff.
+"""
+
+import difflib
+import logging
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$")
+
+DEFAULT_THRESHOLD = 0.8
+CONTEXT_LINES = 3
+
+
+@dataclass
+class Hunk:
+    old_start: int
+    new_start: int
+    lines: List[str]  # body lines with their " ", "-", "+" or "\\" prefix
+    section: str = ""  # text after the closing "@@"
+
+    @property
+    def old_lines(self) -> List[str]:
+        return [line[1:] for line in self.lines if line[:1] in (" ", "-")]
+
+    @property
+    def old_count(self) -> int:
+        return len(self.old_lines)
+
+    @property
+    def new_count(self) -> int:
+        return sum(1 for line in self.lines if line[:1] in (" ", "+"))
+
+
+@dataclass
+class FilePatch:
+    header: List[str]  # everything before the first hunk, incl. ---/+++
+    old_path: str
+    new_path: str
+    hunks: List[Hunk] = field(default_factory=list)
+
+
+@dataclass
+class HunkMatch:
+    """How one hunk was located.
+
+    ``method`` is exact|offset|whitespace|fuzzy|new-file|ambiguous|failed.
+    """
+
+    path: str
+    index: int
+    method: str
+    expected_line: int
+    line: int = 0
+    similarity: float = 1.0
+
+    @property
+    def offset(self) -> int:
+        return self.line - self.expected_line if self.line else 0
+
+
+def _path(header_line: str) -> str:
+    raw = header_line[4:].split("\t", 1)[0].strip()
+    return raw[2:] if raw[:2] in ("a/", "b/") else raw
+
+
+def parse_patch(text: str) -> List[FilePatch]:
+    """Parse a unified diff. Hunk line counts are ignored and recomputed on render."""
+    files: List[FilePatch] = []
+    header: List[str] = []
+    current: Optional[FilePatch] = None
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("--- ") and i + 1 < len(lines):
+            if lines[i + 1].startswith("+++ "):
+                current = FilePatch(
+                    header=header + [line, lines[i + 1]],
+                    old_path=_path(line),
+                    new_path=_path(lines[i + 1]),
+                )
+                files.append(current)
+                header = []
+                i += 2
+                continue
+        m = _HUNK_HEADER.match(line)
+        if m and current is not None:
+            current.hunks.append(Hunk(int(m.group(1)), int(m.group(3)), [], m.group(5)))
+        elif current is not None and current.hunks and not header:
+            if line.startswith("diff --git "):
+                header.append(line)
+            elif line[:1] in (" ", "-", "+", "\\"):
+                current.hunks[-1].lines.append(line)
+            elif line == "":
+                # Models often drop the space prefix of empty context lines
+                current.hunks[-1].lines.append(" ")
+            else:
+                header.append(line)
+        else:
+            header.append(line)
+        i += 1
+    return files
+
+
+def render_patch(files: List[FilePatch]) -> str:
+    """Render parsed files as a unified diff with recounted hunk headers."""
+    out: List[str] = []
+    for fp in files:
+        out.extend(fp.header)
+        for h in fp.hunks:
+            out.append(
+                f"@@ -{h.old_start},{h.old_count} +{h.new_start},{h.new_count} @@"
+                f"{h.section}"
+            )
+            out.extend(h.lines)
+    return "\n".join(out) + "\n"
+
+
+def _norm(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _similarity(a: List[str], b: List[str]) -> float:
+    matcher = difflib.SequenceMatcher(None, "\n".join(a), "\n".join(b), autojunk=False)
+    if matcher.real_quick_ratio() == 0 or matcher.quick_ratio() == 0:
+        return 0.0
+    return matcher.ratio()
+
+
+def _nearest(candidates: List[int], expected: int) -> Optional[int]:
+    return min(candidates, key=lambda c: abs(c - expected)) if candidates else None
+
+
+def locate_hunk(
+    file_lines: List[str],
+    hunk: Hunk,
+    start_from: int,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> Tuple[Optional[int], str, float]:
+    """Find the 0-based line where the hunk's old side starts in ``file_lines``.
+
+    Only positions at or after ``start_from`` are considered, keeping hunks in
+    order and non-overlapping. Returns ``(index, method, similarity)``.
+    """
+    old = hunk.old_lines
+    if not old:
+        # Pure insertion after line old_start: nothing to anchor on
+        pos = min(max(hunk.old_start, start_from), len(file_lines))
+        return pos, "exact" if pos == hunk.old_start else "offset", 1.0
+
+    expected = max(0, hunk.old_start - 1)
+    n = len(old)
+    positions = range(start_from, len(file_lines) - n + 1)
+    if expected >= start_from and file_lines[expected : expected + n] == old:
+        return expected, "exact", 1.0
+
+    exact = [p for p in positions if file_lines[p : p + n] == old]
+    pos = _nearest(exact, expected)
+    if pos is not None:
+        return pos, "offset", 1.0
+
+    old_norm = [_norm(line) for line in old]
+    norm_file = [_norm(line) for line in file_lines]
+    loose = [p for p in positions if norm_file[p : p + n] == old_norm]
+    pos = _nearest(loose, expected)
+    if pos is not None:
+        return pos, "whitespace", 1.0
+
+    scored = [(_similarity(norm_file[p : p + n], old_norm), p) for p in positions]
+    best_score = max((score for score, _ in scored), default=0.0)
+    # Best first, nearest to the stated line among equals
+    scored.sort(key=lambda sp: (-sp[0], abs(sp[1] - expected)))
+    best: Optional[Tuple[float, int, int]] = None
+    for score, p in scored:
+        if score < threshold or (best is not None and score < best[0]):
+            break
+        lines = _aligned_lines(hunk, file_lines[p : p + n])
+        if lines is None:
+            continue
+        change = p + _first_change(lines)
+        if best is None:
+            best = (score, p, change)
+        elif change != best[2]:
+            return None, "ambiguous", score
+    if best is not None:
+        return best[1], "fuzzy", best[0]
+    return None, "failed", best_score
+
+
+def _aligned_lines(hunk: Hunk, window: List[str]) -> Optional[List[str]]:
+    """Hunk body rewritten against the file lines it is matched to.
+
+    The old side is aligned with ``window`` by ``difflib`` opcodes on
+    whitespace-normalized lines. Matched lines take the file's text, stale
+    context lines are dropped and unmatched file lines become context, so the
+    old side equals ``window``. None if a removed line has no match.
+    """
+    old = hunk.old_lines
+    matcher = difflib.SequenceMatcher(
+        None,
+        [_norm(line) for line in old],
+        [_norm(line) for line in window],
+        autojunk=False,
+    )
+    actual: Dict[int, str] = {}  # old side index -> matched file line
+    extra: Dict[int, List[str]] = {}  # unmatched file lines before an old index
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            actual.update(zip(range(i1, i2), window[j1:j2]))
+        else:
+            extra.setdefault(i1, []).extend(window[j1:j2])
+
+    lines: List[str] = []
+    i = 0
+    for line in hunk.lines:
+        if line[:1] not in (" ", "-"):
+            lines.append(line)
+            continue
+        lines += [" " + text for text in extra.get(i, [])]
+        if i in actual:
+            lines.append(line[0] + actual[i])
+        elif line[0] == "-":
+            return None
+        i += 1
+    tail = [" " + text for text in extra.get(i, [])]
+    if tail and lines and lines[-1].startswith("\\"):
+        # Keep the "no newline at end of file" marker last
+        return lines[:-1] + tail + lines[-1:]
+    return lines + tail
+
+
+def _first_change(lines: List[str]) -> int:
+    """Old side offset of the first removed or added line of a hunk body."""
+    offset = 0
+    for line in lines:
+        if line[:1] in ("-", "+"):
+            break
+        if line.startswith(" "):
+            offset += 1
+    return offset
+
+
+def _context_run(lines: List[str]) -> int:
+    """Number of leading context lines of a hunk body."""
+    count = 0
+    for line in lines:
+        if not line.startswith(" "):
+            break
+        count += 1
+    return count
+
+
+def _renumber(file_lines: List[str], located: List[Tuple[Hunk, int]]):
+    """Write final line numbers, adding real context to context-free hunks.
+
+    git anchors a hunk without leading or trailing context to the start or
+    end of the file, so such hunks get up to ``CONTEXT_LINES`` lines of the
+    surrounding file content (never overlapping a neighbouring hunk).
+    """
+    prev_end, delta = 0, 0
+    for idx, (h, pos) in enumerate(located):
+        end = pos + h.old_count
+        next_start = located[idx + 1][1] if idx + 1 < len(located) else len(file_lines)
+        if _context_run(h.lines) == 0:
+            k = max(0, min(CONTEXT_LINES, pos - prev_end))
+            h.lines = [" " + line for line in file_lines[pos - k : pos]] + h.lines
+            pos -= k
+        if _context_run(h.lines[::-1]) == 0 and not h.lines[-1].startswith("\\"):
+            k = max(0, min(CONTEXT_LINES, next_start - end))
+            h.lines = h.lines + [" " + line for line in file_lines[end : end + k]]
+            end += k
+        # git numbers an empty side by the line before it
+        h.old_start = pos + 1 if h.old_count else pos
+        h.new_start = pos + delta + (1 if h.new_count else 0)
+        delta += h.new_count - h.old_count
+        prev_end = end
+
+
+def relocate_patch(
+    repo_path: str, patch_text: str, threshold: float = DEFAULT_THRESHOLD
+) -> Tuple[Optional[str], List[HunkMatch]]:
+    """Re-anchor every hunk of ``patch_text`` against the files in ``repo_path``.
+
+    Returns the rewritten patch (None if any hunk could not be located) and
+    how each hunk was matched.
+    """
+    files = parse_patch(patch_text)
+    matches: List[HunkMatch] = []
+    ok = bool(files)
+    for fp in files:
+        path = fp.new_path if fp.old_path == "/dev/null" else fp.old_path
+        if fp.old_path == "/dev/null":
+            for i, h in enumerate(fp.hunks):
+                h.old_start, h.new_start = 0, 1
+                matches.append(HunkMatch(path, i, "new-file", 0, 1))
+            continue
+        try:
+            text = (Path(repo_path) / path).read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning(f"Cannot relocate hunks of {path}: {e}")
+            matches.extend(
+                HunkMatch(path, i, "failed", h.old_start, similarity=0.0)
+                for i, h in enumerate(fp.hunks)
+            )
+            ok = False
+            continue
+
+        file_lines = text.splitlines()
+        # Models do not always emit hunks in file order
+        fp.hunks.sort(key=lambda h: h.old_start)
+        located: List[Tuple[Hunk, int]] = []
+        start_from = 0
+        for i, h in enumerate(fp.hunks):
+            pos, method, score = locate_hunk(file_lines, h, start_from, threshold)
+            match = HunkMatch(path, i, method, h.old_start, similarity=score)
+            matches.append(match)
+            if pos is None:
+                ok = False
+                continue
+            if method in ("whitespace", "fuzzy"):
+                h.lines = _aligned_lines(h, file_lines[pos : pos + h.old_count])
+            match.line = pos + 1 if h.old_count else pos
+            located.append((h, pos))
+            start_from = pos + h.old_count
+        if ok:
+            _renumber(file_lines, located)
+
+    for m in matches:
+        logger.info(
+            f"Hunk {m.path}#{m.index + 1}: {m.method} "
+            f"(line {m.expected_line} -> {m.line}, similarity {m.similarity:.2f})"
+        )
+    return (render_patch(files) if ok else None), matches
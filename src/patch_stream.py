@@ -0,0 +1,239 @@
+"""
+Incremental Patch Extraction for Streamed Coder Output
+Detects the patch markers while the response is streaming and aborts early.
+"""
+
+import logging
+import pathlib
+import re
+from typing import List, Optional, Tuple
+
+from .llm import StreamHandler
+
+logger = logging.getLogger(__name__)
+
+BEGIN_PATCH = "***BEGIN_PATCH***"
+END_PATCH = "***END_PATCH***"
+
+# Upper bound for the hunk quoted back to the coder in a repair turn
+MAX_HUNK_LINES = 40
+MAX_ERROR_LINES = 6
+
+
+def extract_between(text: str, start: str, end: str) -> Optional[str]:
+    i = text.find(start)
+    j = text.find(end, i + len(start))
+    if i == -1 or j == -1:
+        return None
+    return text[i + len(start) : j].strip()
+
+
+def validate_patch_path(repo_path: str, header: str) -> Optional[str]:
+    """Check a ``---``/``+++`` diff header. Returns an error message or None."""
+    raw = header[4:].split("\t", 1)[0].strip()
+    if raw == "/dev/null":
+        return None
+
+    rel = raw[2:] if raw[:2] in ("a/", "b/") else raw
+    if not rel:
+        return f"empty path in diff header: {header!r}"
+    if rel.startswith("/") or pathlib.PureWindowsPath(rel).drive:
+        return f"absolute path in diff header: {rel}"
+
+    parts = pathlib.PurePosixPath(rel).parts
+    if ".." in parts:
+        return f"path escapes the repository: {rel}"
+    if parts and parts[0] == ".git":
+        return f"patch touches git internals: {rel}"
+
+    root = pathlib.Path(repo_path).resolve()
+    target = (root / rel).resolve()
+    if root != target and root not in target.parents:
+        return f"path resolves outside the repository: {rel}"
+
+    # A "---" side that is not /dev/null must name an existing file
+    if header.startswith("--- ") and not target.is_file():
+        return f"patch modifies a file that does not exist: {rel}"
+
+    return None
+
+
+def file_header_lines(patch: str) -> List[str]:
+    """The ``---``/``+++`` file header lines of a diff.
+
+    A ``--- `` line only starts a header when a ``+++ `` line follows it;
+    inside a hunk it is a removed line such as ``-- comment`` (SQL, Lua).
+    """
+    lines = patch.splitlines()
+    headers: List[str] = []
+    for line, following in zip(lines, lines[1:]):
+        if line.startswith("--- ") and following.startswith("+++ "):
+            headers += [line, following]
+    return headers
+
+
+def compact_apply_error(error: str) -> str:
+    """The distinct ``error:`` lines of ``git apply`` output, without noise."""
+    lines: List[str] = []
+    for line in error.splitlines():
+        line = line.strip()
+        if line.startswith("error: ") and line not in lines:
+            lines.append(line)
+    return "\n".join(lines[:MAX_ERROR_LINES]) or error.strip()[:500]
+
+
+def _file_sections(lines: List[str]) -> List[Tuple[str, int, int]]:
+    """``(path, start, end)`` line ranges of the per-file parts of a patch."""
+    sections: List[Tuple[str, int, int]] = []
+    for i, line in enumerate(lines):
+        if line.startswith("--- ") and i + 1 < len(lines):
+            if lines[i + 1].startswith("+++ "):
+                new = lines[i + 1][4:].split("\t", 1)[0].strip()
+                old = line[4:].split("\t", 1)[0].strip()
+                path = old if new == "/dev/null" else new
+                path = path[2:] if path[:2] in ("a/", "b/") else path
+                if sections:
+                    sections[-1] = (*sections[-1][:2], i)
+                sections.append((path, i, len(lines)))
+    return sections
+
+
+def _hunk_at(lines: List[str], start: int, end: int, index: int) -> str:
+    """The hunk of the file section ``[start, end)`` containing line ``index``."""
+    header = lines[start : start + 2]
+    begin = index
+    while begin > start and not lines[begin].startswith("@@"):
+        begin -= 1
+    if not lines[begin].startswith("@@"):
+        begin = start + 2
+    stop = begin + 1
+    while stop < end and not lines[stop].startswith("@@"):
+        stop += 1
+    return _clip(header + lines[begin:stop])
+
+
+def _clip(lines: List[str]) -> str:
+    if len(lines) > MAX_HUNK_LINES:
+        lines = lines[:MAX_HUNK_LINES] + [
+            f"... ({len(lines) - MAX_HUNK_LINES} more lines)"
+        ]
+    return "\n".join(lines)
+
+
+def offending_hunk(patch: str, error: str) -> str:
+    """The part of ``patch`` that ``git apply`` complained about in ``error``.
+
+    Understands ``patch failed: <path>:<line>`` (the hunk starting at that
+    line), ``... at line <n>`` (the hunk around that patch line) and
+    ``<path>: <reason>`` (the file's headers). Falls back to the patch head.
+    """
+    lines = patch.splitlines()
+    sections = _file_sections(lines)
+
+    m = re.search(r"patch failed: (.+):(\d+)", error)
+    if m:
+        path, old_start = m.group(1), m.group(2)
+        for name, start, end in sections:
+            if name != path:
+                continue
+            for i in range(start, end):
+                if re.match(rf"@@ -{old_start}(,\d+)? ", lines[i]):
+                    return _hunk_at(lines, start, end, i)
+            return _hunk_at(lines, start, end, start + 2)
+
+    m = re.search(r"at line (\d+)", error)
+    if m:
+        index = min(max(int(m.group(1)) - 1, 0), max(len(lines) - 1, 0))
+        for name, start, end in sections:
+            if start <= index < end:
+                return _hunk_at(lines, start, end, index)
+        return _clip(lines[max(0, index - 5) : index + 5])
+
+    for name, start, end in sections:
+        if f"{name}:" in error:
+            return _clip(lines[start : min(end, start + 3)])
+
+    return _clip(lines)
+
+
+class PatchStreamParser(StreamHandler):
+    """Extracts the patch from streamed text and stops at the end marker.
+
+    Generation is stopped as soon as ``end_marker`` arrives, or as soon as a
+    diff header names a path that cannot be applied to ``repo_path`` (in which
+    case :attr:`error` is set). With ``path_prefix`` (e.g. ``"FILE: "`` for
+    edit blocks) the lines starting with it are checked instead of diff headers.
+    """
+
+    def __init__(
+        self,
+        repo_path: str,
+        begin_marker: str = BEGIN_PATCH,
+        end_marker: str = END_PATCH,
+        path_prefix: Optional[str] = None,
+    ):
+        self.repo_path = repo_path
+        self.begin_marker = begin_marker
+        self.end_marker = end_marker
+        self.path_prefix = path_prefix
+        self.reset()
+
+    def reset(self) -> None:
+        self._buffer = ""
+        self._patch_start: Optional[int] = None
+        self._line_pos = 0
+        self._previous = ""
+        self.patch: Optional[str] = None
+        self.error: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.patch is not None or self.error is not None
+
+    def cacheable(self) -> bool:
+        # Rejected or unterminated patches must not be replayed on retry
+        return self.patch is not None
+
+    def feed(self, chunk: str) -> bool:
+        if self.done:
+            return True
+        self._buffer += chunk
+
+        if self._patch_start is None:
+            idx = self._buffer.find(self.begin_marker)
+            if idx == -1:
+                return False
+            self._patch_start = idx + len(self.begin_marker)
+            self._line_pos = self._patch_start
+
+        end_idx = self._buffer.find(self.end_marker, self._patch_start)
+        scan_until = len(self._buffer) if end_idx == -1 else end_idx
+
+        # Validate diff headers line by line as complete lines arrive
+        while True:
+            nl = self._buffer.find("\n", self._line_pos, scan_until)
+            if nl == -1:
+                break
+            line = self._buffer[self._line_pos : nl].rstrip("\r")
+            self._line_pos = nl + 1
+            previous, self._previous = self._previous, line
+            headers: List[str] = []
+            if self.path_prefix is not None:
+                if line.startswith(self.path_prefix):
+                    headers = ["+++ " + line[len(self.path_prefix) :].strip()]
+            elif previous.startswith("--- ") and line.startswith("+++ "):
+                # Same rule as file_header_lines: "---" needs a "+++" next
+                headers = [previous, line]
+            for header in headers:
+                error = validate_patch_path(self.repo_path, header)
+                if error:
+                    logger.warning(f"Aborting coder stream: {error}")
+                    self.error = error
+                    return True
+
+        if end_idx == -1:
+            return False
+
+        self.patch = self._buffer[self._patch_start : end_idx].strip()
+        logger.info(f"Patch complete after {end_idx} streamed characters")
+        return True
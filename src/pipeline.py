@@ -0,0 +1,269 @@
+"""
+Stage DAG Executor
+Runs pipeline stages as soon as their inputs exist, overlapping independent work.
+
+Every stage declares the artifacts it reads (``inputs``) and produces
+(``outputs``); ``after`` adds ordering-only dependencies for side effects such
+as "push only after the checks". Ready stages run concurrently on a
+thread pool, and per-stage timings are recorded for the run report.
+
+Stages whose outputs are all present in the initial artifacts (e.g. loaded
+from a run checkpoint) are restored instead of executed.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+from rich.table import Table
+
+logger = logging.getLogger(__name__)
+
+Artifacts = Dict[str, Any]
+
+
+class PipelineStop(Exception):
+    """Raised by a stage to end the run early without an error (e.g. a gate)."""
+
+
+@dataclass
+class Stage:
+    """One unit of work in the pipeline DAG."""
+
+    name: str
+    run: Callable[[Artifacts], Optional[Artifacts]]
+    inputs: Sequence[str] = ()
+    outputs: Sequence[str] = ()
+    after: Sequence[str] = ()
+    # Evaluated once the stage is ready; False skips it (its outputs stay unset)
+    when: Optional[Callable[[Artifacts], bool]] = None
+    # False for cheap stages that must observe the current state on every run
+    checkpoint: bool = True
+
+
+@dataclass
+class StageTiming:
+    name: str
+    status: str = "pending"  # pending|running|done|restored|skipped|stopped|failed
+    started: float = 0.0
+    finished: float = 0.0
+    thread: str = ""
+
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.finished - self.started) if self.started else 0.0
+
+
+@dataclass
+class PipelineResult:
+    artifacts: Artifacts
+    timings: List[StageTiming]
+    wall_time: float
+    stopped: Optional[str] = None  # message of the PipelineStop, if any
+    skipped: List[str] = field(default_factory=list)
+
+
+class Pipeline:
+    """Dependency-driven executor for a list of :class:`Stage` objects."""
+
+    def __init__(self, stages: List[Stage], max_workers: int = 4):
+        self.stages = {s.name: s for s in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique")
+        self.max_workers = max_workers
+        self.producers: Dict[str, str] = {}
+        for stage in stages:
+            for name in stage.outputs:
+                if name in self.producers:
+                    raise ValueError(
+                        f"Artifact '{name}' produced by both "
+                        f"'{self.producers[name]}' and '{stage.name}'"
+                    )
+                self.producers[name] = stage.name
+        self._check_acyclic()
+
+    def _deps(self, stage: Stage) -> Set[str]:
+        deps = {self.producers[i] for i in stage.inputs if i in self.producers}
+        return deps | set(stage.after)
+
+    def downstream(self, names: Sequence[str]) -> Set[str]:
+        """``names`` plus every stage that transitively depends on them."""
+        result = set(names)
+        changed = True
+        while changed:
+            changed = False
+            for stage in self.stages.values():
+                if stage.name not in result and self._deps(stage) & result:
+                    result.add(stage.name)
+                    changed = True
+        return result
+
+    def _check_acyclic(self):
+        state: Dict[str, int] = {}
+
+        def visit(name: str, path: List[str]):
+            if state.get(name) == 1:
+                raise ValueError(f"Stage cycle: {' -> '.join(path + [name])}")
+            if state.get(name) == 2:
+                return
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage dependency: {name}")
+            state[name] = 1
+            for dep in self._deps(self.stages[name]):
+                visit(dep, path + [name])
+            state[name] = 2
+
+        for name in self.stages:
+            visit(name, [])
+
+    def run(
+        self,
+        initial: Optional[Artifacts] = None,
+        on_stage_done: Optional[Callable[[str, Artifacts], None]] = None,
+    ) -> PipelineResult:
+        """Execute all stages; returns the artifacts and per-stage timings.
+
+        A stage whose dependency was skipped or stopped is skipped as well. An
+        exception in a stage lets running stages finish, then re-raises.
+        ``on_stage_done(name, outputs)`` is called for every completed stage
+        that has ``checkpoint`` set.
+        """
+        artifacts: Artifacts = dict(initial or {})
+        for stage in self.stages.values():
+            missing = [
+                i
+                for i in stage.inputs
+                if i not in self.producers and i not in artifacts
+            ]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' has no source for {missing}")
+
+        timings = {name: StageTiming(name) for name in self.stages}
+        lock = threading.Lock()
+        running: Dict[Future, str] = {}
+        stopped: Optional[str] = None
+        error: Optional[BaseException] = None
+        start = time.perf_counter()
+
+        def execute(stage: Stage) -> Optional[Artifacts]:
+            timing = timings[stage.name]
+            timing.thread = threading.current_thread().name
+            timing.started = time.perf_counter()
+            with lock:
+                inputs = {k: artifacts[k] for k in stage.inputs}
+            try:
+                return stage.run(inputs)
+            finally:
+                timing.finished = time.perf_counter()
+
+        def settle(name: str) -> Optional[bool]:
+            """True if ``name`` can run, False if it can never run, None to wait."""
+            for dep in self._deps(self.stages[name]):
+                status = timings[dep].status
+                if status in ("skipped", "stopped", "failed"):
+                    return False
+                if status not in ("done", "restored"):
+                    return None
+            return True
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="stage"
+        ) as pool:
+            while True:
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for name, stage in self.stages.items():
+                        if timings[name].status != "pending":
+                            continue
+                        ready = settle(name)
+                        if ready is None:
+                            continue
+                        progressed = True
+                        if (
+                            ready
+                            and stage.checkpoint
+                            and stage.outputs
+                            and all(o in artifacts for o in stage.outputs)
+                        ):
+                            timings[name].status = "restored"
+                            continue
+                        if (
+                            not ready
+                            or stopped is not None
+                            or error is not None
+                            or (stage.when is not None and not stage.when(artifacts))
+                        ):
+                            timings[name].status = "skipped"
+                            continue
+                        timings[name].status = "running"
+                        running[pool.submit(execute, stage)] = name
+
+                if not running:
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    exc = future.exception()
+                    if isinstance(exc, PipelineStop):
+                        timings[name].status = "stopped"
+                        stopped = stopped or str(exc)
+                        logger.info(f"Pipeline stopped by '{name}': {exc}")
+                    elif exc is not None:
+                        timings[name].status = "failed"
+                        error = error or exc
+                        logger.error(f"Stage '{name}' failed: {exc!r}")
+                    else:
+                        outputs = future.result() or {}
+                        unexpected = set(outputs) - set(self.stages[name].outputs)
+                        if unexpected:
+                            raise ValueError(
+                                f"Stage '{name}' returned undeclared outputs "
+                                f"{unexpected}"
+                            )
+                        with lock:
+                            artifacts.update(outputs)
+                        timings[name].status = "done"
+                        if on_stage_done is not None and self.stages[name].checkpoint:
+                            on_stage_done(name, outputs)
+                        logger.info(
+                            f"Stage '{name}' done in {timings[name].duration:.2f}s"
+                        )
+
+        result = PipelineResult(
+            artifacts=artifacts,
+            timings=list(timings.values()),
+            wall_time=time.perf_counter() - start,
+            stopped=stopped,
+            skipped=[n for n, t in timings.items() if t.status == "skipped"],
+        )
+        if error is not None:
+            raise error
+        return result
+
+
+def timing_table(result: PipelineResult) -> Table:
+    """Rich table of stage timings relative to the pipeline start."""
+    started = [t.started for t in result.timings if t.started]
+    origin = min(started) if started else 0.0
+    table = Table(title="⏱️ Stage Timings")
+    table.add_column("Stage")
+    table.add_column("Status")
+    table.add_column("Start (s)", justify="right")
+    table.add_column("Duration (s)", justify="right")
+    for t in sorted(result.timings, key=lambda t: (t.started == 0, t.started)):
+        table.add_row(
+            t.name,
+            t.status,
+            f"{t.started - origin:.2f}" if t.started else "-",
+            f"{t.duration:.2f}" if t.started else "-",
+        )
+    busy = sum(t.duration for t in result.timings)
+    table.caption = (
+        f"Wall time {result.wall_time:.2f}s, stage time {busy:.2f}s "
+        f"(overlap saved {max(0.0, busy - result.wall_time):.2f}s)"
+    )
+    return table
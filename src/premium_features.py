@@ -4,11 +4,11 @@ Implements high-value features to justify premium cost target.
 """
 
 import logging
-from typing import Dict
+from typing import Any, Dict, List, Optional
 
 from rich.console import Console
 
-from .llm import complete
+from .llm import DEFAULT_CONCURRENCY, complete, complete_many
 
 logger = logging.getLogger(__name__)
 console = Console()
@@ -26,12 +26,12 @@ class PremiumQualityEngine:
         """Check if premium features should be enabled."""
         return self.budget_config.get("premium_quality_mode", False)
 
-    def multi_pass_code_review(
+    def _multi_pass_code_review_request(
         self, code_patch: str, model: str, max_tokens: int
-    ) -> str:
-        """Perform multi-pass code review for premium quality."""
+    ) -> Optional[Dict[str, Any]]:
+        """Build the multi-pass code review request, or None when disabled."""
         if not self.policy_config.get("multi_pass_code_review", False):
-            return ""
+            return None
 
         console.print("[bold yellow]🔍 Premium Multi-Pass Code Review[/bold yellow]")
 
@@ -81,23 +81,35 @@ AUSGABE (Markdown):
 
 Bewerte kritisch wie ein Senior-Entwickler."""
 
+        return {
+            "model": model,
+            "system": "Du bist ein Senior Code Reviewer.",
+            "prompt": review_prompt,
+            "max_tokens": max_tokens // 2,
+        }
+
+    def multi_pass_code_review(
+        self, code_patch: str, model: str, max_tokens: int
+    ) -> str:
+        """Perform multi-pass code review for premium quality."""
+        request = self._multi_pass_code_review_request(code_patch, model, max_tokens)
+        if request is None:
+            return ""
+
         try:
-            review_result = complete(
-                model,
-                "Du bist ein Senior Code Reviewer.",
-                review_prompt,
-                max_tokens=max_tokens // 2,
-            )
+            result = complete(**request).text
             logger.info("Multi-pass code review completed")
-            return review_result
+            return result
         except Exception as e:
             logger.error(f"Multi-pass code review failed: {e}")
             return ""
 
-    def deep_security_analysis(self, context: str, model: str, max_tokens: int) -> str:
-        """Perform deep security analysis for premium quality."""
+    def _deep_security_analysis_request(
+        self, context: str, model: str, max_tokens: int
+    ) -> Optional[Dict[str, Any]]:
+        """Build the deep security analysis request, or None when disabled."""
         if not self.budget_config.get("enable_security_deep_scan", False):
-            return ""
+            return None
 
         console.print("[bold red]🛡️ Premium Security Deep Scan[/bold red]")
 
@@ -141,25 +153,33 @@ AUSGABE:
 
 Analysiere wie ein Penetration Tester."""
 
+        return {
+            "model": model,
+            "system": "Du bist ein Senior Security Auditor.",
+            "prompt": security_prompt,
+            "max_tokens": max_tokens // 2,
+        }
+
+    def deep_security_analysis(self, context: str, model: str, max_tokens: int) -> str:
+        """Perform deep security analysis for premium quality."""
+        request = self._deep_security_analysis_request(context, model, max_tokens)
+        if request is None:
+            return ""
+
         try:
-            security_result = complete(
-                model,
-                "Du bist ein Senior Security Auditor.",
-                security_prompt,
-                max_tokens=max_tokens // 2,
-            )
+            result = complete(**request).text
             logger.info("Deep security analysis completed")
-            return security_result
+            return result
         except Exception as e:
             logger.error(f"Deep security analysis failed: {e}")
             return ""
 
-    def performance_profiling(
+    def _performance_profiling_request(
         self, code_patch: str, model: str, max_tokens: int
-    ) -> str:
-        """Perform performance profiling analysis."""
+    ) -> Optional[Dict[str, Any]]:
+        """Build the performance profiling request, or None when disabled."""
         if not self.budget_config.get("enable_performance_profiling", False):
-            return ""
+            return None
 
         console.print("[bold blue]⚡ Premium Performance Profiling[/bold blue]")
 
@@ -206,23 +226,35 @@ AUSGABE:
 
 Analysiere wie ein Performance-Experte."""
 
+        return {
+            "model": model,
+            "system": "Du bist ein Senior Performance Engineer.",
+            "prompt": performance_prompt,
+            "max_tokens": max_tokens // 2,
+        }
+
+    def performance_profiling(
+        self, code_patch: str, model: str, max_tokens: int
+    ) -> str:
+        """Perform performance profiling analysis."""
+        request = self._performance_profiling_request(code_patch, model, max_tokens)
+        if request is None:
+            return ""
+
         try:
-            performance_result = complete(
-                model,
-                "Du bist ein Senior Performance Engineer.",
-                performance_prompt,
-                max_tokens=max_tokens // 2,
-            )
+            result = complete(**request).text
             logger.info("Performance profiling completed")
-            return performance_result
+            return result
         except Exception as e:
             logger.error(f"Performance profiling failed: {e}")
             return ""
 
-    def architecture_validation(self, plan: str, model: str, max_tokens: int) -> str:
-        """Validate architecture decisions against enterprise patterns."""
+    def _architecture_validation_request(
+        self, plan: str, model: str, max_tokens: int
+    ) -> Optional[Dict[str, Any]]:
+        """Build the architecture validation request, or None when disabled."""
         if not self.policy_config.get("architecture_validation", False):
-            return ""
+            return None
 
         console.print("[bold cyan]🏗️ Premium Architecture Validation[/bold cyan]")
 
@@ -267,15 +299,69 @@ AUSGABE:
 
 Bewerte wie ein Enterprise Architect."""
 
+        return {
+            "model": model,
+            "system": "Du bist ein Enterprise Solution Architect.",
+            "prompt": arch_prompt,
+            "max_tokens": max_tokens // 2,
+        }
+
+    def architecture_validation(self, plan: str, model: str, max_tokens: int) -> str:
+        """Validate architecture decisions against enterprise patterns."""
+        request = self._architecture_validation_request(plan, model, max_tokens)
+        if request is None:
+            return ""
+
         try:
-            arch_result = complete(
-                model,
-                "Du bist ein Enterprise Solution Architect.",
-                arch_prompt,
-                max_tokens=max_tokens // 2,
-            )
+            result = complete(**request).text
             logger.info("Architecture validation completed")
-            return arch_result
+            return result
         except Exception as e:
             logger.error(f"Architecture validation failed: {e}")
             return ""
+
+    def run_all_passes(
+        self,
+        code_patch: str,
+        plan: str,
+        context: str,
+        model: str,
+        max_tokens: int,
+        concurrency: int = DEFAULT_CONCURRENCY,
+    ) -> Dict[str, str]:
+        """Run all enabled premium passes concurrently.
+
+        The passes are independent of each other, so they are issued together
+        and the wall-clock time is that of the slowest pass. Disabled passes
+        map to an empty string.
+        """
+        requests = {
+            "code_review": self._multi_pass_code_review_request(
+                code_patch, model, max_tokens
+            ),
+            "security": self._deep_security_analysis_request(
+                context, model, max_tokens
+            ),
+            "performance": self._performance_profiling_request(
+                code_patch, model, max_tokens
+            ),
+            "architecture": self._architecture_validation_request(
+                plan, model, max_tokens
+            ),
+        }
+        enabled: List[str] = [name for name, req in requests.items() if req]
+        results = {name: "" for name in requests}
+        if not enabled:
+            return results
+
+        try:
+            outputs = complete_many([requests[n] for n in enabled], concurrency)
+        except Exception as e:
+            logger.error(f"Premium passes failed: {e}")
+            return results
+
+        # Failed passes come back as None and keep their empty result
+        completed = {n: out for n, out in zip(enabled, outputs) if out is not None}
+        results.update((name, out.text) for name, out in completed.items())
+        logger.info(f"Premium passes completed: {', '.join(completed)}")
+        return results
@@ -0,0 +1,308 @@
+"""
+Stage Prompt Builders with Prompt-Cache Breakpoints
+Lays out every stage prompt as a stable, cacheable prefix followed by the task.
+
+Anthropic caches the prompt prefix (system, then messages) up to each block
+marked with ``cache_control``. The large, stable parts therefore come first:
+the repository context (architect/coder) or the architect plan (tester/
+docwriter), followed by the role template. Only the stage-specific part is
+sent uncached, so retries, repair turns and stages that share a model reuse the
+prefix instead of reprocessing it.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+Blocks = List[Dict[str, Any]]
+
+
+def text_block(text: str, cache: bool = False) -> Dict[str, Any]:
+    """Build a text content block, optionally marked as a cache breakpoint."""
+    block: Dict[str, Any] = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = {"type": "ephemeral"}
+    return block
+
+
+def blocks_text(blocks: Any) -> str:
+    """Flatten a string or a list of text blocks into plain text."""
+    if isinstance(blocks, str):
+        return blocks
+    return "\n\n".join(b.get("text", "") for b in blocks)
+
+
+def _system(prefix: Optional[str], role_text: str, persona: str) -> Blocks:
+    blocks = []
+    if prefix:
+        blocks.append(text_block(prefix, cache=True))
+    blocks.append(text_block(f"{persona}\n\n{role_text}", cache=True))
+    return blocks
+
+
+def context_prefix(context_str: str, file_count: int) -> Optional[str]:
+    """Repository context shared by the architect and coder prompts."""
+    if not context_str:
+        return None
+    return f"PROJEKT-KONTEXT ({file_count} Dateien):\n{context_str}"
+
+
+def repo_listing_context(listing: str) -> str:
+    """Path listing that replaces preloaded files in agentic context mode."""
+    return f"""=== REPOSITORY-DATEIEN ===
+Dateiinhalte sind NICHT vorgeladen. Lies gezielt nur, was du brauchst:
+read_file (mit start_line/end_line für Ausschnitte), grep für Symbole und
+Aufrufer, list_dir für Verzeichnisse. Rate keine Dateiinhalte.
+
+{listing}
+"""
+
+
+def skeleton_context_note() -> str:
+    """Explains the signature-only files of a skeleton context."""
+    return """=== HINWEIS: SKELETON-DATEIEN ===
+Dateien mit "(Skeleton)" zeigen nur Importe, Signaturen, Typen und Docstrings;
+Rümpfe sind durch ... ersetzt. Nutze sie als API-Referenz und erzeuge Patches
+nur für Dateien, deren vollständiger Inhalt vorliegt.
+
+"""
+
+
+def plan_prefix(plan: str) -> str:
+    """Architect plan shared by the tester and docwriter prompts."""
+    return f"ARCHITECT PLAN:\n{plan}"
+
+
+def parse_plan_flags(plan: str, default_complexity: str) -> Tuple[bool, str]:
+    """Read the allowDeps and complexity flags from an architect plan."""
+    allow_deps = "allowDeps: true" in plan or "allowDeps=true" in plan
+
+    plan_complexity = default_complexity
+    if "complexity:" in plan.lower():
+        complexity_match = re.search(r'complexity["\s]*:?["\s]*(\w+)', plan.lower())
+        if complexity_match:
+            plan_complexity = complexity_match.group(1)
+
+    return allow_deps, plan_complexity
+
+
+def parse_qa_verdict(test_feedback: str) -> Tuple[bool, bool]:
+    """Return ``(qa_passed, has_critical_issues)`` for a tester assessment."""
+    qa_passed = "PASS" in test_feedback or "OK" in test_feedback
+    has_critical_issues = "P1" in test_feedback and "Critical" in test_feedback
+    return qa_passed, has_critical_issues
+
+
+def build_architect_prompt(
+    role_text: str,
+    goal: str,
+    complexity: str,
+    target_cost: float,
+    context_str: str,
+    file_count: int,
+    decompose: bool = False,
+) -> Tuple[Blocks, Blocks]:
+    persona = (
+        "Du bist ein Senior Software Architect. Nutze deine Expertise für "
+        f"enterprise-grade Lösungen. Aufgabenkomplexität: {complexity.upper()}"
+    )
+    system = _system(context_prefix(context_str, file_count), role_text, persona)
+    context_note = (
+        "siehe PROJEKT-KONTEXT"
+        if context_str
+        else "(keine zusätzlichen Kontext-Dateien)"
+    )
+    quality = (
+        "Übertreffe Claude 4 Sonnet Max durch technische Tiefe und "
+        "Production-Readiness."
+    )
+
+    prompt = f"""AUFGABE:
+{goal}
+
+KOMPLEXITÄT: {complexity.upper()}
+GESCHÄTZTE KOSTEN: {target_cost:.3f}€
+
+KONTEXT-DATEIEN: {context_note}
+
+QUALITÄTS-ANFORDERUNG: {quality}
+"""
+    if decompose:
+        prompt += """
+TEIL-AUFGABEN (optional): Lässt sich die Umsetzung in unabhängige Teile mit
+DISJUNKTEN Dateimengen zerlegen, hänge am Ende des Plans an (sonst weglassen):
+***BEGIN_SUBTASKS***
+- id: kurzer-name
+  task: Was genau in diesen Dateien umzusetzen ist
+  files: [pfad/datei.ext]
+***END_SUBTASKS***
+Jede Datei darf nur in EINER Teil-Aufgabe vorkommen; die Teile werden parallel
+implementiert und dürfen nicht voneinander abhängen.
+"""
+    return system, [text_block(prompt)]
+
+
+def build_coder_prompt(
+    role_text: str,
+    plan: str,
+    complexity: str,
+    daily_warning: bool,
+    allow_deps: bool,
+    target_cost: float,
+    context_str: str,
+    file_count: int,
+    context_cached: bool,
+    subtask: Optional[str] = None,
+) -> Tuple[Blocks, Blocks]:
+    persona = (
+        "Du bist ein Senior Full-Stack Developer. Implementiere production-ready "
+        f"Code der Claude 4 Sonnet Max übertrifft. Komplexität: {complexity.upper()}"
+    )
+    system = _system(context_prefix(context_str, file_count), role_text, persona)
+
+    prompt = f"""ARCHITECT PLAN:
+{plan}
+
+IMPLEMENTATION CONTEXT:
+- Komplexität: {complexity.upper()}
+- Budget-Bewusst: {daily_warning}
+- allowDeps: {str(allow_deps).lower()}
+- Quality-Gate: Enterprise Production Standards
+
+PROJEKT-KONTEXT: {"siehe oben" if context_str else "(Verwende Best-Practice-Standards)"}
+
+CACHE-INFO: {'Cached context reused' if context_cached else 'Fresh context collected'}
+
+PREMIUM QUALITÄTS-ZIEL: Übertreffe Claude 4 Sonnet Max durch:
+- Enterprise-Grade Architecture
+- Production-Ready Implementation
+- Comprehensive Security Analysis
+- Performance-Optimized Solutions
+- Detailed Documentation
+- Multi-Pass Quality Validation
+
+COST-TARGET: {target_cost:.3f}€ pro Task (Premium-Service-Level)"""
+    if subtask:
+        prompt += f"""
+
+DEIN TEIL-AUFTRAG (andere Teile werden parallel umgesetzt):
+{subtask}
+Implementiere NUR diesen Teil und ändere ausschließlich die genannten Dateien."""
+    return system, [text_block(prompt)]
+
+
+def build_patch_repair_prompt(
+    error: str, hunk: str, turn: int, max_turns: int, edit_blocks: bool = False
+) -> Blocks:
+    """Follow-up turn asking the coder to fix a patch that does not apply."""
+    prompt = f"""PATCH NICHT ANWENDBAR (Versuch {turn}/{max_turns}):
+{error}
+"""
+    if hunk:
+        prompt += f"""
+BETROFFENER ABSCHNITT:
+{hunk}
+"""
+    if edit_blocks:
+        prompt += """
+Korrigiere die Edit-Blöcke gegen den aktuellen Stand der Dateien im
+PROJEKT-KONTEXT: Jeder SEARCH-Abschnitt muss exakt und eindeutig in der Datei
+vorkommen. Gib ALLE Edit-Blöcke (auch die unveränderten) zwischen
+***BEGIN_EDITS*** und ***END_EDITS*** aus, ohne weitere Erklärungen."""
+    else:
+        prompt += """
+Korrigiere den Patch gegen den aktuellen Stand der Dateien im PROJEKT-KONTEXT:
+Kontextzeilen müssen exakt übereinstimmen, Zeilennummern und Zeilenanzahl in
+den @@-Headern müssen stimmen. Gib den VOLLSTÄNDIGEN korrigierten Patch zwischen
+***BEGIN_PATCH*** und ***END_PATCH*** aus, ohne weitere Erklärungen."""
+    return [text_block(prompt)]
+
+
+def build_check_fix_prompt(
+    output: str,
+    commands: List[str],
+    turn: int,
+    max_turns: int,
+    earlier: List[str],
+    edit_blocks: bool = False,
+) -> Blocks:
+    """Follow-up turn asking the coder to fix failing local checks."""
+    prompt = f"""LOKALE CHECKS FEHLGESCHLAGEN (Fix-Versuch {turn}/{max_turns}):
+Befehle: {", ".join(commands)}
+
+AUSGABE (gekürzt):
+{output}
+"""
+    if earlier:
+        prompt += "\nBISHERIGE FIX-VERSUCHE (zusammengefasst):\n"
+        prompt += "\n".join(f"- {line}" for line in earlier) + "\n"
+    if edit_blocks:
+        prompt += """
+Der bisherige Patch ist bereits angewendet. Behebe die Fehler mit Edit-Blöcken
+gegen den AKTUELLEN Dateistand zwischen ***BEGIN_EDITS*** und ***END_EDITS***,
+ohne weitere Erklärungen."""
+    else:
+        prompt += """
+Der bisherige Patch ist bereits angewendet. Gib einen INKREMENTELLEN Patch gegen
+den AKTUELLEN Dateistand zwischen ***BEGIN_PATCH*** und ***END_PATCH*** aus,
+ohne weitere Erklärungen."""
+    return [text_block(prompt)]
+
+
+def build_tester_prompt(
+    role_text: str,
+    plan: str,
+    patch: str,
+    complexity: str,
+    security_focus: bool,
+    performance_critical: bool,
+) -> Tuple[Blocks, Blocks]:
+    persona = (
+        "Du bist ein Senior QA Engineer & Security Auditor. Führe comprehensive "
+        f"Quality Audit durch. Komplexität: {complexity.upper()}"
+    )
+    system = _system(plan_prefix(plan), role_text, persona)
+
+    prompt = f"""IMPLEMENTED CODE PREVIEW:
+{patch[:1000]}{'...' if len(patch) > 1000 else ''}
+
+TEST CONTEXT:
+- Komplexität: {complexity.upper()}
+- Security Focus: {'High' if security_focus else 'Standard'}
+- Performance Critical: {'Yes' if performance_critical else 'Standard'}
+
+QUALITÄTS-STANDARD: Übertreffe Claude 4 Sonnet Max durch systematische Tiefe.
+"""
+    return system, [text_block(prompt)]
+
+
+def build_docwriter_prompt(
+    role_text: str,
+    plan: str,
+    goal: str,
+    complexity: str,
+    target_cost: float,
+    patch: str,
+    test_feedback: str,
+    ok_local: bool,
+) -> Tuple[Blocks, Blocks]:
+    persona = (
+        "Du bist ein Senior Technical Writer & Documentation Architect. Erstelle "
+        f"enterprise-grade Dokumentation. Komplexität: {complexity.upper()}"
+    )
+    system = _system(plan_prefix(plan), role_text, persona)
+
+    prompt = f"""DOKUMENTATIONS-KONTEXT:
+- Aufgabe: {goal}
+- Komplexität: {complexity.upper()}
+- Geschätzte Kosten: {target_cost:.3f}€
+- Implementierte Änderungen: {len(patch.splitlines())} Zeilen
+
+QA ASSESSMENT:
+{test_feedback}
+
+LOKALE TESTS:
+Status: {'✅ PASSED' if ok_local else '❌ FAILED'}
+
+QUALITÄTS-STANDARD: Übertreffe Claude 4 Sonnet Max durch technische Präzision.
+"""
+    return system, [text_block(prompt)]
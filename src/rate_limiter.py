@@ -0,0 +1,232 @@
+"""
+Cross-process Token-Bucket Rate Limiter
+Paces requests per model so parallel runs stay below the API rate limits.
+
+Bucket levels live in a small JSON state file guarded by an advisory file lock,
+so every ``run_task.py`` process on the machine draws from the same budget. The
+buckets are corrected from the ``anthropic-ratelimit-*`` and ``retry-after``
+response headers, which also teaches the limiter the real limits of models that
+are not configured.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Never sleep longer than this in one go; the state is re-read afterwards
+MAX_WAIT_SLICE_S = 5.0
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Parse an RFC 3339 reset timestamp into epoch seconds."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Read the ``retry-after`` header (seconds) of a response, if present."""
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class RateLimiter:
+    """Requests/min and tokens/min buckets per model, shared across processes."""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, int]]] = None,
+        state_file: str = ".ai_agents_cache/ratelimit.json",
+    ):
+        self.limits = limits or {}
+        self.state_path = Path(state_file)
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock_path = self.state_path.with_suffix(".lock")
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _locked_state(self):
+        """Load the shared state under an exclusive lock and save it on exit."""
+        with self._thread_lock:
+            with open(self.lock_path, "a+") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    state = self._load_state()
+                    yield state
+                    self._save_state(state)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _load_state(self) -> Dict[str, Any]:
+        if not self.state_path.exists():
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {}
+
+    def _save_state(self, state: Dict[str, Any]):
+        tmp = self.state_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def _bucket(self, state: Dict[str, Any], model: str, now: float) -> Dict:
+        """Return the model's bucket, refilled up to ``now``."""
+        configured = self.limits.get(model, {})
+        bucket = state.setdefault(
+            model,
+            {
+                "rpm": configured.get("requests_per_minute"),
+                "tpm": configured.get("tokens_per_minute"),
+                "requests": configured.get("requests_per_minute"),
+                "tokens": configured.get("tokens_per_minute"),
+                "blocked_until": 0.0,
+                "updated": now,
+            },
+        )
+        # Configured limits win over limits learned from headers
+        bucket["rpm"] = configured.get("requests_per_minute", bucket["rpm"])
+        bucket["tpm"] = configured.get("tokens_per_minute", bucket["tpm"])
+
+        elapsed = max(0.0, now - bucket["updated"])
+        for level, limit in (("requests", "rpm"), ("tokens", "tpm")):
+            if bucket[limit]:
+                current = bucket[level] if bucket[level] is not None else bucket[limit]
+                bucket[level] = min(
+                    bucket[limit], current + elapsed * bucket[limit] / 60.0
+                )
+        bucket["updated"] = now
+        return bucket
+
+    def _try_acquire(self, model: str, tokens: int) -> float:
+        """Take capacity if available. Returns 0 on success or the wait time."""
+        with self._locked_state() as state:
+            now = time.time()
+            bucket = self._bucket(state, model, now)
+
+            wait = bucket["blocked_until"] - now
+            if bucket["rpm"] and bucket["requests"] < 1:
+                wait = max(wait, (1 - bucket["requests"]) * 60.0 / bucket["rpm"])
+            if bucket["tpm"]:
+                needed = min(tokens, bucket["tpm"])
+                if bucket["tokens"] < needed:
+                    wait = max(wait, (needed - bucket["tokens"]) * 60.0 / bucket["tpm"])
+            if wait > 0:
+                return wait
+
+            if bucket["rpm"]:
+                bucket["requests"] -= 1
+            if bucket["tpm"]:
+                bucket["tokens"] -= tokens
+            return 0.0
+
+    def acquire(self, model: str, tokens: int) -> float:
+        """Block until a request of ``tokens`` tokens may be sent.
+
+        Returns the total time spent waiting.
+        """
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(model, tokens)
+            if wait <= 0:
+                break
+            if waited == 0:
+                logger.info(f"Pacing {model}: waiting {wait:.1f}s for rate limit")
+            wait = min(wait, MAX_WAIT_SLICE_S)
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+    async def aacquire(self, model: str, tokens: int) -> float:
+        """Async variant of :meth:`acquire`."""
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(model, tokens)
+            if wait <= 0:
+                break
+            if waited == 0:
+                logger.info(f"Pacing {model}: waiting {wait:.1f}s for rate limit")
+            wait = min(wait, MAX_WAIT_SLICE_S)
+            await asyncio.sleep(wait)
+            waited += wait
+        return waited
+
+    def record_usage(self, model: str, estimated: int, actual: int):
+        """Charge the difference between the reserved and the real token count."""
+        if actual == estimated:
+            return
+        with self._locked_state() as state:
+            bucket = self._bucket(state, model, time.time())
+            if bucket["tpm"]:
+                bucket["tokens"] -= actual - estimated
+
+    def update_from_headers(self, model: str, headers: Optional[Mapping[str, str]]):
+        """Sync the bucket with the server's view of the remaining capacity."""
+        if not headers:
+            return
+
+        def _int(name: str) -> Optional[int]:
+            try:
+                return int(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+
+        with self._locked_state() as state:
+            now = time.time()
+            bucket = self._bucket(state, model, now)
+            configured = self.limits.get(model, {})
+
+            for kind, level, limit in (
+                ("requests", "requests", "rpm"),
+                ("tokens", "tokens", "tpm"),
+            ):
+                prefix = f"anthropic-ratelimit-{kind}"
+                server_limit = _int(f"{prefix}-limit")
+                remaining = _int(f"{prefix}-remaining")
+                if server_limit and not configured.get(
+                    "requests_per_minute" if kind == "requests" else "tokens_per_minute"
+                ):
+                    bucket[limit] = server_limit
+                if remaining is not None:
+                    current = bucket[level] if bucket[level] is not None else remaining
+                    bucket[level] = min(current, remaining)
+                    if remaining <= 0:
+                        reset = _parse_reset(headers.get(f"{prefix}-reset"))
+                        if reset:
+                            bucket["blocked_until"] = max(
+                                bucket["blocked_until"], reset
+                            )
+
+            retry_after = retry_after_seconds(headers)
+            if retry_after is not None:
+                bucket["blocked_until"] = max(
+                    bucket["blocked_until"], now + retry_after
+                )
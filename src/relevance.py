@@ -0,0 +1,228 @@
+"""
+BM25 Relevance Index for Context Selection
+Ranks candidate context files so the file limit keeps the relevant ones.
+
+Every text file of the repository is tokenized into identifier parts
+(``getUserName`` → ``get user name getusername``) plus its path components,
+which count ``PATH_BOOST`` times. Term frequencies are stored per file under
+``.ai_agents_cache/bm25/`` together with the file's git blob id; a run only
+re-reads files whose blob id (from the git index, or hashed after a stat
+change outside git) differs from the stored one. The inverted postings are
+built in memory on load.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .git_index import GitFileIndex
+from .repo_walk import RepoWalker
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = ".ai_agents_cache/bm25"
+
+K1 = 1.2
+B = 0.75
+PATH_BOOST = 3
+MAX_INDEX_BYTES = 200000
+
+_WORD = re.compile(r"[A-Za-zÄÖÜäöüß][A-Za-z0-9ÄÖÜäöüß]*")
+_PARTS = re.compile(r"[A-ZÄÖÜ]+(?=[A-ZÄÖÜ][a-zäöüß])|[A-ZÄÖÜ]?[a-zäöüß]+|[A-ZÄÖÜ]+|\d+")
+
+STOPWORDS = {
+    # English
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "not",
+    "but", "can", "all", "any", "into", "when", "then", "else", "return",
+    "add", "use", "new", "make", "should",
+    # German (goals are often written in German)
+    "der", "die", "das", "und", "ein", "eine", "einen", "mit", "für", "auf",
+    "den", "dem", "des", "ist", "nicht", "von", "zu", "im", "in", "bei", "soll",
+}  # fmt: skip
+
+
+def _normalize(token: str) -> Optional[str]:
+    token = token.lower()
+    if len(token) < 2 or token in STOPWORDS or token.isdigit():
+        return None
+    # Cheap plural folding so "users" matches "user"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Identifier-aware tokens: camelCase/snake_case parts plus the whole word."""
+    tokens: List[str] = []
+    for word in _WORD.findall(text):
+        parts = _PARTS.findall(word)
+        for piece in parts + ([word] if len(parts) > 1 else []):
+            token = _normalize(piece)
+            if token:
+                tokens.append(token)
+    return tokens
+
+
+def path_tokens(path: str) -> List[str]:
+    return tokenize(re.sub(r"[/._\-+]", " ", path))
+
+
+def blob_id(data: bytes) -> str:
+    """Git's blob id of ``data``, so hashes agree with the git index."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+@dataclass
+class DocStats:
+    hash: str
+    stat: str
+    length: int
+    tf: Dict[str, int] = field(default_factory=dict)
+
+
+class RelevanceIndex:
+    """Persistent BM25 index over the text files of one repository."""
+
+    def __init__(
+        self,
+        repo_path: str,
+        extensions: Set[str],
+        index_dir: str = DEFAULT_INDEX_DIR,
+    ):
+        self.repo_path = os.path.realpath(repo_path)
+        self.extensions = extensions
+        digest = hashlib.sha256(self.repo_path.encode("utf-8")).hexdigest()[:16]
+        self.state_file = Path(index_dir) / f"{digest}.json"
+        self.docs: Dict[str, DocStats] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.docs = {p: DocStats(**d) for p, d in data.get("docs", {}).items()}
+        except (OSError, json.JSONDecodeError, TypeError):
+            self.docs = {}
+
+    def _save(self):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "docs": {
+                p: {"hash": d.hash, "stat": d.stat, "length": d.length, "tf": d.tf}
+                for p, d in self.docs.items()
+            }
+        }
+        fd, tmp = tempfile.mkstemp(dir=self.state_file.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.state_file)
+
+    def _files(self) -> Tuple[List[str], Optional[GitFileIndex]]:
+        def accept(rel: str) -> bool:
+            return os.path.splitext(rel)[1] in self.extensions
+
+        walker = RepoWalker(self.repo_path)
+        index = GitFileIndex.open(self.repo_path)
+        if index is not None:
+            return walker.filter(index.paths(), accept=accept), index
+        return walker.walk(accept=accept), None
+
+    def _index_file(self, rel: str, stat: str, known_hash: Optional[str]) -> bool:
+        """(Re)index one file; False if it cannot be read."""
+        try:
+            data = (Path(self.repo_path) / rel).read_bytes()
+        except OSError:
+            return False
+        digest = known_hash or blob_id(data)
+        old = self.docs.get(rel)
+        if old is not None and old.hash == digest:
+            old.stat = stat
+            return True
+        text = data[:MAX_INDEX_BYTES].decode("utf-8", errors="ignore")
+        tf = Counter(tokenize(text))
+        for token in path_tokens(rel):
+            tf[token] += PATH_BOOST
+        self.docs[rel] = DocStats(digest, stat, sum(tf.values()), dict(tf))
+        return True
+
+    def update(self):
+        """Re-index new and changed files; drop deleted ones."""
+        files, index = self._files()
+        changed = 0
+        for rel in files:
+            blob = index.blob(rel) if index is not None else None
+            doc = self.docs.get(rel)
+            if blob is not None and doc is not None and doc.hash == blob:
+                continue
+            try:
+                st = os.stat(os.path.join(self.repo_path, rel))
+            except OSError:
+                continue
+            stat = f"{st.st_mtime_ns}:{st.st_size}"
+            if blob is None and doc is not None and doc.stat == stat:
+                continue
+            if self._index_file(rel, stat, blob):
+                changed += 1
+        present = set(files)
+        removed = [p for p in self.docs if p not in present]
+        for rel in removed:
+            del self.docs[rel]
+        if changed or removed:
+            logger.info(
+                f"BM25 index: {changed} files (re)indexed, {len(removed)} removed, "
+                f"{len(self.docs)} total"
+            )
+            self._save()
+        self.postings = {}
+        for rel, doc in self.docs.items():
+            for term, count in doc.tf.items():
+                self.postings.setdefault(term, {})[rel] = count
+
+    def score(self, query: str, candidates: Iterable[str]) -> Dict[str, float]:
+        """BM25 score of each candidate for ``query``."""
+        terms = set(tokenize(query))
+        n = len(self.docs)
+        if not n or not terms:
+            return {c: 0.0 for c in candidates}
+        avgdl = sum(d.length for d in self.docs.values()) / n
+        scores: Dict[str, float] = {}
+        for rel in candidates:
+            doc = self.docs.get(rel)
+            total = 0.0
+            if doc is not None:
+                norm = K1 * (1 - B + B * doc.length / max(avgdl, 1e-9))
+                for term in terms:
+                    tf = doc.tf.get(term, 0)
+                    if not tf:
+                        continue
+                    df = len(self.postings.get(term, ()))
+                    idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                    total += idf * tf * (K1 + 1) / (tf + norm)
+            scores[rel] = total
+        return scores
+
+    def select(self, query: str, candidates: List[str], k: int) -> List[str]:
+        """The ``k`` best candidates, most relevant first (ties in path order)."""
+        scores = self.score(query, candidates)
+        ranked = sorted(candidates, key=lambda rel: (-scores[rel], rel))
+        for rel in ranked[:k]:
+            logger.info(f"BM25 {scores[rel]:.2f} {rel}")
+        return ranked[:k]
+
+
+def rank_files(
+    repo_path: str, query: str, candidates: List[str], k: int, extensions: Set[str]
+) -> List[str]:
+    """Select the ``k`` candidates most relevant to ``query``."""
+    index = RelevanceIndex(repo_path, extensions)
+    index.update()
+    return index.select(query, candidates, k)
@@ -0,0 +1,181 @@
+"""
+Repository Tools for Lazy (Agentic) Context Loading
+Serves read_file, grep and list_dir tool calls from REPO_PATH instead of preloading.
+
+The architect and coder only receive a compact path listing up front and fetch
+file contents through tool calls when they need them. Tool results are cached
+per run, so the coder re-reading what the architect already read costs no I/O.
+"""
+
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .context import ALLOW_EXT, read_small_file
+from .repo_walk import RepoWalker
+
+logger = logging.getLogger(__name__)
+
+MAX_LISTING_ENTRIES = 500
+MAX_GREP_RESULTS = 50
+MAX_READ_LINES = 400
+
+TOOLS: List[Dict[str, Any]] = [
+    {
+        "name": "read_file",
+        "description": (
+            "Read a text file of the repository. Returns numbered lines; "
+            f"at most {MAX_READ_LINES} lines per call, use start_line to page."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string", "description": "Repository-relative path"},
+                "start_line": {"type": "integer", "minimum": 1},
+                "end_line": {"type": "integer", "minimum": 1},
+            },
+            "required": ["path"],
+        },
+    },
+    {
+        "name": "grep",
+        "description": (
+            "Search repository files with a Python regular expression. "
+            "Returns matching lines as path:line: text."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "pattern": {"type": "string"},
+                "path": {
+                    "type": "string",
+                    "description": (
+                        "Directory or file to search (default: repository root)"
+                    ),
+                },
+            },
+            "required": ["pattern"],
+        },
+    },
+    {
+        "name": "list_dir",
+        "description": "List files and subdirectories of a repository directory.",
+        "input_schema": {
+            "type": "object",
+            "properties": {"path": {"type": "string"}},
+            "required": ["path"],
+        },
+    },
+]
+
+
+def _text_files(walker: RepoWalker, start: str = "") -> List[str]:
+    """Sorted, non-ignored text files below ``start``."""
+    return walker.walk(start, accept=lambda rel: Path(rel).suffix in ALLOW_EXT)
+
+
+def path_listing(repo_path: str, max_entries: int = MAX_LISTING_ENTRIES) -> str:
+    """Compact listing of the repository's text files, grouped by directory."""
+    files = _text_files(RepoWalker(repo_path))
+    groups: Dict[str, List[str]] = {}
+    for rel in files[:max_entries]:
+        parent, _, name = rel.rpartition("/")
+        groups.setdefault(parent or ".", []).append(name)
+    lines = [f"{d}/: {' '.join(names)}" for d, names in groups.items()]
+    if len(files) > max_entries:
+        lines.append(f"... ({len(files) - max_entries} more files not listed)")
+    return "\n".join(lines)
+
+
+class RepoTools:
+    """Executes repository tool calls with a per-run result cache."""
+
+    def __init__(self, repo_path: str):
+        self.root = Path(repo_path).resolve()
+        self.walker = RepoWalker(repo_path)
+        self._cache: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.cache_hits = 0
+
+    def clear(self):
+        """Forget cached results, e.g. after a patch changed the files."""
+        with self._lock:
+            self._cache.clear()
+
+    def _resolve(self, rel: Optional[str]) -> Path:
+        target = (self.root / (rel or ".").lstrip("/")).resolve()
+        if target != self.root and self.root not in target.parents:
+            raise ValueError(f"path outside the repository: {rel}")
+        if ".git" in target.relative_to(self.root).parts:
+            raise ValueError(f"path inside .git: {rel}")
+        return target
+
+    def run(self, name: str, tool_input: Dict[str, Any]) -> str:
+        """Result text of one tool call; errors are returned as text for the model."""
+        key = json.dumps([name, tool_input], sort_keys=True)
+        with self._lock:
+            self.calls += 1
+            if key in self._cache:
+                self.cache_hits += 1
+                return self._cache[key]
+        try:
+            handler = getattr(self, f"_tool_{name}", None)
+            if handler is None:
+                raise ValueError(f"unknown tool: {name}")
+            result = handler(**tool_input)
+        except (OSError, ValueError, TypeError, re.error) as e:
+            result = f"ERROR: {e}"
+        logger.info(f"Tool {name}({tool_input}) -> {len(result)} chars")
+        with self._lock:
+            self._cache[key] = result
+        return result
+
+    def _tool_read_file(
+        self, path: str, start_line: int = 1, end_line: Optional[int] = None
+    ) -> str:
+        target = self._resolve(path)
+        if not target.is_file():
+            raise ValueError(f"no such file: {path}")
+        lines = read_small_file(target).splitlines()
+        start = max(1, start_line)
+        end = min(len(lines), end_line or len(lines), start + MAX_READ_LINES - 1)
+        body = "\n".join(f"{i:>5}  {lines[i - 1]}" for i in range(start, end + 1))
+        more = f"\n... ({len(lines) - end} more lines)" if end < len(lines) else ""
+        return f"=== {path} (lines {start}-{end} of {len(lines)}) ===\n{body}{more}"
+
+    def _tool_grep(self, pattern: str, path: str = ".") -> str:
+        regex = re.compile(pattern)
+        target = self._resolve(path)
+        if target.is_file():
+            files = [target.relative_to(self.root).as_posix()]
+        else:
+            files = _text_files(self.walker, target.relative_to(self.root).as_posix())
+        hits: List[str] = []
+        for rel in files:
+            try:
+                text = read_small_file(self.root / rel)
+            except OSError:
+                continue
+            for lineno, line in enumerate(text.splitlines(), 1):
+                if regex.search(line):
+                    hits.append(f"{rel}:{lineno}: {line.strip()[:200]}")
+                    if len(hits) >= MAX_GREP_RESULTS:
+                        hits.append(f"... (stopped at {MAX_GREP_RESULTS} matches)")
+                        return "\n".join(hits)
+        return "\n".join(hits) or "no matches"
+
+    def _tool_list_dir(self, path: str = ".") -> str:
+        target = self._resolve(path)
+        if not target.is_dir():
+            raise ValueError(f"no such directory: {path}")
+        entries = []
+        for child in sorted(target.iterdir()):
+            rel = child.relative_to(self.root).as_posix()
+            if self.walker.is_ignored(rel, child.is_dir()):
+                continue
+            entries.append(child.name + ("/" if child.is_dir() else ""))
+        return "\n".join(entries) or "(empty)"
@@ -0,0 +1,290 @@
+"""
+Single-Pass, Ignore-Aware Repository Walker
+Enumerates repository files with one os.scandir pass that prunes ignored directories.
+
+Ignore rules come from every ``.gitignore`` on the way down (scoped to its
+directory), the project-level ``.aiagentsignore`` at the repository root and a
+few built-in defaults (``.git``, ``node_modules``, build output). All file,
+directory and glob specs of a request are matched during the same walk, and
+results are returned in sorted order.
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROJECT_IGNORE_FILE = ".aiagentsignore"
+
+# Applied before any ignore file; a "!" rule in .aiagentsignore re-includes them
+DEFAULT_IGNORES = [
+    ".git/",
+    "node_modules/",
+    ".svelte-kit/",
+    "build/",
+    "dist/",
+    "coverage/",
+    "__pycache__/",
+    ".venv/",
+    "venv/",
+]
+
+_GLOB_CHARS = set("*?[")
+
+
+@lru_cache(maxsize=1024)
+def glob_regex(pattern: str) -> Pattern[str]:
+    """Compile a glob with ``**`` support; ``*`` and ``?`` never cross ``/``."""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1 : end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+                i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return re.compile("".join(out) + r"\Z")
+
+
+@dataclass
+class IgnoreRule:
+    regex: Pattern[str]
+    negate: bool
+    dir_only: bool
+    anchored: bool  # matched against the path below ``base``, else the name
+    base: str  # directory of the ignore file, "" for the repository root
+
+    def matches(self, rel: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel.startswith(self.base + "/"):
+                return False
+            rel = rel[len(self.base) + 1 :]
+        target = rel if self.anchored else rel.rsplit("/", 1)[-1]
+        return bool(self.regex.match(target))
+
+
+def parse_ignore_lines(lines: Iterable[str], base: str = "") -> List[IgnoreRule]:
+    """Rules of a gitignore-style file located in directory ``base``."""
+    rules = []
+    for raw in lines:
+        line = raw.rstrip("\n").rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        if line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if not line:
+            continue
+        rules.append(IgnoreRule(glob_regex(line), negate, dir_only, anchored, base))
+    return rules
+
+
+def _read_rules(path: Path, base: str) -> List[IgnoreRule]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return parse_ignore_lines(f, base)
+    except OSError:
+        return []
+
+
+class RepoWalker:
+    """Walks a repository once per request, honouring all ignore files."""
+
+    def __init__(self, repo_path: str, extra_ignores: Optional[List[str]] = None):
+        self.root = Path(repo_path).resolve()
+        self.root_rules = parse_ignore_lines(DEFAULT_IGNORES + (extra_ignores or []))
+        self.root_rules += _read_rules(self.root / PROJECT_IGNORE_FILE, "")
+        self._dir_rules: Dict[str, List[IgnoreRule]] = {}
+
+    def _rules_for(self, rel_dir: str) -> List[IgnoreRule]:
+        """Rules of the .gitignore files from the root down to ``rel_dir``."""
+        if rel_dir not in self._dir_rules:
+            parent = rel_dir.rsplit("/", 1)[0] if "/" in rel_dir else ""
+            inherited = self._rules_for(parent) if rel_dir else self.root_rules
+            path = self.root / rel_dir / ".gitignore"
+            self._dir_rules[rel_dir] = inherited + (
+                _read_rules(path, rel_dir) if path.is_file() else []
+            )
+        return self._dir_rules[rel_dir]
+
+    def is_ignored(self, rel: str, is_dir: bool) -> bool:
+        """Whether ``rel`` (a path below the root, ``/``-separated) is ignored."""
+        parent = rel.rsplit("/", 1)[0] if "/" in rel else ""
+        ignored = False
+        for rule in self._rules_for(parent):
+            if rule.negate == ignored and rule.matches(rel, is_dir):
+                ignored = not rule.negate
+        return ignored
+
+    def filter(
+        self, paths: Iterable[str], accept: Optional[Callable[[str], bool]] = None
+    ) -> List[str]:
+        """Sorted ``paths`` (e.g. from the git index) that are not ignored.
+
+        A path is dropped when it or any of its directories is ignored, which
+        mirrors what :meth:`walk` would have pruned.
+        """
+        dir_ignored: Dict[str, bool] = {"": False}
+
+        def ignored_dir(rel_dir: str) -> bool:
+            if rel_dir not in dir_ignored:
+                parent = rel_dir.rsplit("/", 1)[0] if "/" in rel_dir else ""
+                dir_ignored[rel_dir] = ignored_dir(parent) or self.is_ignored(
+                    rel_dir, True
+                )
+            return dir_ignored[rel_dir]
+
+        kept = []
+        for rel in paths:
+            parent = rel.rsplit("/", 1)[0] if "/" in rel else ""
+            if accept is not None and not accept(rel):
+                continue
+            if ignored_dir(parent) or self.is_ignored(rel, False):
+                continue
+            kept.append(rel)
+        return sorted(kept)
+
+    def walk(
+        self,
+        start: str = "",
+        accept: Optional[Callable[[str], bool]] = None,
+        descend: Optional[Callable[[str], bool]] = None,
+    ) -> List[str]:
+        """Sorted relative paths of the non-ignored files below ``start``.
+
+        ``accept(rel)`` filters files; ``descend(rel_dir)`` may prune
+        directories that cannot contain wanted files.
+        """
+        found: List[str] = []
+        start = start.strip("/")
+        stack = ["" if start == "." else start]
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                entries = list(os.scandir(self.root / rel_dir))
+            except OSError as e:
+                logger.debug(f"Skipping unreadable directory {rel_dir}: {e}")
+                continue
+            for entry in entries:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if self.is_ignored(rel, is_dir):
+                    continue
+                if is_dir:
+                    if descend is None or descend(rel):
+                        stack.append(rel)
+                elif accept is None or accept(rel):
+                    found.append(rel)
+        return sorted(found)
+
+
+def _literal_prefix(pattern: str) -> str:
+    """Directory part of a glob before its first wildcard segment."""
+    parts = []
+    for part in pattern.split("/")[:-1]:
+        if _GLOB_CHARS & set(part):
+            break
+        parts.append(part)
+    return "/".join(parts)
+
+
+def match_specs(
+    repo_path: str,
+    specs: List[str],
+    extensions: Set[str],
+    candidates: Optional[Iterable[str]] = None,
+) -> Tuple[List[str], List[str]]:
+    """Expand file, directory and glob specs in one walk.
+
+    Returns ``(explicit_files, matched_files)``: files named directly (kept
+    even if ignored, in spec order) and the sorted files found for directory
+    and glob specs. Directory specs only yield files with ``extensions``.
+    With ``candidates`` (e.g. the tracked files of the git index) the specs
+    are matched in memory instead of walking the file system.
+    """
+    root = Path(repo_path)
+    explicit: List[str] = []
+    dirs: List[str] = []
+    globs: List[Tuple[str, Pattern[str]]] = []
+    for spec in specs:
+        clean = os.path.normpath(spec.strip()).replace(os.sep, "/").lstrip("/")
+        if clean == ".":
+            clean = ""
+        if (root / clean).is_file():
+            if clean not in explicit:
+                explicit.append(clean)
+        elif (root / clean).is_dir():
+            dirs.append(clean)
+        elif _GLOB_CHARS & set(clean):
+            globs.append((_literal_prefix(clean), glob_regex(clean)))
+        else:
+            logger.warning(f"Context spec matches nothing: {spec}")
+    if not dirs and not globs:
+        return explicit, []
+
+    bases = dirs + [prefix for prefix, _ in globs]
+
+    def related(rel: str, base: str) -> bool:
+        return (
+            not base
+            or rel == base
+            or rel.startswith(base + "/")
+            or base.startswith(rel + "/")
+        )
+
+    def descend(rel_dir: str) -> bool:
+        return any(related(rel_dir, base) for base in bases)
+
+    def accept(rel: str) -> bool:
+        if any(
+            (not d or rel.startswith(d + "/"))
+            and os.path.splitext(rel)[1] in extensions
+            for d in dirs
+        ):
+            return True
+        return any(regex.match(rel) for _, regex in globs)
+
+    walker = RepoWalker(repo_path)
+    if candidates is not None:
+        matched = walker.filter(candidates, accept=accept)
+        return explicit, [f for f in matched if f not in explicit]
+    start = os.path.commonpath(bases) if all(bases) else ""
+    matched = walker.walk(start, accept=accept, descend=descend)
+    return explicit, [f for f in matched if f not in explicit]
@@ -0,0 +1,324 @@
+"""
+Structural Skeletons of Context Files
+Reduces source files to imports, signatures, exported types and docstrings.
+
+Python is parsed with ``ast``; TypeScript, JavaScript and the ``<script>``
+blocks of Svelte components go through a lightweight brace tokenizer that
+keeps class, interface and type bodies and replaces function and object
+bodies with ``{ /* ... */ }``. Skeletons are cached under
+``.ai_agents_cache/skeleton/`` by a hash of the file content, so unchanged
+files are never parsed twice.
+"""
+
+import ast
+import hashlib
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .token_estimator import parse_context_section, split_context_files
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".ai_agents_cache/skeleton"
+
+# Bump when the extractors change so cached skeletons are rebuilt
+EXTRACTOR_VERSION = 1
+
+CONTEXT_MODES = ("full", "skeleton", "auto")
+SKELETON_LABEL = " (Skeleton)"
+
+ELIDED = "..."
+MAX_STATEMENT_LINES = 3  # longer module-level statements keep their first line
+
+_memory: Dict[str, Optional[str]] = {}
+
+
+# --- Python -------------------------------------------------------------------
+
+
+def _docstring_node(body: List[ast.stmt]) -> Optional[ast.stmt]:
+    first = body[0] if body else None
+    if (
+        isinstance(first, ast.Expr)
+        and isinstance(first.value, ast.Constant)
+        and isinstance(first.value.value, str)
+    ):
+        return first
+    return None
+
+
+def _source_lines(lines: List[str], node: ast.AST) -> List[str]:
+    return lines[node.lineno - 1 : node.end_lineno]
+
+
+def _py_statement(lines: List[str], node: ast.stmt, indent: str) -> List[str]:
+    """A statement verbatim, or its first line and an elision marker."""
+    text = _source_lines(lines, node)
+    if len(text) <= MAX_STATEMENT_LINES:
+        return text
+    return [text[0], f"{indent}    {ELIDED}"]
+
+
+def _py_function(lines: List[str], node: ast.FunctionDef, indent: str) -> List[str]:
+    out = [f"{indent}@{ast.unparse(d)}" for d in node.decorator_list]
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    out.append(f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}:")
+    doc = _docstring_node(node.body)
+    if doc is not None:
+        out += _source_lines(lines, doc)
+    out.append(f"{indent}    {ELIDED}")
+    return out
+
+
+def _py_class(lines: List[str], node: ast.ClassDef, indent: str) -> List[str]:
+    out = [f"{indent}@{ast.unparse(d)}" for d in node.decorator_list]
+    bases = [ast.unparse(b) for b in node.bases]
+    bases += [ast.unparse(k) for k in node.keywords]
+    out.append(
+        f"{indent}class {node.name}" + (f"({', '.join(bases)})" if bases else "") + ":"
+    )
+    body = _py_block(lines, node.body, indent + "    ")
+    out += body or [f"{indent}    {ELIDED}"]
+    return out
+
+
+def _py_block(lines: List[str], body: List[ast.stmt], indent: str) -> List[str]:
+    out: List[str] = []
+    doc = _docstring_node(body)
+    previous = ""
+    for node in body:
+        if node is doc:
+            kind, text = "doc", _source_lines(lines, node)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            kind, text = "def", _py_function(lines, node, indent)
+        elif isinstance(node, ast.ClassDef):
+            kind, text = "def", _py_class(lines, node, indent)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            kind, text = "import", _source_lines(lines, node)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)) or not indent:
+            # Includes module-level control flow (try/except imports, __main__)
+            kind, text = "statement", _py_statement(lines, node, indent)
+        else:
+            continue
+        # Blank line between groups and around definitions
+        if out and (kind != previous or kind == "def"):
+            out.append("")
+        out += text
+        previous = kind
+    return out
+
+
+def python_skeleton(source: str) -> Optional[str]:
+    """Skeleton of a Python module; None if it does not parse."""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    return "\n".join(_py_block(source.splitlines(), tree.body, "")) + "\n"
+
+
+# --- TypeScript / JavaScript --------------------------------------------------
+
+_CONTAINER = re.compile(r"\b(class|namespace|module)\b")
+_TYPE_BLOCK = re.compile(r"\b(interface|enum)\b|\btype\s+\w+.*=\s*$|[:<|&]\s*$")
+_IMPORT_EXPORT_LIST = re.compile(r"^(import|export)\b[^=(]*$")
+
+
+def _skip_string(src: str, i: int) -> int:
+    """Index after the string or template literal starting at ``i``."""
+    quote, n = src[i], len(src)
+    i += 1
+    while i < n:
+        c = src[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == quote:
+            return i + 1
+        if quote == "`" and src.startswith("${", i):
+            i = _match_brace(src, i + 1)
+            continue
+        if c == "\n" and quote != "`":
+            return i
+        i += 1
+    return n
+
+
+def _skip_comment(src: str, i: int) -> int:
+    """Index after the comment starting at ``i`` (``i`` itself if none)."""
+    if src.startswith("//", i):
+        end = src.find("\n", i)
+        return len(src) if end == -1 else end
+    if src.startswith("/*", i):
+        end = src.find("*/", i + 2)
+        return len(src) if end == -1 else end + 2
+    return i
+
+
+def _match_brace(src: str, i: int) -> int:
+    """Index after the brace that closes the ``{`` at ``i``."""
+    depth, n = 0, len(src)
+    while i < n:
+        c = src[i]
+        if c in "'\"`":
+            i = _skip_string(src, i)
+            continue
+        end = _skip_comment(src, i)
+        if end != i:
+            i = end
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return n
+
+
+def _block_kind(prefix: str, parent: Optional[str]) -> str:
+    """``container`` (keep members), ``type`` (keep all) or ``body`` (elide)."""
+    if parent == "type":
+        return "type"
+    lines = [line.strip() for line in prefix.strip().splitlines() if line.strip()]
+    last = lines[-1] if lines else ""
+    if _CONTAINER.search(last):
+        return "container"
+    if _TYPE_BLOCK.search(last):
+        return "type"
+    if _IMPORT_EXPORT_LIST.match(last):
+        return "type"
+    return "body"
+
+
+def script_skeleton(source: str) -> str:
+    """Skeleton of TypeScript/JavaScript source."""
+    out: List[str] = []
+    stack: List[str] = []
+    i, n, stmt_start = 0, len(source), 0
+    while i < n:
+        c = source[i]
+        if c in "'\"`":
+            end = _skip_string(source, i)
+        else:
+            end = _skip_comment(source, i)
+        if end != i:
+            out.append(source[i:end])
+            i = end
+            continue
+        if c == "{":
+            kind = _block_kind(source[stmt_start:i], stack[-1] if stack else None)
+            if kind == "body":
+                out.append("{ /* " + ELIDED + " */ }")
+                i = stmt_start = _match_brace(source, i)
+                continue
+            stack.append(kind)
+            stmt_start = i + 1
+        elif c == "}":
+            if stack:
+                stack.pop()
+            stmt_start = i + 1
+        elif c == ";":
+            stmt_start = i + 1
+        out.append(c)
+        i += 1
+    # Drop the blank lines left behind by elided top-level statements
+    return re.sub(r"\n\s*\n(\s*\n)+", "\n\n", "".join(out)).strip("\n") + "\n"
+
+
+_SCRIPT = re.compile(r"(<script\b[^>]*>)(.*?)(</script>)", re.S)
+
+
+def svelte_skeleton(source: str) -> str:
+    """Script skeletons of a Svelte component; markup and styles are elided."""
+    out: List[str] = []
+    pos = 0
+
+    def elide_markup(text: str):
+        count = len([line for line in text.splitlines() if line.strip()])
+        if count:
+            out.append(f"<!-- {ELIDED} {count} Zeilen Markup/Styles -->\n")
+
+    for m in _SCRIPT.finditer(source):
+        elide_markup(source[pos : m.start()])
+        out.append(f"{m.group(1)}\n{script_skeleton(m.group(2))}{m.group(3)}\n")
+        pos = m.end()
+    elide_markup(source[pos:])
+    return "".join(out)
+
+
+EXTRACTORS: Dict[str, Callable[[str], Optional[str]]] = {
+    ".py": python_skeleton,
+    ".ts": script_skeleton,
+    ".tsx": script_skeleton,
+    ".js": script_skeleton,
+    ".jsx": script_skeleton,
+    ".svelte": svelte_skeleton,
+}
+
+
+def skeleton(
+    path: str, content: str, cache_dir: str = DEFAULT_CACHE_DIR
+) -> Optional[str]:
+    """Cached skeleton of ``content``; None for unsupported or unparsable files."""
+    suffix = os.path.splitext(path)[1].lower()
+    extractor = EXTRACTORS.get(suffix)
+    if extractor is None:
+        return None
+    key = hashlib.sha256(
+        f"{EXTRACTOR_VERSION}:{suffix}:".encode("utf-8") + content.encode("utf-8")
+    ).hexdigest()
+    if key in _memory:
+        return _memory[key]
+
+    cache_file = Path(cache_dir) / f"{key}.txt"
+    try:
+        cached = cache_file.read_text(encoding="utf-8")
+        result = cached or None
+    except OSError:
+        result = extractor(content)
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            cache_file.write_text(result or "", encoding="utf-8")
+        except OSError as e:
+            logger.debug(f"Could not cache skeleton of {path}: {e}")
+    _memory[key] = result
+    return result
+
+
+def apply_context_mode(
+    context_str: str, mode: str, keep_full: Set[str], auto_min_lines: int = 80
+) -> Tuple[str, List[str]]:
+    """Replace context file bodies by skeletons according to ``mode``.
+
+    ``skeleton`` reduces every file not in ``keep_full``; ``auto`` only those
+    longer than ``auto_min_lines``. Returns the new context and the paths
+    that were reduced.
+    """
+    if mode == "full":
+        return context_str, []
+    head, sections = split_context_files(context_str)
+    parts, reduced = [head], []
+    for section in sections:
+        path, label, body = parse_context_section(section)
+        if (
+            path in keep_full
+            or label
+            or (mode == "auto" and body.count("\n") + 1 <= auto_min_lines)
+        ):
+            parts.append(section)
+            continue
+        skel = skeleton(path, body)
+        if not skel or len(skel) >= len(body):
+            parts.append(section)
+            continue
+        parts.append(f"=== FILE: {path}{SKELETON_LABEL} ===\n{skel}\n")
+        reduced.append(path)
+    if reduced:
+        logger.info(f"Context skeletons ({mode}): {', '.join(reduced)}")
+    return "".join(parts), reduced
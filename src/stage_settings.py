@@ -0,0 +1,70 @@
+"""
+Per-Stage Model and Token Settings
+Resolves the model, output token limit and context budget of each role from config.yaml.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .complexity_analyzer import ComplexityLevel
+
+ROLES = ("architect", "coder", "tester", "docwriter")
+
+DEFAULT_MODEL = "claude-3-5-sonnet-latest"
+
+# Fallback output token limits per role when guards are not configured
+DEFAULT_ROLE_TOKENS = {
+    "architect": 6000,
+    "coder": 5000,
+    "tester": 4000,
+    "docwriter": 4000,
+}
+
+# Fallback context token budgets per complexity level (guards.context_budget_tokens)
+DEFAULT_CONTEXT_BUDGET = {
+    "low": 12000,
+    "medium": 24000,
+    "high": 40000,
+    "enterprise": 60000,
+}
+
+
+@dataclass
+class StageSettings:
+    """Models and output token limits for one task."""
+
+    models: Dict[str, str]
+    max_tokens: Dict[str, int]
+    quality_multiplier: float
+    context_budget: int  # input tokens the context files of a prompt may use
+
+
+def resolve_stage_settings(
+    cfg: Dict, complexity: ComplexityLevel, force_model: Optional[str] = None
+) -> StageSettings:
+    """Select models and scale token limits by the complexity quality multiplier."""
+    if force_model:
+        models = {role: force_model for role in ROLES}
+    else:
+        models = {role: cfg["models"].get(role, DEFAULT_MODEL) for role in ROLES}
+
+    quality_multiplier = (
+        cfg.get("complexity", {})
+        .get("quality_multipliers", {})
+        .get(complexity.value, 1.0)
+    )
+    max_tokens = {
+        role: int(
+            cfg["guards"].get(f"{role}_max_tokens", DEFAULT_ROLE_TOKENS[role])
+            * quality_multiplier
+        )
+        for role in ROLES
+    }
+    budgets = {
+        **DEFAULT_CONTEXT_BUDGET,
+        **(cfg["guards"].get("context_budget_tokens") or {}),
+    }
+    context_budget = int(
+        budgets.get(complexity.value, DEFAULT_CONTEXT_BUDGET["medium"])
+    )
+    return StageSettings(models, max_tokens, quality_multiplier, context_budget)
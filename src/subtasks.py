@@ -0,0 +1,145 @@
+"""
+Goal Decomposition into Parallel Sub-Tasks
+Parses architect sub-tasks with disjoint file sets and merges their coder patches.
+
+For ENTERPRISE goals the architect may append a block such as::
+
+    ***BEGIN_SUBTASKS***
+    - id: api
+      task: Add the /health endpoint
+      files: [src/routes/health/+server.ts]
+    - id: ui
+      task: Show the service status in the footer
+      files: [src/lib/Footer.svelte]
+    ***END_SUBTASKS***
+
+Each sub-task is implemented by its own concurrent coder call. The resulting
+patches are merged into one diff; two sub-tasks touching the same file are
+only merged when their hunks do not overlap.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import yaml
+
+from .patch_fuzz import FilePatch, Hunk, parse_patch, render_patch
+from .patch_stream import extract_between
+
+logger = logging.getLogger(__name__)
+
+BEGIN_SUBTASKS = "***BEGIN_SUBTASKS***"
+END_SUBTASKS = "***END_SUBTASKS***"
+
+MAX_SUBTASKS = 6
+
+
+@dataclass
+class Subtask:
+    id: str
+    task: str
+    files: List[str] = field(default_factory=list)
+
+    def describe(self) -> str:
+        return f"{self.id}: {self.task} ({', '.join(self.files)})"
+
+
+def parse_subtasks(plan: str) -> List[Subtask]:
+    """Sub-tasks of an architect plan; empty when absent, invalid or not disjoint."""
+    body = extract_between(plan, BEGIN_SUBTASKS, END_SUBTASKS)
+    if not body:
+        return []
+    try:
+        data = yaml.safe_load(body.strip().strip("`"))
+    except yaml.YAMLError as e:
+        logger.warning(f"Ignoring unreadable sub-tasks: {e}")
+        return []
+    if not isinstance(data, list):
+        logger.warning("Ignoring sub-tasks: expected a list")
+        return []
+
+    subtasks: List[Subtask] = []
+    owners: Dict[str, str] = {}
+    for i, item in enumerate(data, 1):
+        if not isinstance(item, dict) or not item.get("task") or not item.get("files"):
+            logger.warning(f"Ignoring sub-tasks: entry {i} needs task and files")
+            return []
+        subtask = Subtask(
+            id=str(item.get("id") or f"t{i}"),
+            task=str(item["task"]).strip(),
+            files=[str(f).strip().removeprefix("./") for f in item["files"]],
+        )
+        for path in subtask.files:
+            if path in owners:
+                logger.warning(
+                    f"Ignoring sub-tasks: {path} is claimed by "
+                    f"{owners[path]} and {subtask.id}"
+                )
+                return []
+            owners[path] = subtask.id
+        subtasks.append(subtask)
+    if len(subtasks) > MAX_SUBTASKS:
+        logger.warning(f"Ignoring sub-tasks: {len(subtasks)} > {MAX_SUBTASKS}")
+        return []
+    return subtasks
+
+
+def _file_key(fp: FilePatch) -> str:
+    return fp.new_path if fp.old_path == "/dev/null" else fp.old_path
+
+
+def _overlaps(a: Hunk, b: Hunk) -> bool:
+    """Whether two hunks of the same file touch a common old line range."""
+    a_end = a.old_start + max(a.old_count, 1)
+    b_end = b.old_start + max(b.old_count, 1)
+    return a.old_start < b_end and b.old_start < a_end
+
+
+def merge_patches(patches: Dict[str, str]) -> Tuple[str, List[str]]:
+    """Merge sub-task patches into one diff.
+
+    Returns ``(merged, conflicts)``; ``merged`` is only meaningful when no
+    conflicts were found. Hunks of a file changed by several sub-tasks are
+    combined in file order with renumbered new-side line numbers.
+    """
+    merged: Dict[str, FilePatch] = {}
+    owners: Dict[str, str] = {}
+    conflicts: List[str] = []
+    for subtask_id, patch in patches.items():
+        for fp in parse_patch(patch):
+            path = _file_key(fp)
+            if path not in merged:
+                merged[path] = fp
+                owners[path] = subtask_id
+                continue
+            other = owners[path]
+            if fp.old_path == "/dev/null" or merged[path].old_path == "/dev/null":
+                conflicts.append(f"{path}: created by {other} and {subtask_id}")
+                continue
+            clashes = [
+                (h.old_start, g.old_start)
+                for h in fp.hunks
+                for g in merged[path].hunks
+                if _overlaps(h, g)
+            ]
+            if clashes:
+                conflicts.append(
+                    f"{path}: hunks of {other} and {subtask_id} overlap "
+                    f"(lines {', '.join(str(a) for a, _ in clashes)})"
+                )
+                continue
+            logger.info(f"Merging {subtask_id} hunks into {path} (shared with {other})")
+            merged[path].hunks.extend(fp.hunks)
+
+    for fp in merged.values():
+        if fp.old_path == "/dev/null":
+            continue
+        fp.hunks.sort(key=lambda h: h.old_start)
+        delta = 0
+        for h in fp.hunks:
+            # git numbers an empty side by the line before it
+            start = h.old_start if h.old_count else h.old_start + 1
+            h.new_start = start + delta - (0 if h.new_count else 1)
+            delta += h.new_count - h.old_count
+    return render_patch(list(merged.values())), conflicts
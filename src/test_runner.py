@@ -1,7 +1,7 @@
 import json
 import pathlib
 import subprocess
-from typing import Optional
+from typing import Optional, Tuple
 
 import yaml
 
@@ -87,7 +87,8 @@ def build_commands(pm_info: dict, overrides: Optional[list] = None) -> list:
     return commands
 
 
-def run_checks(repo_path: str) -> tuple[bool, str]:
+def resolve_check_commands(repo_path: str) -> Tuple[list, str]:
+    """Commands to run for ``repo_path``; ``([], reason)`` when checks are skipped."""
     # Load config for overrides
     try:
         with open("config.yaml", "r", encoding="utf-8") as f:
@@ -103,7 +104,7 @@ def run_checks(repo_path: str) -> tuple[bool, str]:
     pm_info = detect_pm(repo_path)
 
     if not pm_info["is_js"]:
-        return True, "No JS project detected; checks skipped."
+        return [], "No JS project detected; checks skipped."
 
     # Apply manual override if specified
     if pm_override != "auto":
@@ -112,15 +113,25 @@ def run_checks(repo_path: str) -> tuple[bool, str]:
     cmds = build_commands(pm_info, cmd_overrides if cmd_overrides else None)
 
     if not cmds:
-        return True, "No test commands available; checks skipped."
+        return [], "No test commands available; checks skipped."
+    return cmds, ""
+
 
+def run_commands(repo_path: str, cmds: list) -> Tuple[bool, str, list]:
+    """Run ``cmds`` until one fails. Returns ``(ok, log, pending)`` where
+    ``pending`` holds the failed command and the ones not run yet."""
     log = []
-    all_ok = True
-    for c in cmds:
+    for i, c in enumerate(cmds):
         p = subprocess.run(c, cwd=repo_path, text=True, capture_output=True)
-        ok = p.returncode == 0
-        all_ok = all_ok and ok
         log.append(f"$ {' '.join(c)}\n{p.stdout}\n{p.stderr}\n")
-        if not ok:
-            break
-    return all_ok, "\n".join(log)
+        if p.returncode != 0:
+            return False, "\n".join(log), list(cmds[i:])
+    return True, "\n".join(log), []
+
+
+def run_checks(repo_path: str) -> tuple[bool, str]:
+    cmds, skipped = resolve_check_commands(repo_path)
+    if not cmds:
+        return True, skipped
+    ok, log, _ = run_commands(repo_path, cmds)
+    return ok, log
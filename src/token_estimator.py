@@ -0,0 +1,255 @@
+"""
+Local Token Estimator and Pre-flight Prompt Sizing
+Estimates prompt sizes before sending and keeps them within token and budget limits.
+
+Text is split into tokenizer-like pieces (short letter runs, digit groups and
+single symbols) with one regular expression. The piece count is scaled by a
+per-model factor that is calibrated against the ``usage`` of every real API
+response, so estimates converge on the actual tokenizer over time. Piece counts
+of large texts (mostly context files) are cached by content hash. The state is
+shared by concurrent requests and saved once, when the run ends.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from .prompts import blocks_text
+from .stage_settings import ROLES
+
+logger = logging.getLogger(__name__)
+
+_PIECE = re.compile(r"[A-Za-z]{1,6}|[0-9]{1,3}|[^\sA-Za-z0-9]")
+
+# Texts shorter than this are cheaper to count than to hash and look up
+MIN_CACHED_CHARS = 2048
+MAX_CACHED_TEXTS = 2000
+
+# Weight of a new observation in the calibration factor's moving average
+CALIBRATION_ALPHA = 0.2
+MIN_FACTOR, MAX_FACTOR = 0.3, 3.0
+
+_FILE_HEADER = "=== FILE: "
+# Headers start a line; an indented "=== FILE: " inside a file body is content
+_FILE_SPLIT = re.compile(r"(?m)^(?==== FILE: )")
+# "=== FILE: path (Skeleton) ===": a reduced representation of the file
+_FILE_LABEL = re.compile(r"^(.*?)( \([A-Za-z]+\))?$")
+
+
+def count_pieces(text: str) -> int:
+    """Uncalibrated size of ``text`` in tokenizer-like pieces."""
+    return len(_PIECE.findall(text))
+
+
+class TokenEstimator:
+    """Calibrated token estimates with a persistent per-content piece cache."""
+
+    def __init__(self, state_file: str = ".ai_agents_cache/token_estimator.json"):
+        self.state_path = Path(state_file)
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        state = self._load_state()
+        self.factors: Dict[str, float] = state.get("factors", {})
+        self.samples: Dict[str, int] = state.get("samples", {})
+        self.pieces: Dict[str, int] = state.get("pieces", {})
+        self._dirty = False
+        self._lock = threading.Lock()  # hedged/candidate calls run on threads
+
+    def _load_state(self) -> Dict[str, Any]:
+        if not self.state_path.exists():
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Failed to load token estimator state: {e}")
+            return {}
+
+    def save(self):
+        """Persist calibration factors and the piece cache if they changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            # Dicts keep insertion order, so the oldest counts are dropped first
+            while len(self.pieces) > MAX_CACHED_TEXTS:
+                self.pieces.pop(next(iter(self.pieces)))
+            data = {
+                "factors": self.factors,
+                "samples": self.samples,
+                "pieces": self.pieces,
+            }
+            try:
+                fd, tmp = tempfile.mkstemp(dir=self.state_path.parent, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(tmp, self.state_path)
+                self._dirty = False
+            except OSError as e:
+                logger.error(f"Failed to save token estimator state: {e}")
+
+    def _pieces(self, text: str) -> int:
+        if len(text) < MIN_CACHED_CHARS:
+            return count_pieces(text)
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+        cached = self.pieces.get(key)
+        if cached is None:
+            cached = count_pieces(text)
+            with self._lock:
+                self.pieces[key] = cached
+                self._dirty = True
+        return cached
+
+    def factor(self, model: str) -> float:
+        return self.factors.get(model, 1.0)
+
+    def estimate(self, text: Any, model: str = "") -> int:
+        """Estimated token count of a string or a list of text blocks."""
+        text = blocks_text(text)
+        if not text:
+            return 0
+        # Count file sections separately so unchanged files hit the cache
+        sections = text.split(_FILE_HEADER) if _FILE_HEADER in text else [text]
+        pieces = sum(self._pieces(section) for section in sections)
+        return max(1, round(pieces * self.factor(model)))
+
+    def estimate_request(
+        self, model: str, system: Any, prompt: Any, tools: Any = None
+    ) -> int:
+        """Estimated input tokens of a system prompt, user prompt and tools."""
+        total = self.estimate(system, model) + self.estimate(prompt, model)
+        if tools:
+            total += self.estimate(json.dumps(tools, ensure_ascii=False), model)
+        return total
+
+    def calibrate(self, model: str, estimated: int, actual: int):
+        """Move the model's factor towards the ratio observed in a response.
+
+        Only updates memory; :meth:`save` persists the result.
+        """
+        if estimated <= 0 or actual <= 0:
+            return
+        with self._lock:
+            current = self.factor(model)
+            observed = current * actual / estimated
+            updated = current + CALIBRATION_ALPHA * (observed - current)
+            self.factors[model] = min(MAX_FACTOR, max(MIN_FACTOR, updated))
+            self.samples[model] = self.samples.get(model, 0) + 1
+            self._dirty = True
+            factor = self.factors[model]
+        logger.info(
+            f"Token estimate for {model}: estimated={estimated}, actual={actual}, "
+            f"factor={factor:.3f}"
+        )
+
+
+@dataclass
+class PreflightResult:
+    """Outcome of sizing a prompt before it is sent."""
+
+    context_str: str
+    input_tokens: int
+    dropped_files: List[str]
+    ok: bool
+    reason: str = ""
+
+
+def split_context_files(context_str: str) -> Tuple[str, List[str]]:
+    """Split :func:`collect_context` output into a head and per-file sections."""
+    head, *sections = _FILE_SPLIT.split(context_str)
+    if head.startswith(_FILE_HEADER):
+        head, sections = "", [head] + sections
+    return head, sections
+
+
+def parse_context_section(section: str) -> Tuple[str, str, str]:
+    """``(path, label, body)`` of one file section of a context string."""
+    header, _, body = section.partition("\n")
+    name = header[len(_FILE_HEADER) :].rsplit(" ===", 1)[0]
+    path, label = _FILE_LABEL.match(name).groups()
+    return path, label or "", body.rstrip("\n")
+
+
+def fit_context(
+    estimator: TokenEstimator,
+    model: str,
+    context_str: str,
+    fixed_tokens: int,
+    max_input_tokens: int,
+) -> PreflightResult:
+    """Drop context files from the end until the prompt fits ``max_input_tokens``.
+
+    ``fixed_tokens`` is the part of the prompt that cannot be trimmed (role
+    template, goal, plan). Refuses when even the empty context does not fit.
+    """
+    total = fixed_tokens + estimator.estimate(context_str, model)
+    if total <= max_input_tokens:
+        return PreflightResult(context_str, total, [], True)
+
+    head, files = split_context_files(context_str)
+    dropped: List[str] = []
+    while files and total > max_input_tokens:
+        section = files.pop()
+        dropped.append(section[len(_FILE_HEADER) :].split(" ===", 1)[0])
+        total = fixed_tokens + estimator.estimate(head + "".join(files), model)
+
+    trimmed = head + "".join(files)
+    if total > max_input_tokens:
+        return PreflightResult(
+            trimmed,
+            total,
+            dropped,
+            False,
+            f"prompt needs ~{total} input tokens even without context files "
+            f"(limit {max_input_tokens})",
+        )
+    return PreflightResult(trimmed, total, dropped, True)
+
+
+def project_stage_tokens(
+    estimator: TokenEstimator,
+    models: Dict[str, str],
+    max_tokens: Dict[str, int],
+    role_texts: Dict[str, str],
+    goal: str,
+    context_str: str,
+) -> Dict[str, Tuple[int, int]]:
+    """Upper-bound ``(input, output)`` tokens of every stage before any call.
+
+    Outputs are bounded by ``max_tokens``; the plan and the QA feedback that
+    later stages receive are assumed to reach their stage's output limit.
+    """
+    plan = max_tokens["architect"]
+    patch_preview = 300  # the tester sees the first 1000 characters of the patch
+    projection = {}
+    for role in ROLES:
+        model = models[role]
+        fixed = estimator.estimate(role_texts.get(role, ""), model)
+        if role == "architect":
+            inp = fixed + estimator.estimate(goal, model)
+            inp += estimator.estimate(context_str, model)
+        elif role == "coder":
+            inp = fixed + plan + estimator.estimate(context_str, model)
+        elif role == "tester":
+            inp = fixed + plan + patch_preview
+        else:
+            inp = fixed + plan + max_tokens["tester"] + estimator.estimate(goal, model)
+        projection[role] = (inp, max_tokens[role])
+    return projection
+
+
+def project_cost(
+    budget_monitor: Any,
+    models: Dict[str, str],
+    projection: Dict[str, Tuple[int, int]],
+) -> Dict[str, float]:
+    """Price a :func:`project_stage_tokens` projection per stage."""
+    return {
+        role: budget_monitor.estimate_task_cost(models[role], inp, out)
+        for role, (inp, out) in projection.items()
+    }
@@ -0,0 +1,263 @@
+"""
+Batch Mode Tests
+Drives BatchRunner through a stubbed Message Batches client.
+"""
+
+import json
+import subprocess
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+import yaml
+
+from src import batch as batch_module
+from src.batch import BatchRunner
+from src.budget_monitor import BudgetMonitor
+
+ROOT = Path(__file__).resolve().parents[1]
+STAGES = ["architect", "coder", "tester", "docwriter"]
+
+# Stages are recognised by the persona of their role template
+ROLE_MARKERS = {
+    "architect": "Software Architect",
+    "coder": "Full-Stack Developer",
+    "tester": "QA Engineer",
+    "docwriter": "Technical Writer",
+}
+
+RESPONSES = {
+    "architect": "## Plan\n1. Add a note file.\n\ncomplexity: low\nallowDeps: false\n",
+    "coder": (
+        "***BEGIN_PATCH***\n"
+        "--- /dev/null\n"
+        "+++ b/NOTES.md\n"
+        "@@ -0,0 +1 @@\n"
+        "+# Notes\n"
+        "***END_PATCH***\n"
+    ),
+    "tester": "QA Assessment: PASS\n\nNo issues found.\n",
+    "docwriter": "## Summary\n\nAdds a note file.\n",
+}
+
+
+class FakeBatches:
+    """In-memory ``client().messages.batches``.
+
+    A batch reports ``in_progress`` on its first poll and ``ended`` after.
+    """
+
+    def __init__(self):
+        self.batches: Dict[str, Dict] = {}
+
+    def create(self, requests: List[Dict]):
+        batch_id = f"msgbatch_{len(self.batches) + 1}"
+        self.batches[batch_id] = {"requests": requests, "polls": 0}
+        return SimpleNamespace(id=batch_id)
+
+    def retrieve(self, batch_id: str):
+        entry = self.batches[batch_id]
+        entry["polls"] += 1
+        ended = entry["polls"] > 1
+        total = len(entry["requests"])
+        counts = SimpleNamespace(
+            processing=0 if ended else total,
+            succeeded=total if ended else 0,
+            errored=0,
+            expired=0,
+            canceled=0,
+        )
+        status = "ended" if ended else "in_progress"
+        return SimpleNamespace(
+            id=batch_id, processing_status=status, request_counts=counts
+        )
+
+    def results(self, batch_id: str):
+        for request in self.batches[batch_id]["requests"]:
+            message = self._reply(request["params"])
+            yield SimpleNamespace(
+                custom_id=request["custom_id"],
+                result=SimpleNamespace(type="succeeded", message=message),
+            )
+
+    def _reply(self, params: Dict):
+        system = json.dumps(params["system"])
+        stage = next(s for s, marker in ROLE_MARKERS.items() if marker in system)
+        return SimpleNamespace(
+            model=params["model"],
+            content=[SimpleNamespace(type="text", text=RESPONSES[stage])],
+            usage=SimpleNamespace(
+                input_tokens=1000,
+                output_tokens=200,
+                cache_creation_input_tokens=0,
+                cache_read_input_tokens=0,
+            ),
+            stop_reason="end_turn",
+        )
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    fake = FakeBatches()
+    stub = SimpleNamespace(messages=SimpleNamespace(batches=fake))
+    monkeypatch.setattr(batch_module, "client", lambda: stub)
+    return fake
+
+
+@pytest.fixture
+def polls(monkeypatch):
+    sleeps: List[float] = []
+    monkeypatch.setattr(batch_module, "time", SimpleNamespace(sleep=sleeps.append))
+    return sleeps
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # Role templates are read and cost logs written relative to the cwd
+    (tmp_path / "roles").symlink_to(ROOT / "roles")
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo"
+    path.mkdir()
+    subprocess.run(["git", "init", "-q", str(path)], check=True)
+    (path / "README.md").write_text("# Target\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def batch_file(tmp_path):
+    path = tmp_path / "goals.jsonl"
+    goals = [
+        {"id": "notes", "goal": "Add a note file"},
+        {"id": "docs", "goal": "Document the batch run", "scope": "docs/batch"},
+    ]
+    path.write_text("\n".join(json.dumps(g) for g in goals) + "\n", encoding="utf-8")
+    return path
+
+
+def make_runner(repo) -> BatchRunner:
+    with open(ROOT / "config.yaml", "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+    cfg.setdefault("batch", {})["poll_interval_s"] = 7
+    return BatchRunner(
+        cfg,
+        str(repo),
+        BudgetMonitor(str(ROOT / "config.yaml")),
+        force_model="claude-3-5-sonnet-latest",
+        use_context_cache=False,
+    )
+
+
+def test_run_submits_polls_and_collects_every_stage(batches, polls, repo, batch_file):
+    runner = make_runner(repo)
+    runner.run(str(batch_file), "feat/batch", apply=False)
+
+    # One batch per stage, each holding a request for every goal
+    assert len(batches.batches) == len(STAGES)
+    assert sorted(runner.batches) == sorted(STAGES)
+    for entry in batches.batches.values():
+        assert {r["custom_id"] for r in entry["requests"]} == {"notes", "docs"}
+        assert entry["polls"] == 2
+    # Every stage slept one poll interval while its batch was in progress
+    assert polls == [7] * len(STAGES)
+
+    goals = {g.goal_id: g for g in runner.goals}
+    assert goals["docs"].scope == "docs/batch"
+    assert goals["notes"].scope == "feat/batch-notes"
+    for goal in goals.values():
+        assert goal.status == "done", goal.error
+        assert "complexity: low" in goal.plan
+        assert "+++ b/NOTES.md" in goal.patch
+        assert goal.test_feedback and goal.pr_body
+        assert set(goal.costs) == set(STAGES)
+
+    state = json.loads(runner.state_file.read_text(encoding="utf-8"))
+    assert state["completed"] == STAGES
+    assert state["batches"] == runner.batches
+
+
+def test_resume_reuses_submitted_batches(batches, polls, repo, batch_file):
+    runner = make_runner(repo)
+    collect = runner._collect
+
+    def interrupted_collect(stage, batch_id):
+        if stage == "coder":
+            raise KeyboardInterrupt
+        collect(stage, batch_id)
+
+    runner._collect = interrupted_collect
+    with pytest.raises(KeyboardInterrupt):
+        runner.run(str(batch_file), "feat/batch", apply=False)
+
+    state = json.loads(runner.state_file.read_text(encoding="utf-8"))
+    assert state["completed"] == ["architect"]
+    assert sorted(state["batches"]) == ["architect", "coder"]
+    assert len(batches.batches) == 2
+
+    resumed = make_runner(repo)
+    resumed.run(str(batch_file), "feat/batch", apply=False)
+
+    # The coder batch is polled again instead of being paid for twice
+    assert resumed.batches["coder"] == state["batches"]["coder"]
+    assert len(batches.batches) == len(STAGES)
+    assert all(g.status == "done" for g in resumed.goals)
+    assert all(g.plan for g in resumed.goals)
+
+
+def test_finished_run_is_not_resubmitted(batches, polls, repo, batch_file):
+    make_runner(repo).run(str(batch_file), "feat/batch", apply=False)
+    assert len(batches.batches) == len(STAGES)
+
+    again = make_runner(repo)
+    again.run(str(batch_file), "feat/batch", apply=False)
+    assert len(batches.batches) == len(STAGES)
+    assert all(g.status == "done" for g in again.goals)
+
+
+@pytest.fixture
+def pushable_repo(repo, tmp_path):
+    remote = tmp_path / "remote.git"
+    subprocess.run(["git", "init", "-q", "--bare", str(remote)], check=True)
+    for cmd in (
+        ["add", "README.md"],
+        ["-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init"],
+        ["remote", "add", "origin", str(remote)],
+        ["config", "user.name", "t"],
+        ["config", "user.email", "t@t"],
+    ):
+        subprocess.run(["git", "-C", str(repo), *cmd], check=True)
+    return repo
+
+
+def test_resumed_apply_reuses_the_existing_branch(
+    batches, polls, pushable_repo, batch_file, monkeypatch
+):
+    interrupted = []
+
+    def checks(repo_path):
+        # Interrupt once, after the first goal was committed and pushed
+        if not interrupted:
+            interrupted.append(repo_path)
+            raise KeyboardInterrupt
+        return True, ""
+
+    monkeypatch.setattr(batch_module, "run_checks", checks)
+    with pytest.raises(KeyboardInterrupt):
+        make_runner(pushable_repo).run(str(batch_file), "feat/batch")
+
+    resumed = make_runner(pushable_repo)
+    resumed.run(str(batch_file), "feat/batch")
+
+    assert all(g.status == "done" and g.applied for g in resumed.goals)
+    log = subprocess.run(
+        ["git", "-C", str(pushable_repo), "log", "--format=%s", "feat/batch-notes"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.splitlines()
+    # The patch was committed once, not re-applied on top of itself
+    assert log == ["feat: Add a note file", "init"]
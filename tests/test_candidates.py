@@ -0,0 +1,51 @@
+"""
+Candidate Evaluation Tests
+Applies candidate patches in scratch worktrees.
+"""
+
+import subprocess
+
+import pytest
+
+from src.candidates import Candidate, evaluate_candidate
+from src.llm import CompletionResult
+
+PATCH = "--- a/README.md\n+++ b/README.md\n@@ -1 +1 @@\n-# Target\n+# Target repo\n"
+
+
+@pytest.fixture
+def repo(tmp_path):
+    def git(*args):
+        subprocess.run(["git", "-C", str(tmp_path), *args], check=True)
+
+    git("init", "-q")
+    (tmp_path / "README.md").write_text("# Target\n", encoding="utf-8")
+    git("add", "README.md")
+    git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "init")
+    return tmp_path
+
+
+def candidate(patch: str) -> Candidate:
+    model = "claude-3-5-haiku-latest"
+    return Candidate(0, model, None, CompletionResult("", model), patch)
+
+
+def test_candidate_without_check_commands_is_not_verified(repo):
+    draft = candidate(PATCH)
+    evaluate_candidate(str(repo), draft)
+
+    assert draft.applies
+    assert draft.checks_ok
+    assert not draft.checks_ran
+    assert "skipped" in draft.check_logs
+    # The target checkout is never touched
+    assert (repo / "README.md").read_text(encoding="utf-8") == "# Target\n"
+
+
+def test_candidate_that_does_not_apply(repo):
+    draft = candidate(PATCH.replace("-# Target\n", "-# Other\n"))
+    evaluate_candidate(str(repo), draft)
+
+    assert not draft.applies
+    assert not draft.checks_ran
+    assert draft.error
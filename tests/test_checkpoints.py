@@ -0,0 +1,102 @@
+"""
+Checkpoint Tests
+Saving, dropping and resuming the stage outputs of a run.
+"""
+
+import pytest
+
+from src.checkpoints import RunCheckpoint, list_runs
+from src.pipeline import Pipeline, Stage
+
+TASK = {"goal": "Add a note file", "scope": "feat/notes"}
+
+
+@pytest.fixture
+def runs(tmp_path):
+    return str(tmp_path / "runs")
+
+
+def test_save_stage_persists_outputs_and_order(runs):
+    checkpoint = RunCheckpoint.create(TASK, runs)
+    checkpoint.save_stage("architect", {"plan": "1. Add NOTES.md"})
+    checkpoint.save_stage("coder", {"patch": "--- a/x\n"})
+    checkpoint.save_stage("architect", {"plan": "1. Add NOTES.md first"})
+    checkpoint.save_base_commit("a" * 40)
+
+    reopened = RunCheckpoint.open("latest", runs)
+
+    assert list_runs(runs) == [checkpoint.run_id]
+    assert reopened.task == TASK
+    assert reopened.stages == ["architect", "coder"]
+    assert reopened.base_commit == "a" * 40
+    assert reopened.load_artifacts() == {
+        "plan": "1. Add NOTES.md first",
+        "patch": "--- a/x\n",
+    }
+
+
+def test_drop_stages_forgets_their_outputs(runs):
+    checkpoint = RunCheckpoint.create(TASK, runs)
+    for stage, key in (("architect", "plan"), ("coder", "patch"), ("apply", "ok")):
+        checkpoint.save_stage(stage, {key: stage})
+
+    checkpoint.drop_stages(["coder", "apply", "never-saved"])
+
+    reopened = RunCheckpoint.open(checkpoint.run_id, runs)
+    assert reopened.stages == ["architect"]
+    assert reopened.load_artifacts() == {"plan": "architect"}
+    assert not (reopened.run_dir / "coder.json").exists()
+
+
+def test_unreadable_stage_files_are_skipped(runs):
+    checkpoint = RunCheckpoint.create(TASK, runs)
+    checkpoint.save_stage("architect", {"plan": "P"})
+    checkpoint.save_stage("coder", {"patch": "D"})
+    (checkpoint.run_dir / "coder.json").write_text("{", encoding="utf-8")
+
+    assert RunCheckpoint.open(checkpoint.run_id, runs).load_artifacts() == {"plan": "P"}
+
+
+def test_unknown_runs_exit(runs):
+    with pytest.raises(SystemExit, match="No runs"):
+        RunCheckpoint.open("latest", runs)
+    RunCheckpoint.create(TASK, runs)
+    with pytest.raises(SystemExit, match="Unknown run ID"):
+        RunCheckpoint.open("20000101-000000-000000", runs)
+
+
+def test_resumed_pipeline_skips_checkpointed_stages(runs):
+    calls = []
+
+    def stage(name, output, **kwargs):
+        def run(_):
+            calls.append(name)
+            return {output: name}
+
+        return Stage(name, run, outputs=[output], **kwargs)
+
+    stages = [
+        stage("architect", "plan"),
+        stage("coder", "patch", inputs=["plan"]),
+        stage("tester", "report", inputs=["patch"]),
+    ]
+    checkpoint = RunCheckpoint.create(TASK, runs)
+    Pipeline(stages).run(on_stage_done=checkpoint.save_stage)
+    # --from-stage coder: drop it and everything downstream, then resume
+    resumed = RunCheckpoint.open(checkpoint.run_id, runs)
+    resumed.drop_stages(Pipeline(stages).downstream(["coder"]))
+    calls.clear()
+
+    result = Pipeline(stages).run(resumed.load_artifacts(), resumed.save_stage)
+
+    assert calls == ["coder", "tester"]
+    assert result.artifacts == {
+        "plan": "architect",
+        "patch": "coder",
+        "report": "tester",
+    }
+    assert RunCheckpoint.open(checkpoint.run_id, runs).stages == [
+        "architect",
+        "coder",
+        "tester",
+    ]
@@ -0,0 +1,48 @@
+"""
+Context Collection Tests
+The file limit applies with and without the context cache.
+"""
+
+import pytest
+
+from src import context as context_module
+from src.context import collect_context
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    # The context cache lives relative to the cwd
+    monkeypatch.chdir(tmp_path)
+    root = tmp_path / "repo"
+    (root / "src").mkdir(parents=True)
+    for i in range(5):
+        (root / "src" / f"mod{i}.py").write_text(f"x = {i}\n", encoding="utf-8")
+    return root
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    calls = []
+    direct = context_module._collect_context_direct
+
+    def counting(*args):
+        calls.append(args)
+        return direct(*args)
+
+    monkeypatch.setattr(context_module, "_collect_context_direct", counting)
+    return calls
+
+
+def test_limit_caps_collected_files(repo, reads):
+    context = collect_context(str(repo), ["src"], "goal", use_cache=False, limit=2)
+    assert context.count("=== FILE:") == 2
+
+
+def test_cache_hit_respects_the_limit(repo, reads):
+    first = collect_context(str(repo), ["src"], "goal", use_cache=True, limit=2)
+    second = collect_context(str(repo), ["src"], "goal", use_cache=True, limit=2)
+
+    assert first.count("=== FILE:") == 2
+    assert second.count("=== FILE:") == 2
+    # The second call is served from the cache instead of re-reading the files
+    assert len(reads) == 1
@@ -0,0 +1,97 @@
+"""
+Context Packer Tests
+Knapsack selection and packing of context files into a token budget.
+"""
+
+import itertools
+import random
+
+import pytest
+
+from src.context_packer import FileCandidate, Option, _knapsack, pack_context
+from src.token_estimator import TokenEstimator
+
+MODEL = "claude-3-5-sonnet-latest"
+
+
+def candidates(rng: random.Random, count: int, max_tokens: int):
+    files = []
+    for i in range(count):
+        f = FileCandidate(f"f{i}.py", "")
+        for mode in ("full", "window", "outline")[: rng.randint(1, 3)]:
+            f.options.append(
+                Option(mode, "", rng.randint(1, max_tokens), rng.uniform(0.1, 5))
+            )
+        files.append(f)
+    return files
+
+
+def best_value(files, budget: int) -> float:
+    """Brute force over every combination of one option (or none) per file."""
+    best = 0.0
+    for combo in itertools.product(*[[None] + f.options for f in files]):
+        picked = [o for o in combo if o is not None]
+        if sum(o.tokens for o in picked) <= budget:
+            best = max(best, sum(o.value for o in picked))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_knapsack_is_optimal_within_the_budget(seed):
+    rng = random.Random(seed)
+    files = candidates(rng, 5, 60)
+    budget = rng.randint(20, 150)
+
+    chosen = _knapsack(files, budget)
+
+    assert len(chosen) == len(files)
+    # At most one representation per file, taken from that file's options
+    assert all(
+        o is None or any(o is x for x in f.options) for f, o in zip(files, chosen)
+    )
+    assert sum(o.tokens for o in chosen if o) <= budget
+    assert sum(o.value for o in chosen if o) == pytest.approx(best_value(files, budget))
+
+
+def test_knapsack_stays_within_a_scaled_budget():
+    # Budgets beyond DP_BUCKETS are rounded up per option, never down
+    rng = random.Random(7)
+    files = candidates(rng, 30, 9000)
+
+    chosen = _knapsack(files, 40000)
+
+    assert sum(o.tokens for o in chosen if o) <= 40000
+    assert any(chosen)
+
+
+def test_pack_context_fits_the_budget(tmp_path):
+    estimator = TokenEstimator(str(tmp_path / "state.json"))
+    target = "def apply_discount(order):\n    return order.total * 0.9\n"
+    invoice = (
+        "".join(f"def helper_{i}(x):\n    return x + {i}\n\n" for i in range(60))
+        + "def invoice_discount(order):\n    return apply_discount(order)\n"
+    )
+    vendored = "var x = 1;\n" * 600
+    context = (
+        "# Kontext\n"
+        f"=== FILE: src/discount.py ===\n{target}\n"
+        f"=== FILE: src/invoice.py ===\n{invoice}\n"
+        f"=== FILE: vendor/lib.js ===\n{vendored}\n"
+    )
+    budget = 600
+
+    result = pack_context(
+        estimator,
+        MODEL,
+        context,
+        "Rabatt fuer invoice discount",
+        budget,
+        keep_full={"src/discount.py"},
+    )
+
+    assert result.tokens <= budget
+    assert result.modes["src/discount.py"] == "full"
+    assert target in result.context_str
+    assert result.modes["src/invoice.py"] == "window"
+    assert "=== FILE: src/invoice.py (Ausschnitte) ===" in result.context_str
+    assert "vendor/lib.js" in result.dropped
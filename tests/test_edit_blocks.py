@@ -0,0 +1,81 @@
+"""
+Edit Block Tests
+Parsing of SEARCH/REPLACE blocks and their conversion into git patches.
+"""
+
+import subprocess
+
+import pytest
+
+from src.edit_blocks import EditBlockError, edits_to_patch, parse_edit_blocks
+
+
+@pytest.fixture
+def repo(tmp_path):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    return tmp_path
+
+
+def block(path: str, search: str, replace: str) -> str:
+    return f"FILE: {path}\n<<<<<<< SEARCH\n{search}=======\n{replace}>>>>>>> REPLACE\n"
+
+
+def apply(repo, patch: str):
+    subprocess.run(
+        ["git", "-C", str(repo), "apply", "-"], input=patch.encode(), check=True
+    )
+
+
+def test_parse_splits_search_and_replace():
+    text = block("a.py", "x = 1\n", "x = 2\n") + block("b.py", "", "new\n")
+
+    blocks = parse_edit_blocks(text)
+
+    assert [(b.path, b.search, b.replace) for b in blocks] == [
+        ("a.py", ["x = 1"], ["x = 2"]),
+        ("b.py", [], ["new"]),
+    ]
+
+
+def test_parse_rejects_unterminated_blocks():
+    with pytest.raises(EditBlockError, match="Unterminated"):
+        parse_edit_blocks("FILE: a.py\n<<<<<<< SEARCH\nx = 1\n=======\nx = 2\n")
+    with pytest.raises(EditBlockError, match="Unterminated"):
+        parse_edit_blocks("FILE: a.py\n<<<<<<< SEARCH\nx = 1\n>>>>>>> REPLACE\n")
+    with pytest.raises(EditBlockError, match="FILE"):
+        parse_edit_blocks("<<<<<<< SEARCH\nx\n=======\ny\n>>>>>>> REPLACE\n")
+
+
+def test_divider_inside_search_text(repo):
+    (repo / "doc.rst").write_text("Title\n=======\n\nBody\n", encoding="utf-8")
+    text = block("doc.rst", "Title\n=======\n", "New title\n=========\n")
+
+    apply(repo, edits_to_patch(str(repo), text))
+
+    assert (repo / "doc.rst").read_text() == "New title\n=========\n\nBody\n"
+
+
+def test_divider_inside_replace_text(repo):
+    (repo / "doc.rst").write_text("Title\n\nBody\n", encoding="utf-8")
+    text = block("doc.rst", "Title\n", "Title\n=======\n")
+
+    apply(repo, edits_to_patch(str(repo), text))
+
+    assert (repo / "doc.rst").read_text() == "Title\n=======\n\nBody\n"
+
+
+def test_crlf_line_endings_are_kept(repo):
+    (repo / "win.txt").write_bytes(b"one\r\ntwo\r\nthree\r\n")
+    text = block("win.txt", "two\n", "zwei\n")
+
+    patch = edits_to_patch(str(repo), text)
+    apply(repo, patch)
+
+    assert "-two\r\n+zwei\r\n" in patch
+    assert (repo / "win.txt").read_bytes() == b"one\r\nzwei\r\nthree\r\n"
+
+
+def test_missing_search_text_is_reported(repo):
+    (repo / "a.py").write_text("x = 1\n", encoding="utf-8")
+    with pytest.raises(EditBlockError, match="not found"):
+        edits_to_patch(str(repo), block("a.py", "y = 1\n", "y = 2\n"))
@@ -0,0 +1,105 @@
+"""
+Git Index Tests
+Tracked and untracked listing and incremental refreshes of the file index.
+"""
+
+import subprocess
+
+import pytest
+
+from src import git_index
+from src.git_index import GitFileIndex
+
+
+def git(repo, *args: str) -> str:
+    return subprocess.run(
+        ["git", "-C", str(repo), *args], capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+def write(repo, rel: str, text: str):
+    path = repo / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def commit(repo, message: str = "change"):
+    git(repo, "add", "-A")
+    git(repo, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", message)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    # The listing is stored relative to the cwd; open indexes are per process
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(git_index, "_open_indexes", {})
+    root = tmp_path / "repo"
+    root.mkdir()
+    git(root, "init", "-q")
+    write(root, ".gitignore", "*.log\n")
+    write(root, "src/a.py", "a = 1\n")
+    write(root, "src/b.py", "b = 1\n")
+    commit(root, "init")
+    return root
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    calls = []
+    read = GitFileIndex._read_entries
+
+    def counting(self, paths=None):
+        calls.append(paths)
+        return read(self, paths)
+
+    monkeypatch.setattr(GitFileIndex, "_read_entries", counting)
+    return calls
+
+
+def test_paths_include_untracked_but_not_ignored_files(repo):
+    write(repo, "src/new.py", "n = 1\n")
+    write(repo, "debug.log", "noise\n")
+
+    index = GitFileIndex.open(str(repo))
+
+    assert index.paths() == [".gitignore", "src/a.py", "src/b.py", "src/new.py"]
+    assert index.blob("src/new.py") is None
+    assert index.blob("src/a.py") == git(repo, "rev-parse", "HEAD:src/a.py")
+
+
+def test_untracked_files_are_relisted_without_index_changes(repo):
+    index = GitFileIndex.open(str(repo))
+    write(repo, "src/later.py", "x = 1\n")
+
+    assert "src/later.py" in GitFileIndex.open(str(repo)).paths()
+    assert GitFileIndex.open(str(repo)) is index
+
+
+def test_refresh_rereads_only_changed_paths(repo, reads):
+    GitFileIndex.open(str(repo))
+    assert reads == [None]
+
+    write(repo, "src/a.py", "a = 2\n")
+    write(repo, "src/c.py", "c = 1\n")
+    (repo / "src" / "b.py").unlink()
+    commit(repo)
+    # A fresh process loads the stored listing and refreshes it incrementally
+    git_index._open_indexes.clear()
+    index = GitFileIndex.open(str(repo))
+
+    assert reads[1:] == [["src/a.py", "src/b.py", "src/c.py"]]
+    assert sorted(index.files) == [".gitignore", "src/a.py", "src/c.py"]
+    assert index.blob("src/a.py") == git(repo, "rev-parse", "HEAD:src/a.py")
+
+    GitFileIndex.open(str(repo))
+    assert len(reads) == 2
+
+
+def test_modified_files_have_no_blob(repo):
+    write(repo, "src/a.py", "a = 3\n")
+
+    index = GitFileIndex.open(str(repo))
+
+    assert index.modified() == {"src/a.py"}
+    assert index.blob("src/a.py") is None
+    assert index.blob("src/b.py") is not None
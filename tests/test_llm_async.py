@@ -0,0 +1,57 @@
+"""
+Async Client Tests
+Concurrent completions share one event loop and one pooled client.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src import llm
+from src.fake_server import FakeAnthropicServer, load_scenario
+
+MODEL = "claude-3-5-haiku-latest"
+OVERLOADED = "claude-3-5-sonnet-latest"
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    scenario = load_scenario()
+    scenario["latency"]["seconds"] = 0.0
+    scenario["models"] = {OVERLOADED: {"faults": {"error_529": 1.0}}}
+    srv = FakeAnthropicServer(scenario).start()
+    llm.configure_endpoint(srv.url)
+    yield srv
+    llm.configure_endpoint(None)
+    srv.stop()
+
+
+def request(text: str, model: str = MODEL) -> dict:
+    return {"model": model, "system": "system", "prompt": text, "retries": 0}
+
+
+def test_calls_from_many_threads_share_one_client(server):
+    def hedged(i):
+        return llm.complete_hedged(None, MODEL, "system", f"prompt {i}").text
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        texts = list(pool.map(hedged, range(8)))
+    client = llm._async_client
+    batch = llm.complete_many([request(f"many {i}") for i in range(4)])
+
+    assert texts == ["OK\n"] * 8
+    assert [r.text for r in batch] == ["OK\n"] * 4
+    assert llm._async_client is client
+    assert server.app.stats["requests"] == 12
+
+
+def test_failed_requests_do_not_stop_the_loop(server):
+    results = llm.complete_many([request("a", OVERLOADED), request("b")])
+    assert results[0] is None
+    assert results[1].text == "OK\n"
+
+    with pytest.raises(SystemExit):
+        llm.complete_hedged(None, OVERLOADED, "system", "prompt", retries=0)
+    # The shared loop keeps serving requests after a SystemExit
+    assert llm.complete_hedged(None, MODEL, "system", "again").text == "OK\n"
@@ -0,0 +1,68 @@
+"""
+Tool Completion Tests
+Runs complete_with_tools against the local fake server.
+"""
+
+import copy
+
+import pytest
+
+from src import llm
+from src.fake_server import FakeAnthropicServer, load_scenario
+from src.prompts import text_block
+
+TOOLS = [
+    {
+        "name": "list_dir",
+        "description": "List a directory",
+        "input_schema": {"type": "object", "properties": {"path": {"type": "string"}}},
+    }
+]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    scenario = load_scenario()
+    scenario["latency"]["seconds"] = 0.0
+    scenario["tool_calls"] = {
+        "default": [{"name": "list_dir", "input": {"path": p}} for p in "abc"]
+    }
+    srv = FakeAnthropicServer(scenario).start()
+    llm.configure_endpoint(srv.url)
+    yield srv
+    llm.configure_endpoint(None)
+    srv.stop()
+
+
+def test_tool_rounds_stay_within_the_breakpoint_limit(server):
+    # Two system and two history breakpoints, as in the check fix loop
+    system = [text_block("context", cache=True), text_block("role", cache=True)]
+    history = [
+        {"role": "user", "content": [text_block("task")]},
+        {"role": "assistant", "content": [text_block("patch 1", cache=True)]},
+        {"role": "user", "content": [text_block("checks failed")]},
+        {"role": "assistant", "content": [text_block("patch 2", cache=True)]},
+    ]
+    before = copy.deepcopy(history)
+    calls = []
+
+    def run_tool(name, args):
+        calls.append(args["path"])
+        return f"listing of {args['path']}"
+
+    result = llm.complete_with_tools(
+        "claude-3-5-sonnet-latest",
+        system,
+        "checks still failing",
+        TOOLS,
+        run_tool,
+        history=history,
+        retries=0,
+    )
+
+    assert result.text == "OK\n"
+    assert calls == ["a", "b", "c"]
+    assert server.app.stats["requests"] == 4
+    # The caller's history is left as it was
+    assert history == before
@@ -0,0 +1,129 @@
+"""
+Patch Fuzz Tests
+Hunk relocation by exact, offset, whitespace and similarity matches.
+"""
+
+import subprocess
+
+import pytest
+
+from src.patch_fuzz import relocate_patch
+
+NUMBERED = "".join(f"line{i}\n" for i in range(1, 21))
+
+
+@pytest.fixture
+def repo(tmp_path):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    return tmp_path
+
+
+def write(repo, text: str, name: str = "f.txt"):
+    (repo / name).write_text(text, encoding="utf-8")
+
+
+def diff(header: str, *body: str, name: str = "f.txt") -> str:
+    return f"--- a/{name}\n+++ b/{name}\n{header}\n" + "".join(
+        line + "\n" for line in body
+    )
+
+
+def apply(repo, patch: str) -> str:
+    subprocess.run(
+        ["git", "-C", str(repo), "apply", "-"],
+        input=patch,
+        text=True,
+        check=True,
+    )
+    return (repo / "f.txt").read_text(encoding="utf-8")
+
+
+def without(*names: str) -> str:
+    return "".join(f"{line}\n" for line in NUMBERED.split() if line not in names)
+
+
+def test_exact_match_keeps_the_hunk(repo):
+    write(repo, NUMBERED)
+    patch = diff("@@ -7,3 +7,2 @@", " line7", "-line8", " line9")
+
+    relocated, matches = relocate_patch(str(repo), patch)
+
+    assert [(m.method, m.line, m.offset) for m in matches] == [("exact", 7, 0)]
+    assert relocated == patch
+    assert apply(repo, relocated) == without("line8")
+
+
+def test_offset_match_rewrites_line_numbers(repo):
+    write(repo, NUMBERED)
+    patch = diff("@@ -2,3 +2,2 @@", " line7", "-line8", " line9")
+
+    relocated, matches = relocate_patch(str(repo), patch)
+
+    assert [(m.method, m.line, m.offset) for m in matches] == [("offset", 7, 5)]
+    assert "@@ -7,3 +7,2 @@" in relocated
+    assert apply(repo, relocated) == without("line8")
+
+
+def test_whitespace_match_uses_the_file_lines(repo):
+    write(repo, "def f():\n    a = 1\n    b = 2\n    return a\n")
+    patch = diff("@@ -1,4 +1,3 @@", " def f():", "  a = 1", "- b = 2", "  return a")
+
+    relocated, matches = relocate_patch(str(repo), patch)
+
+    assert matches[0].method == "whitespace"
+    assert "-    b = 2" in relocated.splitlines()
+    assert apply(repo, relocated) == "def f():\n    a = 1\n    return a\n"
+
+
+def test_fuzzy_match_replaces_stale_context(repo):
+    write(repo, NUMBERED)
+    patch = diff("@@ -3,3 +3,2 @@", " line7x", "-line8", " line9x")
+
+    relocated, matches = relocate_patch(str(repo), patch)
+
+    assert matches[0].method == "fuzzy"
+    assert matches[0].line == 7
+    assert apply(repo, relocated) == without("line8")
+
+
+def test_fuzzy_match_aligns_around_an_invented_context_line(repo):
+    # Positional rebasing would turn "-line8" into "-line9" here
+    write(repo, NUMBERED)
+    patch = diff("@@ -8,3 +8,2 @@", " line7", " line7a", "-line8")
+
+    relocated, matches = relocate_patch(str(repo), patch)
+
+    assert matches[0].method == "fuzzy"
+    assert "-line8" in relocated.splitlines()
+    assert "-line9" not in relocated.splitlines()
+    assert apply(repo, relocated) == without("line8")
+
+
+def test_fuzzy_match_refuses_removed_lines_missing_from_the_file(repo):
+    write(repo, NUMBERED)
+    patch = diff("@@ -7,3 +7,2 @@", " line7", "-line8 old", " line9")
+
+    relocated, matches = relocate_patch(str(repo), patch)
+
+    assert relocated is None
+    assert matches[0].method == "failed"
+
+
+def test_fuzzy_match_refuses_equally_similar_windows(repo):
+    block = "x = 1\ny = 2\nz = 3\n"
+    write(repo, block + "pass\n" * 5 + block)
+    patch = diff("@@ -5,3 +5,2 @@", " x = 10", "-y = 2", " z = 3")
+
+    relocated, matches = relocate_patch(str(repo), patch)
+
+    assert relocated is None
+    assert matches[0].method == "ambiguous"
+
+
+def test_new_file_hunks_are_not_located(repo):
+    patch = "--- /dev/null\n+++ b/new.txt\n@@ -0,0 +1,1 @@\n+hello\n"
+
+    relocated, matches = relocate_patch(str(repo), patch)
+
+    assert [m.method for m in matches] == ["new-file"]
+    assert relocated == patch
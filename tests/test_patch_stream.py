@@ -0,0 +1,56 @@
+"""
+Patch Stream Tests
+Diff header detection of the streaming coder parser.
+"""
+
+import pytest
+
+from src.patch_stream import (
+    BEGIN_PATCH,
+    END_PATCH,
+    PatchStreamParser,
+    file_header_lines,
+)
+
+SQL_PATCH = (
+    "--- a/schema.sql\n"
+    "+++ b/schema.sql\n"
+    "@@ -1,3 +1,2 @@\n"
+    " CREATE TABLE t (id INT);\n"
+    "--- drop the legacy view\n"
+    " SELECT 1;\n"
+)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / "schema.sql").write_text(
+        "CREATE TABLE t (id INT);\n-- drop the legacy view\nSELECT 1;\n",
+        encoding="utf-8",
+    )
+    return tmp_path
+
+
+def feed_lines(parser: PatchStreamParser, text: str) -> bool:
+    done = False
+    for line in text.splitlines(keepends=True):
+        done = parser.feed(line)
+    return done
+
+
+def test_removed_comment_line_is_not_a_header():
+    assert file_header_lines(SQL_PATCH) == ["--- a/schema.sql", "+++ b/schema.sql"]
+
+
+def test_stream_accepts_removed_comment_line(repo):
+    parser = PatchStreamParser(str(repo))
+    assert feed_lines(parser, f"{BEGIN_PATCH}\n{SQL_PATCH}{END_PATCH}\n")
+    assert parser.error is None
+    assert "--- drop the legacy view" in parser.patch
+
+
+def test_stream_rejects_missing_file_header(repo):
+    parser = PatchStreamParser(str(repo))
+    text = f"{BEGIN_PATCH}\n--- a/missing.sql\n+++ b/missing.sql\n@@ -1 +1 @@\n"
+    assert feed_lines(parser, text)
+    assert "does not exist" in parser.error
@@ -0,0 +1,174 @@
+"""
+Pipeline Tests
+Dependency order, conditional skipping, stops and failures of the stage DAG.
+"""
+
+import threading
+
+import pytest
+
+from src.pipeline import Pipeline, PipelineStop, Stage
+
+
+def recorder():
+    """A list of executed stage names and a factory for recording stages."""
+    order = []
+    lock = threading.Lock()
+
+    def stage(name, outputs=(), value=None, error=None, **kwargs):
+        def run(inputs):
+            with lock:
+                order.append(name)
+            if error is not None:
+                raise error
+            return {o: value or f"{name}:{sorted(inputs.items())}" for o in outputs}
+
+        return Stage(name, run, outputs=outputs, **kwargs)
+
+    return order, stage
+
+
+def statuses(result):
+    return {t.name: t.status for t in result.timings}
+
+
+def test_stages_run_after_their_inputs_and_ordering_deps():
+    order, stage = recorder()
+    pipeline = Pipeline(
+        [
+            stage("push", after=["check"]),
+            stage("check", inputs=["patch"]),
+            stage("code", ["patch"], inputs=["plan"]),
+            stage("plan", ["plan"], "P", inputs=["goal"]),
+        ]
+    )
+
+    result = pipeline.run({"goal": "G"})
+
+    assert order == ["plan", "code", "check", "push"]
+    assert result.artifacts["patch"] == "code:[('plan', 'P')]"
+    assert set(statuses(result).values()) == {"done"}
+
+
+def test_independent_stages_overlap():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def meet(_):
+        # Deadlocks (and times out) unless both stages run at the same time
+        barrier.wait()
+
+    pipeline = Pipeline([Stage("a", meet), Stage("b", meet)], max_workers=2)
+
+    assert set(statuses(pipeline.run()).values()) == {"done"}
+
+
+def test_when_false_skips_the_stage_and_its_dependents():
+    order, stage = recorder()
+    pipeline = Pipeline(
+        [
+            stage("plan", ["plan"]),
+            stage(
+                "review",
+                ["review"],
+                inputs=["plan"],
+                when=lambda a: a.get("strict", False),
+            ),
+            stage("fix", inputs=["review"]),
+            stage("docs", inputs=["plan"]),
+        ]
+    )
+
+    result = pipeline.run()
+
+    assert sorted(order) == ["docs", "plan"]
+    assert sorted(result.skipped) == ["fix", "review"]
+    assert "review" not in result.artifacts
+
+
+def test_pipeline_stop_ends_the_run_without_an_error():
+    order, stage = recorder()
+    pipeline = Pipeline(
+        [
+            stage("gate", error=PipelineStop("budget exceeded")),
+            stage("code", after=["gate"]),
+        ]
+    )
+
+    result = pipeline.run()
+
+    assert result.stopped == "budget exceeded"
+    assert statuses(result) == {"gate": "stopped", "code": "skipped"}
+
+
+def test_failure_lets_running_stages_finish_then_reraises():
+    order, stage = recorder()
+    failing = threading.Event()
+    finished = []
+
+    def slow(_):
+        # Still running when the other stage fails
+        failing.wait(5)
+        finished.append("docs")
+
+    def broken(_):
+        failing.set()
+        raise RuntimeError("boom")
+
+    pipeline = Pipeline(
+        [
+            Stage("docs", slow),
+            Stage("code", broken, outputs=["patch"]),
+            stage("apply", inputs=["patch"]),
+            stage("publish", after=["docs"]),
+        ],
+        max_workers=2,
+    )
+
+    with pytest.raises(RuntimeError, match="boom"):
+        pipeline.run()
+    assert finished == ["docs"]
+    # Nothing new is started after the failure
+    assert order == []
+
+
+def test_checkpointed_outputs_are_restored_instead_of_run():
+    order, stage = recorder()
+    done = []
+    pipeline = Pipeline(
+        [
+            stage("plan", ["plan"]),
+            stage("code", ["patch"], inputs=["plan"]),
+            stage("check", inputs=["patch"], checkpoint=False),
+        ]
+    )
+
+    result = pipeline.run({"plan": "saved"}, on_stage_done=lambda n, o: done.append(n))
+
+    assert order == ["code", "check"]
+    assert statuses(result)["plan"] == "restored"
+    # Only checkpointed stages are reported for saving
+    assert done == ["code"]
+
+
+@pytest.mark.parametrize(
+    "stages, message",
+    [
+        (
+            [
+                Stage("a", None, inputs=["y"], outputs=["x"]),
+                Stage("b", None, inputs=["x"], outputs=["y"]),
+            ],
+            "cycle",
+        ),
+        ([Stage("a", None, outputs=["x"]), Stage("b", None, outputs=["x"])], "both"),
+        ([Stage("a", None, after=["missing"])], "Unknown"),
+    ],
+)
+def test_invalid_graphs_are_rejected(stages, message):
+    with pytest.raises(ValueError, match=message):
+        Pipeline(stages)
+
+
+def test_inputs_without_a_source_are_rejected():
+    with pytest.raises(ValueError, match="no source"):
+        Pipeline([Stage("a", None, inputs=["goal"])]).run()
@@ -0,0 +1,97 @@
+"""
+Relevance Index Tests
+Tokenizer, BM25 ranking and incremental re-indexing of the context selector.
+"""
+
+import os
+
+import pytest
+
+from src.relevance import RelevanceIndex, tokenize
+
+EXTENSIONS = {".py", ".md"}
+
+
+@pytest.fixture
+def repo(tmp_path):
+    root = tmp_path / "repo"
+    (root / "billing").mkdir(parents=True)
+    (root / "billing" / "invoice.py").write_text(
+        "def create_invoice(customer):\n    return Invoice(customer)\n",
+        encoding="utf-8",
+    )
+    (root / "users.py").write_text(
+        "class UserStore:\n    def get_user_name(self, user_id):\n        pass\n",
+        encoding="utf-8",
+    )
+    (root / "README.md").write_text("# Project\n\nSetup notes.\n", encoding="utf-8")
+    return root
+
+
+def make_index(repo, tmp_path) -> RelevanceIndex:
+    index = RelevanceIndex(str(repo), EXTENSIONS, index_dir=str(tmp_path / "bm25"))
+    index.update()
+    return index
+
+
+def count_reindexed(index, monkeypatch):
+    seen = []
+    original = index._index_file
+
+    def spy(rel, stat, known_hash):
+        seen.append(rel)
+        return original(rel, stat, known_hash)
+
+    monkeypatch.setattr(index, "_index_file", spy)
+    return seen
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("getUserName") == ["get", "user", "name", "getusername"]
+    assert tokenize("HTTPServer parse_json") == [
+        "http",
+        "server",
+        "httpserver",
+        "parse",
+        "json",
+    ]
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("Add the users und die Rechnungen") == ["user", "rechnungen"]
+    # Numbers, single letters and "ss" endings are left alone
+    assert tokenize("class 42 x") == ["class"]
+
+
+def test_select_ranks_by_content_and_path(repo, tmp_path):
+    index = make_index(repo, tmp_path)
+    candidates = ["README.md", "billing/invoice.py", "users.py"]
+
+    assert index.select("Rabatt auf jede Invoice", candidates, 1) == [
+        "billing/invoice.py"
+    ]
+    assert index.select("show the user name", candidates, 2)[0] == "users.py"
+    # Without matching terms the order falls back to the path order
+    assert index.select("zzz", candidates, 3) == candidates
+
+
+def test_update_only_reindexes_changed_files(repo, tmp_path, monkeypatch):
+    make_index(repo, tmp_path)
+
+    (repo / "users.py").write_text("class Account:\n    pass\n", encoding="utf-8")
+    os.remove(repo / "README.md")
+    (repo / "notes.md").write_text("Account notes\n", encoding="utf-8")
+
+    # A fresh instance loads the stored term frequencies from disk
+    index = RelevanceIndex(str(repo), EXTENSIONS, index_dir=str(tmp_path / "bm25"))
+    reindexed = count_reindexed(index, monkeypatch)
+    index.update()
+
+    assert sorted(reindexed) == ["notes.md", "users.py"]
+    assert sorted(index.docs) == ["billing/invoice.py", "notes.md", "users.py"]
+    assert "account" in index.docs["users.py"].tf
+    assert "store" not in index.postings
+
+    reindexed.clear()
+    index.update()
+    assert reindexed == []
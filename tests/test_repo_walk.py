@@ -0,0 +1,99 @@
+"""
+Repository Walker Tests
+Gitignore semantics of the walker and spec matching.
+"""
+
+import pytest
+
+from src.repo_walk import RepoWalker, match_specs
+
+
+def write(root, rel: str, text: str = ""):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+@pytest.fixture
+def repo(tmp_path):
+    files = [
+        "app.py",
+        "debug.log",
+        "keep.log",
+        "top.txt",
+        "build/out.js",
+        "node_modules/lib/index.js",
+        "src/main.py",
+        "src/top.txt",
+        "src/cache/blob.bin",
+        "src/gen/api.py",
+        "src/gen/keep.py",
+        "docs/guide.md",
+        "docs/api/ref.md",
+        "secrets/key.pem",
+    ]
+    for rel in files:
+        write(tmp_path, rel)
+    write(tmp_path, ".gitignore", "*.log\n!keep.log\n/top.txt\ncache/\n")
+    write(tmp_path, "src/.gitignore", "gen/*\n!gen/keep.py\n")
+    write(tmp_path, ".aiagentsignore", "secrets/\n")
+    return tmp_path
+
+
+def test_walk_applies_every_ignore_source(repo):
+    files = RepoWalker(str(repo)).walk()
+
+    assert [f for f in files if not f.endswith("ignore")] == [
+        "app.py",
+        "docs/api/ref.md",
+        "docs/guide.md",
+        "keep.log",
+        "src/gen/keep.py",
+        "src/main.py",
+        "src/top.txt",
+    ]
+
+
+def test_rules_are_scoped_to_their_directory(repo):
+    walker = RepoWalker(str(repo))
+
+    # "/top.txt" is anchored to the root, "cache/" matches at any depth
+    assert walker.is_ignored("top.txt", False)
+    assert not walker.is_ignored("src/top.txt", False)
+    assert walker.is_ignored("src/cache", True)
+    # src/.gitignore does not reach outside src/
+    assert not walker.is_ignored("gen", True)
+    assert walker.is_ignored("src/gen/api.py", False)
+    # Directory-only rules do not match files of the same name
+    assert not walker.is_ignored("src/cache", False)
+
+
+def test_filter_agrees_with_walk(repo):
+    walker = RepoWalker(str(repo))
+    listed = [
+        "app.py",
+        "build/out.js",
+        "debug.log",
+        "keep.log",
+        "src/cache/blob.bin",
+        "src/gen/api.py",
+        "src/gen/keep.py",
+        "src/main.py",
+    ]
+
+    assert walker.filter(listed) == [f for f in walker.walk() if f in listed]
+
+
+def test_match_specs_walks_directories_and_globs(repo):
+    explicit, matched = match_specs(
+        str(repo), ["debug.log", "docs", "src/**/*.py"], {".md"}
+    )
+
+    # Named files are kept even when ignored
+    assert explicit == ["debug.log"]
+    assert matched == [
+        "docs/api/ref.md",
+        "docs/guide.md",
+        "src/gen/keep.py",
+        "src/main.py",
+    ]
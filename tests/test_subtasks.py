@@ -0,0 +1,108 @@
+"""
+Sub-Task Tests
+Parsing of architect sub-tasks and merging of their coder patches.
+"""
+
+import subprocess
+
+import pytest
+
+from src.subtasks import BEGIN_SUBTASKS, END_SUBTASKS, merge_patches, parse_subtasks
+
+NUMBERED = "".join(f"line{i}\n" for i in range(1, 21))
+
+
+@pytest.fixture
+def repo(tmp_path):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    (tmp_path / "f.txt").write_text(NUMBERED, encoding="utf-8")
+    (tmp_path / "g.txt").write_text("alpha\nbeta\n", encoding="utf-8")
+    return tmp_path
+
+
+def apply(repo, patch: str):
+    subprocess.run(
+        ["git", "-C", str(repo), "apply", "-"], input=patch, text=True, check=True
+    )
+
+
+def plan(body: str) -> str:
+    return f"## Plan\n\n{BEGIN_SUBTASKS}\n{body}{END_SUBTASKS}\n"
+
+
+# Replaces line3 and line15 of f.txt, or alpha of g.txt
+EDIT_TOP = "--- a/f.txt\n+++ b/f.txt\n@@ -2,3 +2,3 @@\n line2\n-line3\n+LINE3\n line4\n"
+EDIT_BOTTOM = (
+    "--- a/f.txt\n+++ b/f.txt\n"
+    "@@ -14,3 +14,4 @@\n line14\n-line15\n+LINE15\n+extra\n line16\n"
+)
+EDIT_G = "--- a/g.txt\n+++ b/g.txt\n@@ -1,2 +1,2 @@\n-alpha\n+ALPHA\n beta\n"
+EDIT_TOP_AGAIN = "--- a/f.txt\n+++ b/f.txt\n@@ -3,2 +3,1 @@\n-line3\n-line4\n+gone\n"
+NEW_FILE = "--- /dev/null\n+++ b/new.txt\n@@ -0,0 +1 @@\n+hello\n"
+
+
+def test_parse_subtasks_reads_disjoint_tasks():
+    subtasks = parse_subtasks(
+        plan(
+            "- id: api\n  task: Add the endpoint\n  files: [./src/api.py]\n"
+            "- task: Show the status\n  files: [src/ui.py]\n"
+        )
+    )
+
+    assert [(s.id, s.task, s.files) for s in subtasks] == [
+        ("api", "Add the endpoint", ["src/api.py"]),
+        ("t2", "Show the status", ["src/ui.py"]),
+    ]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        # Two sub-tasks claim the same file
+        "- task: a\n  files: [x.py]\n- task: b\n  files: [x.py, y.py]\n",
+        # An entry without files
+        "- task: a\n  files: [x.py]\n- task: b\n",
+        # Not a list
+        "task: a\n",
+        "".join(f"- task: t{i}\n  files: [f{i}.py]\n" for i in range(7)),
+    ],
+)
+def test_parse_subtasks_rejects_invalid_blocks(body):
+    assert parse_subtasks(plan(body)) == []
+
+
+def test_parse_subtasks_without_block():
+    assert parse_subtasks("## Plan\n1. Do it\n") == []
+
+
+def test_merge_disjoint_files(repo):
+    merged, conflicts = merge_patches({"top": EDIT_TOP, "g": EDIT_G})
+
+    assert conflicts == []
+    apply(repo, merged)
+    assert (repo / "g.txt").read_text() == "ALPHA\nbeta\n"
+    assert "LINE3" in (repo / "f.txt").read_text()
+
+
+def test_merge_non_overlapping_hunks_of_one_file(repo):
+    # The later sub-task's hunk comes first in the file
+    merged, conflicts = merge_patches({"bottom": EDIT_BOTTOM, "top": EDIT_TOP})
+
+    assert conflicts == []
+    apply(repo, merged)
+    expected = NUMBERED.replace("line3\n", "LINE3\n").replace(
+        "line15\n", "LINE15\nextra\n"
+    )
+    assert (repo / "f.txt").read_text() == expected
+
+
+def test_merge_reports_overlapping_hunks():
+    _, conflicts = merge_patches({"top": EDIT_TOP, "again": EDIT_TOP_AGAIN})
+
+    assert conflicts == ["f.txt: hunks of top and again overlap (lines 3)"]
+
+
+def test_merge_reports_a_file_created_twice():
+    _, conflicts = merge_patches({"a": NEW_FILE, "b": NEW_FILE})
+
+    assert conflicts == ["new.txt: created by a and b"]
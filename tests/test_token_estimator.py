@@ -0,0 +1,62 @@
+"""
+Token Estimator Tests
+Calibration, the piece cache and its persistence under concurrent use.
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from src.token_estimator import MIN_CACHED_CHARS, TokenEstimator, count_pieces
+
+
+def test_calibration_moves_towards_observed_usage(tmp_path):
+    estimator = TokenEstimator(str(tmp_path / "state.json"))
+    for _ in range(30):
+        # Each request is estimated with the factor calibrated so far
+        estimated = round(100 * estimator.factor("model"))
+        estimator.calibrate("model", estimated, 150)
+
+    assert 1.45 < estimator.factor("model") <= 1.5
+    assert estimator.samples["model"] == 30
+    # Calibration alone does not write the state file
+    assert not (tmp_path / "state.json").exists()
+
+
+def test_save_persists_calibration_and_piece_counts(tmp_path):
+    state = tmp_path / "state.json"
+    estimator = TokenEstimator(str(state))
+    text = "word " * MIN_CACHED_CHARS
+    estimator.estimate(text, "model")
+    estimator.calibrate("model", 100, 200)
+    estimator.save()
+
+    reloaded = TokenEstimator(str(state))
+    assert reloaded.factor("model") == estimator.factor("model")
+    assert list(reloaded.pieces.values()) == [count_pieces(text)]
+
+
+def test_concurrent_estimates_and_saves(tmp_path):
+    state = tmp_path / "state.json"
+    estimator = TokenEstimator(str(state))
+
+    def work(i):
+        estimator.estimate(f"file {i} " * MIN_CACHED_CHARS, "model")
+        estimator.calibrate("model", 100, 100 + i % 7)
+        estimator.save()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(work, range(200)))
+    estimator.save()
+
+    data = json.loads(state.read_text(encoding="utf-8"))
+    assert len(data["pieces"]) == 200
+    assert data["samples"]["model"] == 200
+
+
+def test_tool_schemas_count_towards_the_request(tmp_path):
+    estimator = TokenEstimator(str(tmp_path / "state.json"))
+    tools = [{"name": "read_file", "input_schema": {"type": "object"}}]
+
+    plain = estimator.estimate_request("model", "system", "prompt")
+    with_tools = estimator.estimate_request("model", "system", "prompt", tools)
+    assert with_tools > plain